@@ -0,0 +1,48 @@
+from typing import Optional
+from fastapi import APIRouter, HTTPException
+from app.core.telemetry import span
+from app.models.schemas.deck import DeckPatchRequest, DeckPatchResponse
+from app.models.schemas.slide import Deck
+from app.services.deck_service import (
+    DeckNotFound,
+    PatchError,
+    RevisionConflict,
+    deck_store,
+)
+
+router = APIRouter(prefix="/decks", tags=["decks"])
+
+
+@router.get("/{deck_id}", response_model=Deck, summary="Fetch a stored deck")
+def get_deck(deck_id: str, revision: Optional[int] = None) -> Deck:
+    try:
+        return deck_store.get(deck_id, revision).deck
+    except DeckNotFound:
+        raise HTTPException(404, "deck not found")
+
+
+@router.patch(
+    "/{deck_id}",
+    response_model=DeckPatchResponse,
+    summary="Apply slide ops to a stored deck and bump its revision",
+)
+def patch_deck(deck_id: str, req: DeckPatchRequest) -> DeckPatchResponse:
+    with span("deck_patch_endpoint", deck_id=deck_id, ops=len(req.ops)):
+        try:
+            rev, changed, removed = deck_store.patch(
+                deck_id, req.ops, base_revision=req.base_revision
+            )
+        except DeckNotFound:
+            raise HTTPException(404, "deck not found")
+        except RevisionConflict as e:
+            raise HTTPException(409, f"revision conflict: {e}")
+        except PatchError as e:
+            raise HTTPException(422, str(e))
+
+    return DeckPatchResponse(
+        id=deck_id,
+        revision=rev.revision,
+        slide_count=len(rev.deck.slides),
+        changed=changed,
+        removed=removed,
+    )
@@ -1,9 +1,14 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import FileResponse
 from pathlib import Path
+from app.core import compression
+from app.core.config import settings
+from app.core.fileserve import serve_file
 from app.models.schemas.export import ExportRequest, ExportResponse
 from app.services.export_service import export_to_pptx
-from app.core.telemetry import aspan
+from app.services.deck_service import DeckNotFound, deck_store
+from app.core.telemetry import aspan, span
 
 router = APIRouter(prefix="/export", tags=["export"])
 
@@ -11,13 +16,51 @@ router = APIRouter(prefix="/export", tags=["export"])
 @router.post("", response_model=ExportResponse, summary="Export slides to text")
 async def export(req: ExportRequest) -> ExportResponse:
     theme = req.theme or "default"
-    async with aspan("export_endpoint", theme=theme, slide_count=len(req.slides)):
-        return await export_to_pptx(req.slides, theme=theme)
+    if req.deck_id:
+        try:
+            # May read the shared SQLite store; keep it off the event loop
+            rev = await run_in_threadpool(deck_store.get, req.deck_id, req.revision)
+        except DeckNotFound:
+            raise HTTPException(404, "deck not found")
+        slides = rev.deck.slides
+        etags = [rev.etags[s.id] for s in slides]
+    else:
+        slides, etags = req.slides or [], None
 
+    async with aspan("export_endpoint", theme=theme, slide_count=len(slides)):
+        res = await export_to_pptx(slides, theme=theme, etags=etags)
+    if req.deck_id:
+        res.deck_id, res.revision = req.deck_id, rev.revision
+    return res
 
-@router.get("/{filename}", response_class=FileResponse)
-def download(filename: str):
+
+@router.api_route(
+    "/{filename}",
+    methods=["GET", "HEAD"],
+    response_class=FileResponse,
+    summary="Download an export (ETag / 304 / Range aware)",
+)
+def download(filename: str, request: Request):
     p = Path("data/exports") / filename
-    if not p.is_file():
+    if p.parent != Path("data/exports") or not p.is_file():
         raise HTTPException(404, "not found")
-    return FileResponse(str(p), media_type="text/plain", filename=filename)
+    headers = {"Vary": "Accept-Encoding"}
+    # Serve the bytes precompressed at export time; never encode on the fly
+    # here. Ranges then apply to the chosen variant, which has its own ETag.
+    enc = compression.negotiate(
+        request.headers.get("accept-encoding"),
+        settings.COMPRESSION_ENCODINGS,
+        has=lambda e: p.with_name(p.name + compression.SUFFIXES[e]).is_file(),
+    )
+    if enc:
+        p = p.with_name(p.name + compression.SUFFIXES[enc])
+        headers["Content-Encoding"] = enc
+    with span("export_download", file_name=filename, encoding=enc or "identity"):
+        return serve_file(
+            request.method,
+            request.headers,
+            p,
+            media_type="text/plain",
+            filename=filename,
+            headers=headers,
+        )
@@ -1,8 +1,11 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 from datetime import timedelta
 from app.core.config import settings
-from app.services.storage_service import purge_old_files
+from app.services.storage_service import run_retention
 from app.core.telemetry import span
+from app.services.search_service import search_index
+from app.services.media_service import media_fetcher
+from app.services.metrics_service import cluster_snapshot
 
 router = APIRouter(tags=["ops"])
 
@@ -10,7 +13,33 @@ router = APIRouter(tags=["ops"])
 @router.post("/ops/retention/sweep", summary="Delete old uploads (dev only)")
 def retention_sweep():
     with span("retention_sweep_endpoint", days=settings.RETENTION_DAYS):
-        deleted = purge_old_files(
+        deleted = run_retention(
             settings.STORAGE_DIR, timedelta(days=settings.RETENTION_DAYS)
         )
     return {"deleted": [str(p) for p in deleted], "count": len(deleted)}
+
+
+@router.get("/ops/admission", summary="Admission queue depth and rejection counters")
+def admission_stats(request: Request):
+    return request.app.state.admission.snapshot()
+
+
+@router.get("/ops/search", summary="Search index segments and tombstones")
+def search_stats():
+    return search_index.stats()
+
+
+@router.post("/ops/search/merge", summary="Force-merge search segments")
+def search_merge():
+    search_index.merge()
+    return search_index.stats()
+
+
+@router.get("/ops/media", summary="Media fetcher and cache counters")
+def media_stats():
+    return media_fetcher.stats()
+
+
+@router.get("/ops/workers", summary="Per-worker counters and their sum across workers")
+def workers_stats(request: Request):
+    return cluster_snapshot(request.app)
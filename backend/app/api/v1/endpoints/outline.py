@@ -1,47 +1,23 @@
-from fastapi import APIRouter, HTTPException, Request
-from typing import List
-from datetime import datetime
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 import logging
-import re
-import uuid
+from contextlib import aclosing
 
-from app.models.schemas.slide import Deck, Slide
-from app.models.schemas.outline import OutlineRequest
-from app.core.version import SCHEMA_VERSION
-from app.core.telemetry import span
+from app.core.config import settings
+from app.models.schemas.slide import Deck
+from app.models.schemas.outline import OutlineBatchRequest, OutlineRequest
+from app.services.outline_service import (
+    OutlineInputError,
+    UploadNotFound,
+    build_deck,
+    outline_many,
+    resolve_seeds,
+)
+from app.services.progress_service import format_ndjson, format_sse
 
 router = APIRouter(tags=["outline"])
 log = logging.getLogger("app")
 
-_BAD_LINES = {"n", "contents", "table of contents", "toc", "index"}
-_BULLET_PREFIX = re.compile(r"^(\s*[-*\u2022\u00B7]\s*)+")
-_WS = re.compile(r"\s+")
-_ARTIFACT = re.compile(r"\(cid:\d+\)")
-_LEAD_NUM = re.compile(r"^[\s]*(?:\d+[\.\)]|[IVXLCM]+\.)\s+", re.IGNORECASE)
-
-
-def _clip(s: str, n: int = 80) -> str:
-    s = s.strip()
-    return s if len(s) <= n else (s[: n - 1].rstrip() + "…")
-
-
-def _seed_lines(txt: str) -> List[str]:
-    seeds: List[str] = []
-    for ln in txt.splitlines():
-        s = ln.strip()
-        if not s:
-            continue
-        s = _ARTIFACT.sub("", s)
-        s = _BULLET_PREFIX.sub("", s)
-        s = _LEAD_NUM.sub("", s)
-        s = _WS.sub(" ", s).strip(" -—•·")
-        if len(s) < 4:
-            continue
-        if s.lower() in _BAD_LINES:
-            continue
-        seeds.append(s)
-    return seeds
-
 
 @router.post(
     "/outline",
@@ -49,31 +25,73 @@ def _seed_lines(txt: str) -> List[str]:
     summary="Generate a placeholder deck from topic/text",
 )
 def outline(req: OutlineRequest, request: Request) -> Deck:
-    source = (req.text or "").strip()
-    if not source and not req.topic:
-        raise HTTPException(400, "Provide either 'text' or 'topic'")
+    try:
+        seeds = resolve_seeds(req)
+    except OutlineInputError as e:
+        raise HTTPException(400, str(e))
+    except UploadNotFound:
+        raise HTTPException(404, "upload not found")
+    return build_deck(req, seeds)
 
-    n = max(1, min(req.slide_count, 15))
-    seeds = _seed_lines(source)
-    topic = (req.topic or (seeds[0] if seeds else "Untitled")).strip()
 
-    with span("outline_stub_build", topic=topic, slide_count=n):
-        slides: List[Slide] = []
-        for i in range(n):
-            seed = seeds[i % len(seeds)] if seeds else topic
-            title = f"Slide {i + 1}: {_clip(seed)}"
-            slides.append(
-                Slide(id=uuid.uuid4().hex, title=title, bullets=["placeholder bullet"])
-            )
+def _item_error(exc: Exception) -> tuple[int, str]:
+    if isinstance(exc, OutlineInputError):
+        return 400, str(exc)
+    if isinstance(exc, UploadNotFound):
+        return 404, "upload not found"
+    log.error("outline_batch_item_failed", exc_info=exc)
+    return 500, "Internal Server Error"
+
+
+@router.post(
+    "/outline/batch",
+    summary="Outline many documents; streams one Deck per item as each completes",
+)
+async def outline_batch(
+    req: OutlineBatchRequest,
+    request: Request,
+    format: str = Query("ndjson", pattern="^(sse|ndjson)$"),
+):
+    items = req.expanded()
+    if not items:
+        raise HTTPException(400, "Provide 'items' and/or 'file_ids'")
+    if len(items) > settings.OUTLINE_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            413, f"At most {settings.OUTLINE_BATCH_MAX_ITEMS} items per batch"
+        )
+
+    fmt = format_sse if format == "sse" else format_ndjson
 
-        deck = Deck(
-            version=SCHEMA_VERSION,
-            topic=topic,
-            source=None,
-            slide_count=len(slides),
-            created_at=datetime.utcnow(),
-            slides=slides,
+    async def _stream():
+        ok = 0
+        seq = 0
+        # aclosing: a client hanging up cancels the items still in flight
+        async with aclosing(
+            outline_many(items, settings.OUTLINE_BATCH_CONCURRENCY)
+        ) as results:
+            async for index, result in results:
+                if isinstance(result, Deck):
+                    ok += 1
+                    data = {"index": index, "deck": result.model_dump(mode="json")}
+                    ev = {"event": "deck", "data": data}
+                else:
+                    status, detail = _item_error(result)
+                    data = {"index": index, "status": status, "detail": detail}
+                    ev = {"event": "error", "data": data}
+                yield fmt({"id": seq, **ev})
+                seq += 1
+                if await request.is_disconnected():
+                    return
+        yield fmt(
+            {
+                "id": seq,
+                "event": "done",
+                "data": {"total": len(items), "ok": ok, "failed": len(items) - ok},
+            }
         )
 
-    log.info("outline_stub_complete", extra={"slide_count": len(slides)})
-    return deck
+    return StreamingResponse(
+        _stream(),
+        media_type="text/event-stream" if format == "sse" else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,23 @@
+from typing import Optional
+from fastapi import APIRouter, HTTPException, Query
+from app.core.config import settings
+from app.models.schemas.search import SearchHit, SearchResponse
+from app.services.search_service import search_index
+
+router = APIRouter(tags=["search"])
+
+
+@router.get(
+    "/search",
+    response_model=SearchResponse,
+    summary="BM25 passage search across uploaded documents",
+)
+def search(
+    q: str = Query(..., min_length=1, max_length=500),
+    k: int = Query(10, ge=1, le=50),
+    doc_id: Optional[str] = Query(None, description="Restrict to one upload"),
+) -> SearchResponse:
+    if not settings.SEARCH_ENABLED:
+        raise HTTPException(404, "search is disabled")
+    hits = search_index.search(q, k=k, doc_id=doc_id)
+    return SearchResponse(query=q, hits=[SearchHit(**h) for h in hits])
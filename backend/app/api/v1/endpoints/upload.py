@@ -1,14 +1,72 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException, Request
+import asyncio
+import re
+from pathlib import Path
+from typing import AsyncIterator, Awaitable, Callable, Optional
+from fastapi import (
+    APIRouter,
+    File,
+    Header,
+    HTTPException,
+    Query,
+    Request,
+    Response,
+    UploadFile,
+)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
 from uuid import uuid4
 from pydantic import BaseModel as PydModel
 from app.core.config import settings
-from app.core.telemetry import aspan, span
+from app.core.telemetry import aspan, span, progress, progress_ctx
 from app.services.parsing_service import parse_file
-from app.models.schemas.upload import UploadResponse, ParsedPreview
+from app.services.storage_service import (
+    SizeLimitExceeded,
+    UploadIdTaken,
+    load_structure,
+    read_text_bytes,
+    read_text_span,
+    reserve_upload,
+    save_parsed,
+    write_chunks,
+)
+from app.services.search_service import search_index
+from app.services.progress_service import format_ndjson, format_sse, progress_hub
+from app.services.upload_session_service import (
+    ChecksumMismatch,
+    ChunkTooLarge,
+    OffsetMismatch,
+    SessionBusy,
+    SessionIncomplete,
+    SessionNotFound,
+    abort_session,
+    append_chunk,
+    create_session,
+    finalize_session,
+    load_session,
+    parse_checksum,
+)
+from app.models.schemas.upload import (
+    UPLOAD_ID_PATTERN,
+    ParsedPreview,
+    UploadResponse,
+    UploadSession,
+    UploadSessionCreate,
+)
+from app.models.schemas.structure import StructureIndex
 
 router = APIRouter(tags=["upload"])
 
 CHUNK = 1024 * 1024  # 1MB
+_UPLOAD_ID = re.compile(UPLOAD_ID_PATTERN)
+
+
+def _resolve_upload_id(request: Request, upload_id: Optional[str]) -> str:
+    uid = upload_id or request.headers.get("x-upload-id")
+    if not uid:
+        return uuid4().hex
+    if not _UPLOAD_ID.match(uid):
+        raise HTTPException(400, "upload_id must be 8-64 chars of [A-Za-z0-9_-]")
+    return uid
 
 
 @router.post(
@@ -16,45 +74,97 @@ CHUNK = 1024 * 1024  # 1MB
     response_model=UploadResponse,
     summary="Upload a document and return parsed preview",
 )
-async def upload(request: Request, file: UploadFile = File(...)) -> UploadResponse:
+async def upload(
+    request: Request,
+    file: UploadFile = File(...),
+    upload_id: Optional[str] = Query(
+        None, description="Client-chosen id to follow via /upload/{id}/events"
+    ),
+) -> UploadResponse:
     if not file.filename:
         raise HTTPException(400, "Missing filename")
 
-    limit = settings.MAX_UPLOAD_MB * 1024 * 1024
-    dest_dir = settings.STORAGE_DIR
-    dest_dir.mkdir(parents=True, exist_ok=True)
+    file_id = _resolve_upload_id(request, upload_id)
+    # Claimed before touching the progress channel: a rejected duplicate must
+    # not end the stream of the upload that owns the id
+    try:
+        dest_path = await run_in_threadpool(reserve_upload, file_id, file.filename)
+    except UploadIdTaken:
+        raise HTTPException(409, "upload id already in use")
+    return await _with_progress(
+        file_id, lambda: _store_and_parse(request, file, file_id, dest_path)
+    )
 
-    file_id = uuid4().hex
-    dest_path = dest_dir / f"{file_id}_{file.filename}"
 
-    # Stream to disk with size cap
-    size = 0
+async def _with_progress(
+    file_id: str, run: Callable[[], Awaitable[UploadResponse]]
+) -> UploadResponse:
+    """Route progress()/span events to the upload's channel; end it on failure."""
+    progress_hub.channel(file_id, fresh=True)
+    token = progress_ctx.set(
+        lambda event, data: progress_hub.publish(file_id, event, data)
+    )
+    try:
+        return await run()
+    except HTTPException as e:
+        progress("error", status=e.status_code, detail=e.detail)
+        raise
+    except Exception:
+        progress("error", status=500, detail="Internal Server Error")
+        raise
+    finally:
+        progress_ctx.reset(token)
+
+
+async def _read_upload(file: UploadFile) -> AsyncIterator[bytes]:
+    while chunk := await file.read(CHUNK):
+        yield chunk
+
+
+async def _store_and_parse(
+    request: Request, file: UploadFile, file_id: str, dest_path: Path
+) -> UploadResponse:
+    limit = settings.MAX_UPLOAD_MB * 1024 * 1024
+    # Multipart framing makes this an upper bound; good enough for a progress bar
+    total = int(request.headers.get("content-length") or 0) or None
+
     async with aspan(
         "upload_stream",
         file_name=file.filename,
         content_type=file.content_type or "application/octet-stream",
     ):
-        with dest_path.open("wb") as f:
-            while True:
-                chunk = await file.read(CHUNK)
-                if not chunk:
-                    break
-                size += len(chunk)
-                if size > limit:
-                    dest_path.unlink(missing_ok=True)
-                    raise HTTPException(
-                        413, f"File too large (> {settings.MAX_UPLOAD_MB} MB)"
-                    )
-                f.write(chunk)
+        try:
+            with dest_path.open("wb") as f:
+                size = await write_chunks(
+                    _read_upload(file),
+                    f,
+                    limit,
+                    lambda _, n: progress("received", bytes=n, total=total),
+                )
+        except SizeLimitExceeded:
+            dest_path.unlink(missing_ok=True)
+            raise HTTPException(413, f"File too large (> {settings.MAX_UPLOAD_MB} MB)")
         await file.seek(0)
 
-    # Parse
+    return await _parse_and_index(
+        file_id, dest_path, file.filename, file.content_type, size
+    )
+
+
+async def _parse_and_index(
+    file_id: str,
+    dest_path: Path,
+    filename: str,
+    content_type: Optional[str],
+    size: int,
+) -> UploadResponse:
+    # Parse off the event loop so progress streams keep flowing
     with span(
         "parse_file_endpoint",
         file=str(dest_path),
-        content_type=file.content_type or "unknown",
+        content_type=content_type or "unknown",
     ):
-        raw = parse_file(dest_path, file.content_type)
+        raw = await run_in_threadpool(parse_file, dest_path, content_type)
 
     # Normalize to ParsedPreview without double-wrapping
     if isinstance(raw, ParsedPreview):
@@ -67,12 +177,274 @@ async def upload(request: Request, file: UploadFile = File(...)) -> UploadRespon
         # ultra-defensive fallback
         parsed = ParsedPreview()
 
+    await run_in_threadpool(save_parsed, file_id, parsed)
+    if settings.SEARCH_ENABLED:
+        await run_in_threadpool(
+            search_index.add_document,
+            file_id,
+            parsed.text,
+            parsed.structure,
+            filename,
+        )
+
     path_out = str(dest_path) if settings.DEBUG else None
 
-    return UploadResponse(
-        filename=file.filename,
+    res = UploadResponse(
+        file_id=file_id,
+        filename=filename,
         size=size,
-        content_type=file.content_type or "application/octet-stream",
+        content_type=content_type or "application/octet-stream",
         path=path_out,
         parsed=parsed,
     )
+    progress("parsed", file_id=file_id, preview=parsed.model_dump())
+    return res
+
+
+@router.get(
+    "/upload/{file_id}/structure",
+    response_model=StructureIndex,
+    summary="Headings, sections and page offsets built at parse time",
+)
+def upload_structure(file_id: str) -> StructureIndex:
+    if not _UPLOAD_ID.match(file_id):
+        raise HTTPException(400, "invalid file id")
+    index = load_structure(file_id)
+    if index is None:
+        raise HTTPException(404, "not found")
+    return index
+
+
+@router.get("/upload/{file_id}/pages", summary="Parsed text for a page range")
+def upload_pages(
+    file_id: str,
+    start: int = Query(1, ge=1),
+    end: Optional[int] = Query(None, ge=1),
+):
+    if not _UPLOAD_ID.match(file_id):
+        raise HTTPException(400, "invalid file id")
+    index = load_structure(file_id)
+    if index is None:
+        raise HTTPException(404, "not found")
+    lo, hi = index.page_span(start, end)
+    byte_span = index.page_byte_span(start, end)
+    with span("page_range_lookup", file_id=file_id, chars=hi - lo):
+        if byte_span is not None:
+            text = read_text_bytes(file_id, *byte_span)
+        else:  # indexes saved before byte offsets: decode the whole text
+            text = read_text_span(file_id, lo, hi)
+    if text is None:
+        raise HTTPException(404, "not found")
+    return {
+        "file_id": file_id,
+        "start": start,
+        "end": end or start,
+        "pages": len(index.page_offsets),
+        "text": text,
+    }
+
+
+# Resumable uploads: POST creates a session, PATCH appends at Upload-Offset,
+# HEAD reports the committed offset, finalize parses like a regular upload.
+
+_parse_tasks: set[asyncio.Task] = set()
+
+
+def _session_headers(session: UploadSession) -> dict[str, str]:
+    return {
+        "Upload-Offset": str(session.offset),
+        "Upload-Length": str(session.size),
+        "Cache-Control": "no-store",
+    }
+
+
+def _check_session_id(upload_id: str) -> None:
+    if not _UPLOAD_ID.match(upload_id):
+        raise HTTPException(400, "invalid upload id")
+
+
+@router.post(
+    "/upload/sessions",
+    response_model=UploadSession,
+    status_code=201,
+    summary="Start a resumable upload",
+)
+async def create_upload_session(
+    req: UploadSessionCreate, response: Response
+) -> UploadSession:
+    if req.size > settings.MAX_RESUMABLE_UPLOAD_MB * 1024 * 1024:
+        raise HTTPException(
+            413, f"File too large (> {settings.MAX_RESUMABLE_UPLOAD_MB} MB)"
+        )
+    try:
+        session = await run_in_threadpool(create_session, req)
+    except SessionBusy:
+        raise HTTPException(409, "upload id already in use")
+    progress_hub.channel(session.upload_id, fresh=True)
+    response.headers.update(_session_headers(session))
+    response.headers["Location"] = (
+        f"{settings.API_BASE}/upload/sessions/{session.upload_id}"
+    )
+    return session
+
+
+@router.head("/upload/sessions/{upload_id}", summary="Committed offset of a session")
+def head_upload_session(upload_id: str) -> Response:
+    _check_session_id(upload_id)
+    try:
+        session = load_session(upload_id)
+    except SessionNotFound:
+        raise HTTPException(404, "upload session not found")
+    return Response(status_code=200, headers=_session_headers(session))
+
+
+@router.get(
+    "/upload/sessions/{upload_id}",
+    response_model=UploadSession,
+    summary="Session status as JSON",
+)
+def get_upload_session(upload_id: str) -> UploadSession:
+    _check_session_id(upload_id)
+    try:
+        return load_session(upload_id)
+    except SessionNotFound:
+        raise HTTPException(404, "upload session not found")
+
+
+@router.patch(
+    "/upload/sessions/{upload_id}",
+    status_code=204,
+    summary="Append a chunk at Upload-Offset",
+)
+async def patch_upload_session(
+    request: Request,
+    upload_id: str,
+    upload_offset: int = Header(..., alias="Upload-Offset", ge=0),
+    upload_checksum: Optional[str] = Header(
+        None,
+        alias="Upload-Checksum",
+        description="'<sha256|sha1|md5> <base64 digest>' of this chunk",
+    ),
+) -> Response:
+    _check_session_id(upload_id)
+    try:
+        checksum = parse_checksum(upload_checksum)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    progress_hub.channel(upload_id)
+    try:
+        session = await append_chunk(
+            upload_id,
+            upload_offset,
+            request.stream(),
+            checksum,
+            lambda n, total: progress_hub.publish(
+                upload_id, "received", {"bytes": n, "total": total}
+            ),
+        )
+    except SessionNotFound:
+        raise HTTPException(404, "upload session not found")
+    except OffsetMismatch as e:
+        raise HTTPException(409, str(e), headers={"Upload-Offset": str(e.current)})
+    except SessionBusy:
+        raise HTTPException(423, "another request is writing to this session")
+    except ChunkTooLarge as e:
+        raise HTTPException(413, str(e))
+    except ChecksumMismatch as e:
+        # 460 is tus's "Checksum Mismatch"; the chunk was discarded
+        raise HTTPException(460, str(e))
+    return Response(status_code=204, headers=_session_headers(session))
+
+
+@router.post(
+    "/upload/sessions/{upload_id}/finalize",
+    response_model=UploadResponse,
+    summary="Assemble, verify and parse a completed session",
+    responses={202: {"description": "Parsing started; follow /upload/{id}/events"}},
+)
+async def finalize_upload_session(
+    upload_id: str,
+    wait: bool = Query(
+        True, description="false: return 202 at once and parse in the background"
+    ),
+):
+    _check_session_id(upload_id)
+    try:
+        session, dest = await run_in_threadpool(
+            finalize_session, upload_id, Path(settings.STORAGE_DIR)
+        )
+    except SessionNotFound:
+        raise HTTPException(404, "upload session not found")
+    except SessionIncomplete as e:
+        raise HTTPException(409, str(e), headers={"Upload-Offset": str(e.offset)})
+    except SessionBusy:
+        raise HTTPException(423, "another request is writing to this session")
+    except ChecksumMismatch as e:
+        raise HTTPException(460, str(e))
+
+    def run() -> Awaitable[UploadResponse]:
+        return _parse_and_index(
+            upload_id, dest, session.filename, session.content_type, session.size
+        )
+
+    if wait:
+        return await _with_progress(upload_id, run)
+    task = asyncio.create_task(_with_progress(upload_id, run))
+    _parse_tasks.add(task)
+    task.add_done_callback(_parse_tasks.discard)
+    # Failures are reported on the event stream; don't log them as unretrieved
+    task.add_done_callback(lambda t: t.cancelled() or t.exception())
+    return JSONResponse(
+        status_code=202,
+        content={
+            "upload_id": upload_id,
+            "events": f"{settings.API_BASE}/upload/{upload_id}/events",
+        },
+    )
+
+
+@router.delete(
+    "/upload/sessions/{upload_id}",
+    status_code=204,
+    summary="Abandon a resumable upload",
+)
+def delete_upload_session(upload_id: str) -> Response:
+    _check_session_id(upload_id)
+    try:
+        abort_session(upload_id)
+    except SessionNotFound:
+        raise HTTPException(404, "upload session not found")
+    except SessionBusy:
+        raise HTTPException(423, "another request is writing to this session")
+    return Response(status_code=204)
+
+
+@router.get(
+    "/upload/{upload_id}/events",
+    summary="Stream upload/parse progress (SSE, or NDJSON with ?format=ndjson)",
+)
+async def upload_events(
+    request: Request,
+    upload_id: str,
+    format: str = Query("sse", pattern="^(sse|ndjson)$"),
+):
+    if not _UPLOAD_ID.match(upload_id):
+        raise HTTPException(400, "invalid upload id")
+    try:
+        last_id = int(request.headers.get("last-event-id", ""))
+    except ValueError:
+        last_id = None
+
+    fmt = format_sse if format == "sse" else format_ndjson
+
+    async def _stream():
+        async for ev in progress_hub.subscribe(upload_id, last_id):
+            if await request.is_disconnected():
+                break
+            yield fmt(ev)
+
+    return StreamingResponse(
+        _stream(),
+        media_type="text/event-stream" if format == "sse" else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,246 @@
+from __future__ import annotations
+import asyncio
+import fnmatch
+import math
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Optional
+
+from app.core.config import Settings
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted; carries the HTTP status to send."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: int):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = max(1, int(retry_after))
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, cost: float) -> float:
+        """Consume `cost` tokens; return 0 on success or seconds until enough refill."""
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        # A single request larger than the burst is allowed from a full bucket.
+        need = min(cost, self.burst)
+        if self.tokens >= need:
+            self.tokens -= need
+            return 0.0
+        if self.rate <= 0:
+            return float("inf")
+        return (need - self.tokens) / self.rate
+
+
+class RouteLimiter:
+    """Weighted FIFO concurrency limit for one route group."""
+
+    def __init__(self, name: str, capacity: int, max_queue: int, timeout_s: float):
+        self.name = name
+        self.capacity = max(1, capacity)
+        self.max_queue = max(0, max_queue)
+        self.timeout_s = timeout_s
+        self.in_use = 0
+        self._waiters: deque[tuple[int, asyncio.Future]] = deque()
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _fits(self, cost: int) -> bool:
+        # Oversized requests still run, but only when the route is idle.
+        return self.in_use == 0 or self.in_use + cost <= self.capacity
+
+    async def acquire(self, cost: int) -> float:
+        """Wait for `cost` units; return seconds spent queued."""
+        if not self._waiters and self._fits(cost):
+            self.in_use += cost
+            self.admitted += 1
+            return 0.0
+        if len(self._waiters) >= self.max_queue:
+            self.rejected_queue_full += 1
+            raise AdmissionRejected(503, f"{self.name} is busy (queue full)", 1)
+
+        fut = asyncio.get_running_loop().create_future()
+        entry = (cost, fut)
+        self._waiters.append(entry)
+        t0 = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(fut), self.timeout_s)
+        except asyncio.TimeoutError:
+            if fut.done() and not fut.cancelled():
+                # Granted in the same tick the timeout fired; hand the units back.
+                self.release(cost)
+            else:
+                fut.cancel()
+                self._remove(entry)
+            self.rejected_timeout += 1
+            raise AdmissionRejected(
+                503, f"{self.name} is busy (queue timeout)", self.timeout_s
+            )
+        except BaseException:
+            if fut.done() and not fut.cancelled():
+                self.release(cost)
+            else:
+                fut.cancel()
+                self._remove(entry)
+            raise
+        self.admitted += 1
+        return time.perf_counter() - t0
+
+    def release(self, cost: int) -> None:
+        self.in_use = max(0, self.in_use - cost)
+        self._wake()
+
+    def _remove(self, entry) -> None:
+        try:
+            self._waiters.remove(entry)
+        except ValueError:
+            pass
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters:
+            cost, fut = self._waiters[0]
+            if fut.done():
+                self._waiters.popleft()
+                continue
+            if not self._fits(cost):
+                break
+            self._waiters.popleft()
+            self.in_use += cost
+            fut.set_result(None)
+
+    def snapshot(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "in_use": self.in_use,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+        }
+
+
+@dataclass
+class Ticket:
+    limiter: RouteLimiter
+    cost: int
+    waited_s: float
+
+    def release(self) -> None:
+        self.limiter.release(self.cost)
+
+
+class AdmissionController:
+    """Per-route weighted concurrency limits plus per-client token buckets."""
+
+    def __init__(self, cfg: Settings):
+        self.cfg = cfg
+        self.base = cfg.API_BASE.rstrip("/")
+        self._limiters: dict[str, RouteLimiter] = {}
+        self._buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+        self.rejected_rate_limited = 0
+        self.streams_open = 0
+
+    def _relative(self, path: str) -> str:
+        if self.base and path.startswith(self.base):
+            return path[len(self.base) :] or "/"
+        return path
+
+    def route_key(self, path: str) -> Optional[str]:
+        """Map a request path to its limiter group, or None if exempt."""
+        path = self._relative(path)
+        if any(_under(path, p) for p in self.cfg.ADMISSION_EXEMPT_PATHS):
+            return None
+        best = None
+        for prefix in self.cfg.ADMISSION_ROUTE_CONCURRENCY:
+            if _under(path, prefix) and (best is None or len(prefix) > len(best)):
+                best = prefix
+        return best or "*"
+
+    def is_stream(self, path: str) -> bool:
+        """Long-lived responses only pay the client bucket, never a route slot."""
+        path = self._relative(path)
+        return any(
+            fnmatch.fnmatchcase(path, p) for p in self.cfg.ADMISSION_STREAM_PATHS
+        )
+
+    def limiter(self, key: str) -> RouteLimiter:
+        lim = self._limiters.get(key)
+        if lim is None:
+            capacity = self.cfg.ADMISSION_ROUTE_CONCURRENCY.get(
+                key, self.cfg.ADMISSION_DEFAULT_CONCURRENCY
+            )
+            lim = RouteLimiter(
+                key,
+                capacity,
+                self.cfg.ADMISSION_MAX_QUEUE,
+                self.cfg.ADMISSION_QUEUE_TIMEOUT_S,
+            )
+            self._limiters[key] = lim
+        return lim
+
+    def request_cost(self, nbytes: int = 0, pages: int = 0) -> int:
+        """Cost units: 1 per request, plus body size and (when known) page count."""
+        cost = 1
+        if nbytes > 0:
+            cost += nbytes // max(1, self.cfg.ADMISSION_COST_BYTES_PER_UNIT)
+        if pages > 0:
+            cost += pages // max(1, self.cfg.ADMISSION_COST_PAGES_PER_UNIT)
+        return cost
+
+    def _bucket(self, client: str) -> TokenBucket:
+        b = self._buckets.get(client)
+        if b is None:
+            b = TokenBucket(self.cfg.RATE_LIMIT_PER_SEC, self.cfg.RATE_LIMIT_BURST)
+            self._buckets[client] = b
+            while len(self._buckets) > self.cfg.RATE_LIMIT_MAX_CLIENTS:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+        return b
+
+    def check_rate(self, client: Optional[str], cost: int) -> None:
+        if self.cfg.RATE_LIMIT_ENABLED and client:
+            wait = self._bucket(client).take(cost)
+            if wait > 0:
+                self.rejected_rate_limited += 1
+                raise AdmissionRejected(
+                    429,
+                    "Too many requests",
+                    math.ceil(wait) if math.isfinite(wait) else 60,
+                )
+
+    async def admit(self, key: str, client: Optional[str], cost: int) -> Ticket:
+        self.check_rate(client, cost)
+        lim = self.limiter(key)
+        waited = await lim.acquire(cost)
+        return Ticket(lim, cost, waited)
+
+    def snapshot(self) -> dict:
+        return {
+            "routes": {k: v.snapshot() for k, v in self._limiters.items()},
+            "queued": sum(v.queued for v in self._limiters.values()),
+            "rejected_rate_limited": self.rejected_rate_limited,
+            "streams_open": self.streams_open,
+            "tracked_clients": len(self._buckets),
+        }
+
+
+def _under(path: str, prefix: str) -> bool:
+    prefix = prefix.rstrip("/") or "/"
+    return path == prefix or path.startswith(prefix + "/") or prefix == "/"
@@ -0,0 +1,131 @@
+import gzip
+import zlib
+from typing import Callable, Iterable, Optional
+
+# brotli / zstandard are optional; without them only gzip is offered
+try:
+    import brotli
+except ImportError:  # pragma: no cover - depends on environment
+    brotli = None
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - depends on environment
+    zstandard = None
+
+# File suffix used for precompressed artifacts, per content-coding
+SUFFIXES = {"gzip": ".gz", "br": ".br", "zstd": ".zst"}
+
+_COMPRESSIBLE_PREFIXES = ("text/",)
+_COMPRESSIBLE_TYPES = {
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+}
+# Event streams must flush each event as-is; proxies also tend to mishandle them
+_NEVER_COMPRESS = {"text/event-stream"}
+
+
+class StreamCompressor:
+    """Incremental encoder; `compress(chunk)` output is flushed so it can be sent."""
+
+    def __init__(self, encoding: str, level: Optional[int] = None):
+        self.encoding = encoding
+        if encoding == "gzip":
+            self._z = zlib.compressobj(
+                6 if level is None else level, zlib.DEFLATED, 16 + zlib.MAX_WBITS
+            )
+            self._chunk = lambda b: (
+                self._z.compress(b) + self._z.flush(zlib.Z_SYNC_FLUSH)
+            )
+            self._finish = self._z.flush
+        elif encoding == "br":
+            self._z = brotli.Compressor(quality=4 if level is None else level)
+            self._chunk = lambda b: self._z.process(b) + self._z.flush()
+            self._finish = self._z.finish
+        elif encoding == "zstd":
+            self._z = zstandard.ZstdCompressor(
+                level=3 if level is None else level
+            ).compressobj()
+            self._chunk = lambda b: (
+                self._z.compress(b) + self._z.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+            )
+            self._finish = self._z.flush
+        else:
+            raise ValueError(f"unsupported encoding: {encoding}")
+
+    def compress(self, data: bytes) -> bytes:
+        return self._chunk(data) if data else b""
+
+    def finish(self) -> bytes:
+        return self._finish()
+
+
+def available() -> list[str]:
+    out = ["gzip"]
+    if brotli is not None:
+        out.append("br")
+    if zstandard is not None:
+        out.append("zstd")
+    return out
+
+
+def compress(data: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    """One-shot encode (used for precompressed artifacts)."""
+    if encoding == "gzip":
+        return gzip.compress(data, 9 if level is None else level, mtime=0)
+    if encoding == "br":
+        return brotli.compress(data, quality=11 if level is None else level)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=19 if level is None else level).compress(
+            data
+        )
+    raise ValueError(f"unsupported encoding: {encoding}")
+
+
+def is_compressible(content_type: Optional[str]) -> bool:
+    ctype = (content_type or "").split(";")[0].strip().lower()
+    if not ctype or ctype in _NEVER_COMPRESS:
+        return False
+    return (
+        ctype.startswith(_COMPRESSIBLE_PREFIXES)
+        or ctype in _COMPRESSIBLE_TYPES
+        or ctype.endswith(("+json", "+xml"))
+    )
+
+
+def negotiate(
+    accept_encoding: Optional[str],
+    offered: Iterable[str],
+    has: Callable[[str], bool] = lambda _: True,
+) -> Optional[str]:
+    """Pick a content-coding from Accept-Encoding.
+
+    Highest q-value wins; ties go to the order of `offered` (server
+    preference). q=0 rules a coding out; `*` matches anything offered that
+    wasn't listed explicitly. None means send the body as-is.
+    """
+    if not accept_encoding:
+        return None
+    q: dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        token = token.strip().lower()
+        if not token:
+            continue
+        weight = 1.0
+        for p in params.split(";"):
+            k, _, v = p.strip().partition("=")
+            if k.strip().lower() == "q":
+                try:
+                    weight = float(v)
+                except ValueError:
+                    weight = 0.0
+        q[token] = weight
+    best, best_q = None, 0.0
+    for enc in offered:
+        weight = q.get(enc, q.get("*", 0.0))
+        if weight > best_q and has(enc):
+            best, best_q = enc, weight
+    return best
@@ -1,6 +1,6 @@
 # backend/app/core/config.py
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from typing import List
+from typing import Dict, List
 from pathlib import Path
 
 # Resolve the backend project root (…/backend)
@@ -31,6 +31,97 @@ class Settings(BaseSettings):
     RETENTION_DAYS: int = 7
     RETENTION_SWEEP_MINUTES: int = 30
 
+    # Resumable uploads (create / PATCH chunks / HEAD / finalize)
+    MAX_RESUMABLE_UPLOAD_MB: int = 200
+    UPLOAD_CHUNK_MAX_MB: int = 16
+    UPLOAD_SESSION_TTL_HOURS: int = 24
+
+    # Admission control: per-route concurrency in cost units (keys are paths
+    # under API_BASE; longest prefix wins), bounded wait queue, per-client buckets
+    ADMISSION_ENABLED: bool = True
+    ADMISSION_DEFAULT_CONCURRENCY: int = 32
+    ADMISSION_ROUTE_CONCURRENCY: Dict[str, int] = {
+        "/upload": 8,
+        "/export": 8,
+        "/outline": 16,
+    }
+    ADMISSION_EXEMPT_PATHS: List[str] = ["/health", "/ops"]
+    # Held open for as long as the client reads (progress streams, export
+    # downloads); rate-limited per client but never take a route slot
+    ADMISSION_STREAM_PATHS: List[str] = ["/upload/*/events", "/export/*"]
+    ADMISSION_MAX_QUEUE: int = 32
+    ADMISSION_QUEUE_TIMEOUT_S: float = 10.0
+    ADMISSION_COST_BYTES_PER_UNIT: int = 4 * 1024 * 1024
+    ADMISSION_COST_PAGES_PER_UNIT: int = 25
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMIT_PER_SEC: float = 10.0
+    RATE_LIMIT_BURST: float = 40.0
+    RATE_LIMIT_MAX_CLIENTS: int = 10000
+
+    # Server-side deck store (populated by /outline, edited via PATCH /decks)
+    DECK_STORE_MAX_DECKS: int = 500
+    DECK_STORE_MAX_REVISIONS: int = 20
+    EXPORT_RENDER_CACHE_SIZE: int = 4096
+
+    # Batch outline (POST /outline/batch): items in flight per batch, batch size
+    OUTLINE_BATCH_CONCURRENCY: int = 8
+    OUTLINE_BATCH_MAX_ITEMS: int = 100
+
+    # Upload progress streams (GET /upload/{upload_id}/events)
+    PROGRESS_MAX_CHANNELS: int = 10000
+    PROGRESS_MAX_EVENTS: int = 256
+    PROGRESS_TTL_S: float = 600.0
+    PROGRESS_PENDING_TTL_S: float = 60.0  # subscribed before any upload started
+    PROGRESS_HEARTBEAT_S: float = 15.0
+
+    # Full-text passage index over parsed uploads (GET /search)
+    SEARCH_ENABLED: bool = True
+    SEARCH_INDEX_DIR: Path = BACKEND_ROOT / "data" / "index"
+    SEARCH_MAX_SEGMENTS: int = 8
+    SEARCH_PASSAGE_CHARS: int = 600
+
+    # Slide media fetching (shared pooled client + content-addressed disk cache)
+    EXPORT_FETCH_MEDIA: bool = False
+    MEDIA_CACHE_DIR: Path = BACKEND_ROOT / "data" / "media"
+    MEDIA_CACHE_MAX_MB: int = 512
+    MEDIA_MAX_CONCURRENCY: int = 8
+    MEDIA_TIMEOUT_S: float = 10.0
+    MEDIA_MAX_IMAGE_MB: int = 10
+    MEDIA_FRESH_S: float = 3600.0
+    # Host globs slide images may come from (empty: any public host); private,
+    # loopback and link-local addresses are refused either way
+    MEDIA_ALLOWED_HOSTS: List[str] = []
+    MEDIA_SLIDE_WIDTH: int = 1920
+    MEDIA_SLIDE_HEIGHT: int = 1080
+
+    # Response compression (br/zstd via the pinned brotli/zstandard packages)
+    COMPRESSION_ENABLED: bool = True
+    COMPRESSION_ENCODINGS: List[str] = ["zstd", "br", "gzip"]  # server preference
+    COMPRESSION_MIN_BYTES: int = 1024
+    COMPRESSION_LEVELS: Dict[str, int] = {"gzip": 6, "br": 4, "zstd": 3}
+    EXPORT_PRECOMPRESS: bool = True
+    EXPORT_CACHE_MAX_AGE_S: int = 31536000  # exports are immutable once written
+
+    # Multi-worker coordination (flock leader election + SQLite shared cache)
+    COORD_DIR: Path = BACKEND_ROOT / "data" / "coord"
+    SHARED_CACHE_ENABLED: bool = True
+    SHARED_CACHE_MAX_ENTRIES: int = 20000
+    WORKER_METRICS_INTERVAL_S: float = 10.0
+    WORKER_METRICS_STALE_S: float = 60.0
+
+    # Tracing (W3C traceparent, head sampling, batched OTLP/JSON export)
+    TRACE_SAMPLE_RATE: float = 0.1  # fraction of new traces kept
+    TRACE_EXPORTER: str = "file"  # file | otlp | none
+    TRACE_EXPORT_FILE: Path = BACKEND_ROOT / "data" / "traces" / "spans.jsonl"
+    TRACE_EXPORT_FILE_MAX_MB: int = 64
+    TRACE_EXPORT_ENDPOINT: str = "http://127.0.0.1:4318/v1/traces"
+    TRACE_EXPORT_TIMEOUT_S: float = 5.0
+    TRACE_EXPORT_BATCH: int = 512
+    TRACE_EXPORT_INTERVAL_S: float = 5.0
+    TRACE_MAX_QUEUE: int = 8192
+    TRACE_SERVICE_NAME: str = "presentuneai-api"
+    SERVER_TIMING_MAX_ENTRIES: int = 12
+
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
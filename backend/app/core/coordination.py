@@ -0,0 +1,313 @@
+"""Cross-process coordination for multi-worker deployments.
+
+Every uvicorn/gunicorn worker imports the app separately, so anything that
+must happen once (retention) or be seen by all workers (caches, metrics)
+goes through the local filesystem: flock-based locks and a small SQLite
+database in WAL mode under COORD_DIR.
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+from app.core.config import settings
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX: single worker assumed
+    fcntl = None
+
+
+def worker_id() -> str:
+    # Computed on demand: with a preloaded app the pid changes after fork
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+@contextmanager
+def file_lock(path: Path, blocking: bool = True) -> Iterator[None]:
+    """Exclusive lock shared by every process on this host.
+
+    With `blocking=False` a held lock raises BlockingIOError immediately.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "a+b") as fh:
+        if fcntl is not None:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_UN)
+
+
+class LeaderLock:
+    """Non-blocking flock held for the life of the process.
+
+    The kernel drops the lock when the holder exits (or crashes), so another
+    worker picks up leadership on its next `try_acquire()`.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._fh = None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._fh is not None
+
+    def try_acquire(self) -> bool:
+        if self._fh is not None:
+            return True
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        fh = open(self.path, "a+b")
+        if fcntl is not None:
+            try:
+                fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                fh.close()
+                return False
+        fh.seek(0)
+        fh.truncate()
+        fh.write(worker_id().encode())
+        fh.flush()
+        self._fh = fh
+        return True
+
+    def holder(self) -> Optional[str]:
+        try:
+            return self.path.read_text(encoding="utf-8").strip() or None
+        except OSError:
+            return None
+
+    def release(self) -> None:
+        fh, self._fh = self._fh, None
+        if fh is not None:
+            # Closing the descriptor releases the flock
+            fh.close()
+
+
+class SharedCache:
+    """Namespaced byte cache in SQLite (WAL), visible to every worker.
+
+    Meant as a second level behind per-process dicts: a few tens of
+    microseconds per lookup, LRU-trimmed to `max_entries` as it grows.
+    """
+
+    _TRIM_EVERY = 256
+    _TOUCH_AFTER_S = 60.0  # don't turn every hit into a write
+
+    def __init__(self, path: Path, max_entries: int):
+        self.path = Path(path)
+        self.max_entries = max(1, max_entries)
+        self._local = threading.local()
+        self._init_lock = threading.Lock()
+        self._ready = False
+        self._writes = 0
+        self.hits = self.misses = 0
+
+    def _db(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        # SQLite handles must not cross a fork
+        if conn is None or self._local.pid != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with self._init_lock:
+                if not self._ready:
+                    conn.executescript(
+                        """
+                        CREATE TABLE IF NOT EXISTS cache (
+                            ns TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL,
+                            touched REAL NOT NULL, PRIMARY KEY (ns, key)
+                        ) WITHOUT ROWID;
+                        CREATE INDEX IF NOT EXISTS cache_touched ON cache (touched);
+                        CREATE TABLE IF NOT EXISTS workers (
+                            worker TEXT PRIMARY KEY, updated REAL NOT NULL,
+                            payload TEXT NOT NULL
+                        );
+                        CREATE TABLE IF NOT EXISTS decks (
+                            id TEXT PRIMARY KEY, head INTEGER NOT NULL
+                        );
+                        CREATE TABLE IF NOT EXISTS deck_revisions (
+                            id TEXT NOT NULL, revision INTEGER NOT NULL,
+                            value BLOB NOT NULL, PRIMARY KEY (id, revision)
+                        ) WITHOUT ROWID;
+                        """
+                    )
+                    self._ready = True
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return conn
+
+    def get(self, ns: str, key: str) -> Optional[bytes]:
+        db = self._db()
+        row = db.execute(
+            "SELECT value, touched FROM cache WHERE ns=? AND key=?", (ns, key)
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        now = time.time()
+        if now - row[1] > self._TOUCH_AFTER_S:
+            db.execute(
+                "UPDATE cache SET touched=? WHERE ns=? AND key=?", (now, ns, key)
+            )
+        return row[0]
+
+    def set(self, ns: str, key: str, value: bytes) -> None:
+        self._db().execute(
+            "INSERT OR REPLACE INTO cache (ns, key, value, touched) VALUES (?,?,?,?)",
+            (ns, key, value, time.time()),
+        )
+        self._wrote()
+
+    def add(self, ns: str, key: str, value: bytes) -> bool:
+        """Insert only if absent; False means another worker got there first."""
+        cur = self._db().execute(
+            "INSERT OR IGNORE INTO cache (ns, key, value, touched) VALUES (?,?,?,?)",
+            (ns, key, value, time.time()),
+        )
+        self._wrote()
+        return cur.rowcount == 1
+
+    def delete(self, ns: str, key: str) -> None:
+        self._db().execute("DELETE FROM cache WHERE ns=? AND key=?", (ns, key))
+
+    def _wrote(self) -> None:
+        self._writes += 1
+        if self._writes % self._TRIM_EVERY == 0:
+            self.trim()
+
+    def trim(self) -> int:
+        db = self._db()
+        (n,) = db.execute("SELECT COUNT(*) FROM cache").fetchone()
+        excess = n - self.max_entries
+        if excess <= 0:
+            return 0
+        db.execute(
+            "DELETE FROM cache WHERE (ns, key) IN "
+            "(SELECT ns, key FROM cache ORDER BY touched LIMIT ?)",
+            (excess,),
+        )
+        return excess
+
+    # Deck revisions (separate tables: state, not cache, so never trimmed)
+
+    def deck_create(self, deck_id: str, value: bytes) -> bool:
+        """Store revision 1 of a new deck; False if the id already exists."""
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            cur = db.execute(
+                "INSERT OR IGNORE INTO decks (id, head) VALUES (?, 1)", (deck_id,)
+            )
+            if cur.rowcount == 1:
+                db.execute(
+                    "INSERT OR REPLACE INTO deck_revisions VALUES (?, 1, ?)",
+                    (deck_id, value),
+                )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return cur.rowcount == 1
+
+    def deck_advance(
+        self, deck_id: str, base: int, revision: int, value: bytes, keep: int
+    ) -> bool:
+        """Compare-and-swap the head from `base` to `revision`.
+
+        False if another worker moved the head first (or the deck is gone).
+        Only the newest `keep` revisions are retained.
+        """
+        db = self._db()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            cur = db.execute(
+                "UPDATE decks SET head=? WHERE id=? AND head=?",
+                (revision, deck_id, base),
+            )
+            if cur.rowcount == 1:
+                db.execute(
+                    "INSERT OR REPLACE INTO deck_revisions VALUES (?, ?, ?)",
+                    (deck_id, revision, value),
+                )
+                db.execute(
+                    "DELETE FROM deck_revisions WHERE id=? AND revision<=?",
+                    (deck_id, revision - keep),
+                )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return cur.rowcount == 1
+
+    def deck_head(self, deck_id: str) -> Optional[int]:
+        row = (
+            self._db()
+            .execute("SELECT head FROM decks WHERE id=?", (deck_id,))
+            .fetchone()
+        )
+        return row[0] if row else None
+
+    def deck_revision(self, deck_id: str, revision: int) -> Optional[bytes]:
+        row = (
+            self._db()
+            .execute(
+                "SELECT value FROM deck_revisions WHERE id=? AND revision=?",
+                (deck_id, revision),
+            )
+            .fetchone()
+        )
+        return row[0] if row else None
+
+    # Per-worker metrics board (same database, separate table)
+
+    def publish_metrics(self, payload: dict) -> None:
+        self._db().execute(
+            "INSERT OR REPLACE INTO workers (worker, updated, payload) VALUES (?,?,?)",
+            (worker_id(), time.time(), json.dumps(payload, default=str)),
+        )
+
+    def collect_metrics(self, max_age_s: float) -> dict[str, dict]:
+        db = self._db()
+        cutoff = time.time() - max_age_s
+        db.execute("DELETE FROM workers WHERE updated < ?", (cutoff,))
+        return {
+            w: {"updated": u, "metrics": json.loads(p)}
+            for w, u, p in db.execute("SELECT worker, updated, payload FROM workers")
+        }
+
+    def stats(self) -> dict:
+        db = self._db()
+        rows = db.execute("SELECT ns, COUNT(*) FROM cache GROUP BY ns").fetchall()
+        return {"entries": dict(rows), "max_entries": self.max_entries}
+
+
+def aggregate(snapshots: list[dict]) -> dict:
+    """Sum numeric leaves across worker snapshots (nested dicts merged)."""
+    out: dict = {}
+    for snap in snapshots:
+        for k, v in snap.items():
+            if isinstance(v, bool):
+                continue
+            if isinstance(v, (int, float)):
+                out[k] = out.get(k, 0) + v
+            elif isinstance(v, dict):
+                out[k] = aggregate([out.get(k, {}), v])
+    return out
+
+
+# Always present (the metrics board lives here); caches only use it when
+# SHARED_CACHE_ENABLED is set.
+shared_cache = SharedCache(
+    settings.COORD_DIR / "shared.sqlite3", settings.SHARED_CACHE_MAX_ENTRIES
+)
+retention_leader = LeaderLock(settings.COORD_DIR / "retention.leader")
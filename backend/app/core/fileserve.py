@@ -0,0 +1,275 @@
+"""Serving immutable on-disk artifacts: strong ETags, 304s, byte ranges.
+
+The body goes out as ASGI `http.response.zerocopysend` (sendfile) when the
+server offers that extension, `http.response.pathsend` for whole files, and
+otherwise as large pread() chunks read off the event loop.
+"""
+
+import hashlib
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import Optional
+
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import Response
+from starlette.types import Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.coordination import shared_cache
+
+READ_CHUNK = 1024 * 1024
+MAX_RANGES = 16  # more than this and we just send the whole file
+
+_etags: OrderedDict[tuple, str] = OrderedDict()
+_etag_lock = threading.Lock()
+_ETAG_CACHE_SIZE = 4096
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def content_etag(path: Path, st: Optional[os.stat_result] = None) -> str:
+    """Strong ETag = blake2b of the file bytes, cached per (inode, mtime, size)."""
+    st = st or os.stat(path)
+    key = (str(path), st.st_ino, st.st_mtime_ns, st.st_size)
+    with _etag_lock:
+        etag = _etags.get(key)
+        if etag is not None:
+            _etags.move_to_end(key)
+            return etag
+    skey = ":".join(map(str, key))
+    raw = shared_cache.get("etag", skey) if settings.SHARED_CACHE_ENABLED else None
+    if raw is not None:
+        etag = raw.decode()
+    else:
+        with open(path, "rb") as f:
+            digest = hashlib.file_digest(f, lambda: hashlib.blake2b(digest_size=16))
+        etag = f'"{digest.hexdigest()}"'
+        if settings.SHARED_CACHE_ENABLED:
+            shared_cache.set("etag", skey, etag.encode())
+    with _etag_lock:
+        _etags[key] = etag
+        while len(_etags) > _ETAG_CACHE_SIZE:
+            _etags.popitem(last=False)
+    return etag
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[list[tuple[int, int]]]:
+    """`Range: bytes=...` -> sorted, coalesced inclusive (start, end) pairs.
+
+    None means "ignore the header and send 200" (absent, other unit,
+    malformed, or too many ranges); raises RangeNotSatisfiable when no
+    range overlaps the file.
+    """
+    if not header or not header.strip().lower().startswith("bytes="):
+        return None
+    ranges: list[tuple[int, int]] = []
+    for spec in header.strip()[6:].split(","):
+        spec = spec.strip()
+        if not spec:
+            continue
+        first, sep, last = spec.partition("-")
+        # ASCII digits only: int() would also take "-5", "+5", " 5" or "²"
+        digits = first + last
+        if not sep or not (digits.isascii() and digits.isdigit()):
+            return None
+        if not first:
+            n = int(last)
+            if n <= 0:
+                continue
+            start, end = max(0, size - n), size - 1
+        else:
+            start = int(first)
+            end = int(last) if last else max(start, size - 1)
+            if end < start:
+                return None
+            end = min(end, size - 1)
+        if start < size:
+            ranges.append((start, end))
+    if not ranges:
+        raise RangeNotSatisfiable()
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        if start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    if len(merged) > MAX_RANGES:
+        return None
+    return merged
+
+
+def _etag_match(header: str, etag: str, weak: bool) -> bool:
+    tags = [t.strip() for t in header.split(",")]
+    if "*" in tags:
+        return True
+    if weak:
+        bare = etag.removeprefix("W/")
+        return any(t.removeprefix("W/") == bare for t in tags)
+    return not etag.startswith("W/") and etag in tags
+
+
+def _not_modified(req: Headers, etag: str, mtime: float) -> bool:
+    inm = req.get("if-none-match")
+    if inm is not None:
+        return _etag_match(inm, etag, weak=True)
+    ims = req.get("if-modified-since")
+    if ims:
+        try:
+            return int(mtime) <= parsedate_to_datetime(ims).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _if_range_ok(req: Headers, etag: str, last_modified: str) -> bool:
+    value = req.get("if-range")
+    if value is None:
+        return True
+    value = value.strip()
+    if value.startswith(('"', "W/")):
+        return _etag_match(value, etag, weak=False)
+    return value == last_modified
+
+
+def serve_file(
+    method: str,
+    req: Headers,
+    path: Path,
+    media_type: str,
+    filename: Optional[str] = None,
+    headers: Optional[dict[str, str]] = None,
+) -> Response:
+    """Build the response for GET/HEAD of an immutable file (blocking: stats + hashes)."""
+    st = os.stat(path)
+    etag = content_etag(path, st)
+    last_modified = formatdate(st.st_mtime, usegmt=True)
+    base = {
+        "ETag": etag,
+        "Last-Modified": last_modified,
+        "Cache-Control": (
+            f"public, max-age={settings.EXPORT_CACHE_MAX_AGE_S}, immutable, no-transform"
+        ),
+        "Accept-Ranges": "bytes",
+        **(headers or {}),
+    }
+    if _not_modified(req, etag, st.st_mtime):
+        base.pop("Accept-Ranges")
+        return Response(status_code=304, headers=base)
+    if filename:
+        base["Content-Disposition"] = f'attachment; filename="{filename}"'
+
+    ranges = None
+    if method == "GET" and _if_range_ok(req, etag, last_modified):
+        try:
+            ranges = parse_range(req.get("range"), st.st_size)
+        except RangeNotSatisfiable:
+            base["Content-Range"] = f"bytes */{st.st_size}"
+            return Response(status_code=416, headers=base)
+    return FileBodyResponse(path, st.st_size, media_type, base, ranges)
+
+
+class FileBodyResponse(Response):
+    """200 / single-range 206 / multipart/byteranges 206 for one file."""
+
+    def __init__(
+        self,
+        path: Path,
+        size: int,
+        media_type: str,
+        headers: dict[str, str],
+        ranges: Optional[list[tuple[int, int]]] = None,
+    ):
+        self.path = path
+        self.size = size
+        self.background = None
+        self.parts: list[tuple[bytes, int, int]] = []  # (prefix, offset, count)
+        self.trailer = b""
+        headers = dict(headers)
+        if not ranges:
+            self.status_code = 200
+            self.parts = [(b"", 0, size)]
+            content_type = media_type
+        elif len(ranges) == 1:
+            start, end = ranges[0]
+            self.status_code = 206
+            self.parts = [(b"", start, end - start + 1)]
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            content_type = media_type
+        else:
+            self.status_code = 206
+            boundary = uuid.uuid4().hex
+            for i, (start, end) in enumerate(ranges):
+                prefix = (b"\r\n" if i else b"") + (
+                    f"--{boundary}\r\n"
+                    f"Content-Type: {media_type}\r\n"
+                    f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+                ).encode("latin-1")
+                self.parts.append((prefix, start, end - start + 1))
+            self.trailer = f"\r\n--{boundary}--\r\n".encode("latin-1")
+            content_type = f"multipart/byteranges; boundary={boundary}"
+        length = sum(len(p) + n for p, _, n in self.parts) + len(self.trailer)
+        headers["Content-Length"] = str(length)
+        self.media_type = content_type
+        self.init_headers(headers)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        if scope["method"].upper() == "HEAD":
+            await send({"type": "http.response.body", "body": b""})
+            return
+        ext = scope.get("extensions") or {}
+        if (
+            self.status_code == 200
+            and "http.response.pathsend" in ext
+            and "http.response.zerocopysend" not in ext
+        ):
+            await send({"type": "http.response.pathsend", "path": str(self.path)})
+            return
+        zerocopy = "http.response.zerocopysend" in ext
+        with open(self.path, "rb", buffering=0) as f:
+            for prefix, offset, count in self.parts:
+                if prefix:
+                    await send(
+                        {
+                            "type": "http.response.body",
+                            "body": prefix,
+                            "more_body": True,
+                        }
+                    )
+                if zerocopy:
+                    await send(
+                        {
+                            "type": "http.response.zerocopysend",
+                            "file": f,
+                            "offset": offset,
+                            "count": count,
+                            "more_body": True,
+                        }
+                    )
+                    continue
+                fd = f.fileno()
+                end = offset + count
+                while offset < end:
+                    n = min(READ_CHUNK, end - offset)
+                    chunk = await anyio.to_thread.run_sync(os.pread, fd, n, offset)
+                    if not chunk:
+                        raise RuntimeError(f"{self.path} shrank while being sent")
+                    offset += len(chunk)
+                    await send(
+                        {"type": "http.response.body", "body": chunk, "more_body": True}
+                    )
+        await send({"type": "http.response.body", "body": self.trailer})
@@ -1,15 +1,79 @@
 from __future__ import annotations
+import threading
 import time
 import logging
 from contextlib import contextmanager, asynccontextmanager
 from contextvars import ContextVar
-from typing import Optional
+from typing import Callable, NamedTuple, Optional
+
+from app.core.tracing import (
+    SPAN_KIND_SERVER,
+    new_span_id,
+    new_trace_id,
+    parse_traceparent,
+    should_sample,
+    span_exporter,
+)
+
+
+class SpanContext(NamedTuple):
+    trace_id: str
+    span_id: str
+    sampled: bool
+
+
+class ServerTiming:
+    """Per-request `Server-Timing` entries, summed by name and capped.
+
+    Per-page spans collapse into one `name;dur=<total>;desc="xN"` entry, and
+    past `max_entries` names only the slowest are kept, the rest folded
+    into `other`.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max(1, max_entries)
+        self._entries: dict[str, list[int]] = {}  # name -> [total_ms, count]
+        self._lock = threading.Lock()  # spans also finish in worker threads
+
+    def add(self, name: str, duration_ms: int) -> None:
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None:
+                self._entries[name] = [duration_ms, 1]
+            else:
+                entry[0] += duration_ms
+                entry[1] += 1
+
+    def header(self, *extra: str) -> str:
+        with self._lock:
+            items = [(name, tuple(e)) for name, e in self._entries.items()]
+        keep = max(1, self.max_entries - len(extra))
+        if len(items) > keep:
+            ranked = sorted(items, key=lambda kv: kv[1][0], reverse=True)
+            kept = {name for name, _ in ranked[: keep - 1]}
+            rest = ranked[keep - 1 :]
+            items = [kv for kv in items if kv[0] in kept]
+            items.append(
+                ("other", (sum(e[0] for _, e in rest), sum(e[1] for _, e in rest)))
+            )
+        parts = [
+            f"{name};dur={total}" + (f';desc="x{count}"' if count > 1 else "")
+            for name, (total, count) in items
+        ]
+        return ", ".join(parts + list(extra))
+
 
 # Context set/reset by ObservabilityMiddleware
 request_id_ctx: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
-server_timing_ctx: ContextVar[Optional[list[str]]] = ContextVar(
+server_timing_ctx: ContextVar[Optional[ServerTiming]] = ContextVar(
     "server_timing", default=None
 )
+# Current span; new spans become its children
+trace_ctx: ContextVar[Optional[SpanContext]] = ContextVar("trace", default=None)
+# Set by handlers that stream progress (e.g. upload); receives (event, data)
+progress_ctx: ContextVar[Optional[Callable[[str, dict], None]]] = ContextVar(
+    "progress", default=None
+)
 
 _perf_log = logging.getLogger("perf")
 
@@ -49,8 +113,28 @@ def _sanitize_fields(fields: dict) -> dict:
     return out
 
 
-def _emit(name: str, duration_ms: int, logger: Optional[logging.Logger], **fields):
-    """Internal: emit a perf span log and enqueue Server-Timing entry if available."""
+def _child_of(parent: Optional[SpanContext]) -> SpanContext:
+    if parent is None:
+        return SpanContext(new_trace_id(), new_span_id(), should_sample())
+    return SpanContext(parent.trace_id, new_span_id(), parent.sampled)
+
+
+def _finish(record: dict, sampled: bool) -> None:
+    if sampled:
+        span_exporter.submit(record)
+
+
+def _emit(
+    name: str,
+    ctx: SpanContext,
+    parent: Optional[SpanContext],
+    start_ns: int,
+    duration_ms: int,
+    error: Optional[BaseException],
+    logger: Optional[logging.Logger],
+    fields: dict,
+):
+    """Internal: log the span, add it to Server-Timing and hand it to the exporter."""
     log = logger or _perf_log
     safe_fields = _sanitize_fields(fields)
     payload = {"span": name, "duration_ms": duration_ms} | safe_fields
@@ -58,28 +142,125 @@ def _emit(name: str, duration_ms: int, logger: Optional[logging.Logger], **field
     rid = request_id_ctx.get()
     if rid:
         payload["request_id"] = rid
+    payload["trace_id"] = ctx.trace_id
+    payload["span_id"] = ctx.span_id
+    if parent is not None:
+        payload["parent_id"] = parent.span_id
 
     # Add to Server-Timing so it shows in browser DevTools
     st = server_timing_ctx.get()
     if st is not None:
-        st.append(f"{name};dur={duration_ms}")
+        st.add(name, duration_ms)
 
     log.info("span", extra=payload)
 
+    sink = progress_ctx.get()
+    if sink is not None:
+        sink("span", {"name": name, "duration_ms": duration_ms})
+
+    _finish(
+        {
+            "name": name,
+            "trace_id": ctx.trace_id,
+            "span_id": ctx.span_id,
+            "parent_id": parent.span_id if parent else None,
+            "start_ns": start_ns,
+            "end_ns": time.time_ns(),
+            "duration_ms": duration_ms,
+            "attributes": fields,
+            "error": repr(error) if error is not None else None,
+        },
+        ctx.sampled,
+    )
+
+
+def _restore(token, parent: Optional[SpanContext]) -> None:
+    try:
+        trace_ctx.reset(token)
+    except ValueError:
+        # Exited in another context (e.g. a generator finished by another task)
+        trace_ctx.set(parent)
+
+
+def progress(event: str, **data) -> None:
+    """Report intermediate progress from inside a span (no-op without a listener)."""
+    sink = progress_ctx.get()
+    if sink is not None:
+        sink(event, data)
+
 
 @contextmanager
 def span(name: str, logger: Optional[logging.Logger] = None, **fields):
-    t0 = time.perf_counter()
+    """Time a block; the yielded dict can be updated with fields known only later."""
+    parent = trace_ctx.get()
+    ctx = _child_of(parent)
+    token = trace_ctx.set(ctx)
+    start_ns, t0 = time.time_ns(), time.perf_counter()
+    error = None
     try:
-        yield
+        yield fields
+    except Exception as e:
+        error = e
+        raise
     finally:
-        _emit(name, int((time.perf_counter() - t0) * 1000), logger, **fields)
+        _restore(token, parent)
+        duration_ms = int((time.perf_counter() - t0) * 1000)
+        _emit(name, ctx, parent, start_ns, duration_ms, error, logger, fields)
 
 
 @asynccontextmanager
 async def aspan(name: str, logger: Optional[logging.Logger] = None, **fields):
-    t0 = time.perf_counter()
+    parent = trace_ctx.get()
+    ctx = _child_of(parent)
+    token = trace_ctx.set(ctx)
+    start_ns, t0 = time.time_ns(), time.perf_counter()
+    error = None
     try:
-        yield
+        yield fields
+    except Exception as e:
+        error = e
+        raise
     finally:
-        _emit(name, int((time.perf_counter() - t0) * 1000), logger, **fields)
+        _restore(token, parent)
+        duration_ms = int((time.perf_counter() - t0) * 1000)
+        _emit(name, ctx, parent, start_ns, duration_ms, error, logger, fields)
+
+
+def start_trace(traceparent: Optional[str]) -> tuple[SpanContext, Optional[str]]:
+    """Root context for a request: continue the caller's trace or start one.
+
+    Returns the context and the caller's span id (None for a new trace); the
+    caller's sampled flag wins over TRACE_SAMPLE_RATE.
+    """
+    incoming = parse_traceparent(traceparent)
+    if incoming is None:
+        return SpanContext(new_trace_id(), new_span_id(), should_sample()), None
+    trace_id, parent_id, sampled = incoming
+    return SpanContext(trace_id, new_span_id(), sampled), parent_id
+
+
+def record_server_span(
+    name: str,
+    ctx: SpanContext,
+    parent_id: Optional[str],
+    start_ns: int,
+    end_ns: int,
+    attributes: dict,
+    error: Optional[str] = None,
+) -> None:
+    """Export the request's root span (logged separately as request_complete)."""
+    if not ctx.sampled:
+        return
+    span_exporter.submit(
+        {
+            "name": name,
+            "kind": SPAN_KIND_SERVER,
+            "trace_id": ctx.trace_id,
+            "span_id": ctx.span_id,
+            "parent_id": parent_id,
+            "start_ns": start_ns,
+            "end_ns": end_ns,
+            "attributes": attributes,
+            "error": error,
+        }
+    )
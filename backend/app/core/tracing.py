@@ -0,0 +1,269 @@
+"""Trace ids, head sampling and batched OTLP/JSON span export.
+
+Spans are recorded by `app.core.telemetry`; this module only decides which
+traces to keep and ships finished spans off the request path. A daemon
+thread per worker drains a bounded queue every TRACE_EXPORT_INTERVAL_S (or
+as soon as TRACE_EXPORT_BATCH spans are waiting) into one of:
+
+- `file`: one OTLP/JSON `ExportTraceServiceRequest` per line, the same
+  shape the OpenTelemetry collector's file exporter writes
+- `otlp`: POST to an OTLP/HTTP endpoint (`/v1/traces`, JSON encoding)
+- `none`: ids and sampling still apply, nothing is exported
+"""
+
+import json
+import logging
+import os
+import random
+import threading
+from collections import deque
+from pathlib import Path
+from typing import Optional
+
+import httpx
+
+from app.core.config import settings
+from app.core.coordination import file_lock, worker_id
+
+log = logging.getLogger("perf")
+
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+STATUS_ERROR = 2
+
+
+def new_trace_id() -> str:
+    return f"{random.getrandbits(128) or 1:032x}"
+
+
+def new_span_id() -> str:
+    return f"{random.getrandbits(64) or 1:016x}"
+
+
+def should_sample() -> bool:
+    """Head-based decision, made once at the root of a trace."""
+    rate = settings.TRACE_SAMPLE_RATE
+    return rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[tuple[str, str, bool]]:
+    """W3C `traceparent` -> (trace_id, parent span id, sampled); None if invalid."""
+    if not header:
+        return None
+    parts = header.strip().lower().split("-")
+    if len(parts) < 4 or len(parts[0]) != 2 or parts[0] == "ff":
+        return None
+    _, trace_id, span_id, flags = parts[:4]
+    try:
+        if len(trace_id) != 32 or len(span_id) != 16 or len(flags) != 2:
+            return None
+        if int(trace_id, 16) == 0 or int(span_id, 16) == 0:
+            return None
+        sampled = bool(int(flags, 16) & 1)
+    except ValueError:
+        return None
+    return trace_id, span_id, sampled
+
+
+def format_traceparent(trace_id: str, span_id: str, sampled: bool) -> str:
+    return f"00-{trace_id}-{span_id}-{'01' if sampled else '00'}"
+
+
+def _attr_value(v) -> dict:
+    if isinstance(v, bool):
+        return {"boolValue": v}
+    if isinstance(v, int):
+        return {"intValue": str(v)}  # int64 travels as a string in OTLP/JSON
+    if isinstance(v, float):
+        return {"doubleValue": v}
+    return {"stringValue": str(v)}
+
+
+def _attributes(fields: dict) -> list[dict]:
+    return [
+        {"key": k, "value": _attr_value(v)} for k, v in fields.items() if v is not None
+    ]
+
+
+def to_otlp(record: dict) -> dict:
+    """One finished span (as recorded by telemetry) in OTLP/JSON form."""
+    out = {
+        "traceId": record["trace_id"],
+        "spanId": record["span_id"],
+        "name": record["name"],
+        "kind": record.get("kind", SPAN_KIND_INTERNAL),
+        "startTimeUnixNano": str(record["start_ns"]),
+        "endTimeUnixNano": str(record["end_ns"]),
+        "attributes": _attributes(record.get("attributes") or {}),
+    }
+    if record.get("parent_id"):
+        out["parentSpanId"] = record["parent_id"]
+    if record.get("error"):
+        out["status"] = {"code": STATUS_ERROR, "message": record["error"]}
+    return out
+
+
+def export_request(records: list[dict]) -> dict:
+    """Wrap spans in an `ExportTraceServiceRequest` for this worker."""
+    resource = {
+        "service.name": settings.TRACE_SERVICE_NAME,
+        "service.instance.id": worker_id(),
+        "process.pid": os.getpid(),
+    }
+    return {
+        "resourceSpans": [
+            {
+                "resource": {"attributes": _attributes(resource)},
+                "scopeSpans": [
+                    {
+                        "scope": {"name": "app.core.telemetry"},
+                        "spans": [to_otlp(r) for r in records],
+                    }
+                ],
+            }
+        ]
+    }
+
+
+class FileSink:
+    """Append-only JSON lines; rotated to `<name>.1` past `max_bytes`."""
+
+    def __init__(self, path: Path, max_bytes: int):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+
+    def write(self, payload: dict) -> None:
+        line = json.dumps(payload, separators=(",", ":")) + "\n"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Workers share the file; the lock keeps lines whole across rotation
+        with file_lock(self.path.with_name(self.path.name + ".lock")):
+            try:
+                if self.path.stat().st_size >= self.max_bytes:
+                    os.replace(self.path, self.path.with_name(self.path.name + ".1"))
+            except FileNotFoundError:
+                pass
+            with self.path.open("a", encoding="utf-8") as f:
+                f.write(line)
+
+
+class OTLPHttpSink:
+    def __init__(self, endpoint: str, timeout: float):
+        self.endpoint = endpoint
+        self.timeout = timeout
+        self._client: Optional[httpx.Client] = None
+
+    def write(self, payload: dict) -> None:
+        if self._client is None:
+            self._client = httpx.Client(timeout=self.timeout)
+        r = self._client.post(self.endpoint, json=payload)
+        r.raise_for_status()
+
+
+class BatchSpanExporter:
+    """Bounded in-memory queue drained by a background thread.
+
+    `submit()` never blocks the caller: when the queue is full the span is
+    dropped and counted. The thread is started lazily, so each forked worker
+    gets its own.
+    """
+
+    def __init__(self, sink, max_queue: int, batch_size: int, interval_s: float):
+        self.sink = sink
+        self.max_queue = max(1, max_queue)
+        self.batch_size = max(1, batch_size)
+        self.interval_s = max(0.1, interval_s)
+        self._queue: deque[dict] = deque()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid: Optional[int] = None
+        self.exported = self.dropped = self.failed = 0
+
+    def submit(self, record: dict) -> None:
+        if self.sink is None:
+            return
+        with self._lock:
+            if len(self._queue) >= self.max_queue:
+                self.dropped += 1
+                return
+            self._queue.append(record)
+            ready = len(self._queue) >= self.batch_size
+        self._ensure_thread()
+        if ready:
+            self._wake.set()
+
+    def _ensure_thread(self) -> None:
+        if self._pid == os.getpid() and self._thread is not None:
+            return
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name="span-exporter", daemon=True
+            )
+            self._pid = os.getpid()
+            self._thread.start()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.interval_s)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        while True:
+            with self._lock:
+                if not self._queue:
+                    return
+                n = min(self.batch_size, len(self._queue))
+                batch = [self._queue.popleft() for _ in range(n)]
+            try:
+                self.sink.write(export_request(batch))
+                self.exported += len(batch)
+            except Exception as e:
+                # A down collector must not back up into request handling
+                self.failed += len(batch)
+                log.warning("span export failed (%d spans): %s", len(batch), e)
+                return
+
+    def shutdown(self, timeout: float = 5.0) -> None:
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None and self._pid == os.getpid():
+            self._thread.join(timeout)
+        self._thread = None
+        if self.sink is not None:
+            self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            queued = len(self._queue)
+        return {
+            "queued": queued,
+            "exported": self.exported,
+            "dropped": self.dropped,
+            "failed": self.failed,
+        }
+
+
+def _make_sink():
+    kind = settings.TRACE_EXPORTER.lower()
+    if kind == "file":
+        return FileSink(
+            settings.TRACE_EXPORT_FILE, settings.TRACE_EXPORT_FILE_MAX_MB * 1024 * 1024
+        )
+    if kind == "otlp":
+        return OTLPHttpSink(
+            settings.TRACE_EXPORT_ENDPOINT, settings.TRACE_EXPORT_TIMEOUT_S
+        )
+    return None
+
+
+span_exporter = BatchSpanExporter(
+    _make_sink(),
+    max_queue=settings.TRACE_MAX_QUEUE,
+    batch_size=settings.TRACE_EXPORT_BATCH,
+    interval_s=settings.TRACE_EXPORT_INTERVAL_S,
+)
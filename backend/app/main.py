@@ -1,6 +1,7 @@
 from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 from fastapi.exceptions import RequestValidationError
+from fastapi.encoders import jsonable_encoder
 from starlette.exceptions import HTTPException as StarletteHTTPException
 from fastapi.middleware.cors import CORSMiddleware
 import asyncio
@@ -15,10 +16,19 @@ from app.api.v1.endpoints.health import router as health_router
 from app.api.v1.endpoints.upload import router as upload_router
 from app.api.v1.endpoints.outline import router as outline_router
 from app.api.v1.endpoints.export import router as export_router
+from app.api.v1.endpoints.decks import router as decks_router
+from app.api.v1.endpoints.search import router as search_router
 from app.api.v1.endpoints.ops import router as ops_router
 from app.api.v1.endpoints.schema import router as schema_router
+from app.middleware.admission import AdmissionMiddleware
+from app.middleware.compression import CompressionMiddleware
 from app.middleware.observability import ObservabilityMiddleware
-from app.services.storage_service import purge_old_files
+from app.core.admission import AdmissionController
+from app.core.coordination import retention_leader, shared_cache
+from app.core.tracing import span_exporter
+from app.services.storage_service import run_retention
+from app.services.media_service import media_fetcher
+from app.services.metrics_service import worker_snapshot
 
 logger = logging.getLogger("retention")
 
@@ -32,7 +42,20 @@ def create_app() -> FastAPI:
         openapi_url="/openapi.json",
     )
 
-    # CORS
+    # Compression is innermost so admission/observability see final headers
+    if settings.COMPRESSION_ENABLED:
+        app.add_middleware(
+            CompressionMiddleware,
+            encodings=settings.COMPRESSION_ENCODINGS,
+            min_bytes=settings.COMPRESSION_MIN_BYTES,
+            levels=settings.COMPRESSION_LEVELS,
+        )
+    # Admission runs inside observability so rejections keep request ids/timings
+    app.state.admission = AdmissionController(settings)
+    if settings.ADMISSION_ENABLED:
+        app.add_middleware(AdmissionMiddleware, controller=app.state.admission)
+    # CORS wraps admission so 429/503 rejections carry CORS headers too;
+    # otherwise browsers report a CORS failure and hide Retry-After
     allow_origins = ["*"] if settings.ALLOW_ALL_CORS else settings.CORS_ALLOW_ORIGINS
     app.add_middleware(
         CORSMiddleware,
@@ -40,14 +63,25 @@ def create_app() -> FastAPI:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
-        expose_headers=["x-request-id", "x-response-time-ms", "Server-Timing"],
+        expose_headers=[
+            "x-request-id",
+            "x-response-time-ms",
+            "Server-Timing",
+            "traceresponse",
+            "Retry-After",
+            "Location",
+            "Upload-Offset",
+            "Upload-Length",
+        ],
     )
     app.add_middleware(ObservabilityMiddleware)
 
     @app.exception_handler(StarletteHTTPException)
     async def http_exc_handler(request: Request, exc: StarletteHTTPException):
         rid = getattr(getattr(request, "state", None), "request_id", None)
-        headers = {"x-request-id": rid} if rid else {}
+        headers = dict(exc.headers or {})
+        if rid:
+            headers["x-request-id"] = rid
         return JSONResponse(
             status_code=exc.status_code,
             content={"detail": exc.detail, "request_id": rid},
@@ -60,7 +94,7 @@ def create_app() -> FastAPI:
         headers = {"x-request-id": rid} if rid else {}
         return JSONResponse(
             status_code=422,
-            content={"detail": exc.errors(), "request_id": rid},
+            content={"detail": jsonable_encoder(exc.errors()), "request_id": rid},
             headers=headers,
         )
 
@@ -85,34 +119,60 @@ def create_app() -> FastAPI:
     app.include_router(upload_router, prefix=API_PREFIX)
     app.include_router(outline_router, prefix=API_PREFIX)
     app.include_router(export_router, prefix=API_PREFIX)
+    app.include_router(decks_router, prefix=API_PREFIX)
+    app.include_router(search_router, prefix=API_PREFIX)
     app.include_router(schema_router, prefix=API_PREFIX)
     app.include_router(ops_router, prefix=API_PREFIX)
 
-    # Background retention loop
+    # Background retention loop; with several workers only the flock holder
+    # sweeps, and a follower takes over within one interval if it dies.
     async def _retention_loop():
         interval = max(1, settings.RETENTION_SWEEP_MINUTES) * 60
         ttl = timedelta(days=max(0, settings.RETENTION_DAYS))
         while True:
             try:
-                removed = purge_old_files(settings.STORAGE_DIR, ttl)
-                if removed:
-                    logger.info("retention: deleted %d file(s)", len(removed))
+                if retention_leader.try_acquire():
+                    removed = await asyncio.to_thread(
+                        run_retention, settings.STORAGE_DIR, ttl
+                    )
+                    if removed:
+                        logger.info("retention: deleted %d file(s)", len(removed))
             except Exception:
                 logger.exception("retention sweep crashed")
             await asyncio.sleep(interval)
 
+    # Each worker publishes its counters so /ops/workers can sum them
+    async def _metrics_loop():
+        while True:
+            try:
+                await asyncio.to_thread(
+                    shared_cache.publish_metrics, worker_snapshot(app)
+                )
+            except Exception:
+                logger.exception("worker metrics publish failed")
+            await asyncio.sleep(max(1.0, settings.WORKER_METRICS_INTERVAL_S))
+
     @app.on_event("startup")
-    async def _start_retention():
+    async def _start_background():
         if settings.ENABLE_RETENTION:
             app.state.retention_task = asyncio.create_task(_retention_loop())
+        app.state.metrics_task = asyncio.create_task(_metrics_loop())
+
+    @app.on_event("shutdown")
+    async def _close_media_client():
+        await media_fetcher.aclose()
 
     @app.on_event("shutdown")
-    async def _stop_retention():
-        task = getattr(app.state, "retention_task", None)
-        if task:
-            task.cancel()
-            with contextlib.suppress(Exception):
-                await task
+    async def _stop_background():
+        for name in ("retention_task", "metrics_task"):
+            task = getattr(app.state, name, None)
+            if task:
+                task.cancel()
+                with contextlib.suppress(asyncio.CancelledError, Exception):
+                    await task
+        retention_leader.release()
+        # Spans still queued would be lost with the process
+        await asyncio.to_thread(span_exporter.shutdown)
 
     return app
 
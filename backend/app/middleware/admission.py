@@ -0,0 +1,87 @@
+import logging
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+from app.core.admission import AdmissionController, AdmissionRejected
+from app.core.telemetry import aspan
+
+log = logging.getLogger("http")
+
+
+class AdmissionMiddleware:
+    """Rejects fast (429/503 + Retry-After) instead of letting heavy routes pile up.
+
+    Must be added *before* ObservabilityMiddleware so it runs inside it and
+    rejections still carry x-request-id / Server-Timing. The ticket is held
+    until the response body has been sent, not just its headers, so
+    long-lived streams (ADMISSION_STREAM_PATHS) skip the route limiter and
+    only pay the client token bucket.
+    """
+
+    def __init__(self, app: ASGIApp, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        key = self.controller.route_key(scope["path"])
+        if key is None or scope["method"] == "OPTIONS":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        try:
+            nbytes = int(headers.get("content-length") or 0)
+        except ValueError:
+            nbytes = 0
+        cost = self.controller.request_cost(nbytes)
+        client = scope["client"][0] if scope.get("client") else None
+        lim = self.controller.limiter(key)
+
+        stream = self.controller.is_stream(scope["path"])
+        try:
+            if stream:
+                self.controller.check_rate(client, cost)
+            else:
+                async with aspan(
+                    "admission", route_group=key, cost=cost, queue_depth=lim.queued
+                ):
+                    ticket = await self.controller.admit(key, client, cost)
+        except AdmissionRejected as exc:
+            rid = scope.get("state", {}).get("request_id")
+            log.warning(
+                "admission_rejected",
+                extra={
+                    "request_id": rid,
+                    "method": scope["method"],
+                    "path": scope["path"],
+                    "route_group": key,
+                    "status_code": exc.status_code,
+                    "cost": cost,
+                    "queue_depth": lim.queued,
+                    "client_ip": client,
+                },
+            )
+            response = JSONResponse(
+                status_code=exc.status_code,
+                content={"detail": exc.detail, "request_id": rid},
+                headers={"Retry-After": str(exc.retry_after)},
+            )
+            await response(scope, receive, send)
+            return
+
+        if stream:
+            self.controller.streams_open += 1
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                self.controller.streams_open -= 1
+            return
+
+        scope.setdefault("state", {})["admission"] = ticket
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            ticket.release()
@@ -0,0 +1,149 @@
+import time
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core import compression
+from app.core.telemetry import span
+
+
+class CompressionMiddleware:
+    """Negotiated gzip/br/zstd response encoding.
+
+    Plain ASGI (not BaseHTTPMiddleware) so streamed bodies are encoded chunk
+    by chunk. Sits inside ObservabilityMiddleware: single-body responses are
+    encoded before headers go out, so the `compress` span still lands in
+    Server-Timing; streamed responses log the span when the stream ends.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        encodings: list[str],
+        min_bytes: int,
+        levels: dict[str, int] | None = None,
+    ):
+        self.app = app
+        self.encodings = [e for e in encodings if e in compression.available()]
+        self.min_bytes = min_bytes
+        self.levels = levels or {}
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not self.encodings:
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        encoding = compression.negotiate(headers.get("accept-encoding"), self.encodings)
+        if encoding is None or "range" in headers:
+            await self.app(scope, receive, send)
+            return
+        responder = _Responder(
+            send, encoding, self.min_bytes, self.levels.get(encoding)
+        )
+        await self.app(scope, receive, responder.send)
+
+
+class _Responder:
+    def __init__(self, send: Send, encoding: str, min_bytes: int, level):
+        self._send = send
+        self.encoding = encoding
+        self.min_bytes = min_bytes
+        self.level = level
+        self.start: Message | None = None
+        self.active: bool | None = None  # undecided until the first body chunk
+        self.comp: compression.StreamCompressor | None = None
+        self.bytes_in = self.bytes_out = 0
+        self.cpu = 0.0
+        self.t0 = 0.0
+
+    def _eligible(self, start: Message) -> bool:
+        h = Headers(raw=start["headers"])
+        if start["status"] < 200 or start["status"] in (204, 206, 304):
+            return False
+        if "content-encoding" in h or not compression.is_compressible(
+            h.get("content-type")
+        ):
+            return False
+        if "no-transform" in h.get("cache-control", ""):
+            return False
+        cl = h.get("content-length")
+        return not (cl is not None and cl.isdigit() and int(cl) < self.min_bytes)
+
+    def _encode(self, data: bytes, final: bool) -> bytes:
+        c0 = time.thread_time()
+        out = self.comp.compress(data)
+        if final:
+            out += self.comp.finish()
+        self.cpu += time.thread_time() - c0
+        self.bytes_in += len(data)
+        self.bytes_out += len(out)
+        return out
+
+    def _fields(self) -> dict:
+        return {
+            "encoding": self.encoding,
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "ratio": round(self.bytes_in / self.bytes_out, 2) if self.bytes_out else 0,
+            "cpu_ms": round(self.cpu * 1000, 2),
+        }
+
+    def _headers(self, length: int | None) -> Message:
+        h = MutableHeaders(raw=self.start["headers"])
+        h["content-encoding"] = self.encoding
+        h.add_vary_header("Accept-Encoding")
+        if length is None:
+            del h["content-length"]
+        else:
+            h["content-length"] = str(length)
+        # The entity changed; a strong validator no longer applies
+        etag = h.get("etag")
+        if etag and not etag.startswith("W/"):
+            h["etag"] = f"W/{etag}"
+        return self.start
+
+    async def send(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            self.start = message
+            self.active = None if self._eligible(message) else False
+            if self.active is False:
+                await self._send(message)
+            return
+        if message["type"] != "http.response.body" or self.active is False:
+            if self.active is None:
+                # e.g. pathsend / zerocopysend: bytes we never see, so pass as-is
+                self.active = False
+                await self._send(self.start)
+            await self._send(message)
+            return
+
+        body = message.get("body", b"")
+        more = message.get("more_body", False)
+        if self.active is None:
+            if not more and len(body) < self.min_bytes:
+                self.active = False
+                await self._send(self.start)
+                await self._send(message)
+                return
+            self.active = True
+            self.comp = compression.StreamCompressor(self.encoding, self.level)
+            self.t0 = time.perf_counter()
+            if not more:
+                # Whole body in hand: encode before the headers so the span
+                # is recorded while Server-Timing can still pick it up.
+                with span("compress", encoding=self.encoding) as fields:
+                    out = self._encode(body, final=True)
+                    fields.update(self._fields())
+                await self._send(self._headers(len(out)))
+                await self._send({"type": "http.response.body", "body": out})
+                return
+            await self._send(self._headers(None))
+
+        out = self._encode(body, final=not more)
+        if out or not more:
+            await self._send(
+                {"type": "http.response.body", "body": out, "more_body": more}
+            )
+        if not more:
+            with span("compress", streamed=True, **self._fields()) as fields:
+                fields["wall_ms"] = int((time.perf_counter() - self.t0) * 1000)
@@ -1,86 +1,163 @@
 import time
 import uuid
 import logging
-from fastapi import Request
-from starlette.middleware.base import BaseHTTPMiddleware
-from app.core.telemetry import request_id_ctx, server_timing_ctx
+from typing import Optional
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.core.config import settings
+from app.core.telemetry import (
+    ServerTiming,
+    SpanContext,
+    record_server_span,
+    request_id_ctx,
+    server_timing_ctx,
+    start_trace,
+    trace_ctx,
+)
+from app.core.tracing import format_traceparent
 
 log = logging.getLogger("http")
 
 
-class ObservabilityMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next):
+class ObservabilityMiddleware:
+    """Request ids, trace context, timing headers and the request_complete log.
+
+    Plain ASGI rather than BaseHTTPMiddleware: handlers run in this task (so
+    context vars need no copying) and non-body response messages such as
+    zero-copy sends pass through untouched.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
         start = time.perf_counter()
-        request_id = request.headers.get("x-request-id") or uuid.uuid4().hex
+        start_ns = time.time_ns()
+        headers = Headers(scope=scope)
+        request_id = headers.get("x-request-id") or uuid.uuid4().hex
+        trace, remote_parent = start_trace(headers.get("traceparent"))
 
-        # make available to handlers
-        request.state.request_id = request_id
-        request.state.t_start = start
+        # make available to handlers (request.state.*)
+        state = scope.setdefault("state", {})
+        state["request_id"] = request_id
+        state["t_start"] = start
 
         # set context vars ONCE and capture tokens
         rid_token = request_id_ctx.set(request_id)
-        st_token = server_timing_ctx.set([])  # spans will append here
+        st_token = server_timing_ctx.set(
+            ServerTiming(settings.SERVER_TIMING_MAX_ENTRIES)
+        )  # spans will add here
+        tr_token = trace_ctx.set(trace)
 
-        response = None
-        try:
-            response = await call_next(request)
+        status_code = None
+        error = None
+        bytes_out = None
 
-            duration_ms = int((time.perf_counter() - start) * 1000)
-            # headers for correlation + devtools timing
-            response.headers["x-request-id"] = request_id
-            response.headers["x-response-time-ms"] = str(duration_ms)
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code, bytes_out
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                duration_ms = int((time.perf_counter() - start) * 1000)
+                h = MutableHeaders(scope=message)
+                # headers for correlation + devtools timing
+                h["x-request-id"] = request_id
+                h["x-response-time-ms"] = str(duration_ms)
+                h["traceresponse"] = format_traceparent(
+                    trace.trace_id, trace.span_id, trace.sampled
+                )
 
-            # add overall app time to any per-span timings
-            timings = server_timing_ctx.get() or []
-            timings.append(f"app;dur={duration_ms}")
-            prev = response.headers.get("Server-Timing")
-            response.headers["Server-Timing"] = (
-                f"{prev}, {', '.join(timings)}" if prev else ", ".join(timings)
-            )
+                # add overall app time to the (aggregated) per-span timings
+                timings = server_timing_ctx.get()
+                app_timing = f"app;dur={duration_ms}"
+                value = timings.header(app_timing) if timings else app_timing
+                prev = h.get("Server-Timing")
+                h["Server-Timing"] = f"{prev}, {value}" if prev else value
+                bytes_out = h.get("content-length")
+            await send(message)
 
-            level = (
-                logging.DEBUG if request.url.path.endswith("/health") else logging.INFO
-            )
-            log.log(
-                level,
-                "request_complete",
-                extra={
-                    "request_id": request_id,
-                    "method": request.method,
-                    "path": request.url.path,
-                    "route": getattr(request.scope.get("route"), "path", None),
-                    "handler": getattr(request.scope.get("endpoint"), "__name__", None),
-                    "status_code": response.status_code,
-                    "duration_ms": duration_ms,
-                    "bytes_out": response.headers.get("content-length"),
-                    "client_ip": request.client.host if request.client else None,
-                    "user_agent": request.headers.get("user-agent"),
-                },
-            )
-            return response
-
-        except Exception:
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            error = repr(e)
             # NOTE: do NOT reset context vars here; do it in finally.
-            duration_ms = int((time.perf_counter() - start) * 1000)
             log.exception(
                 "unhandled_error",
-                extra={
-                    "request_id": request_id,
-                    "method": request.method,
-                    "path": request.url.path,
-                    "route": getattr(request.scope.get("route"), "path", None),
-                    "handler": getattr(request.scope.get("endpoint"), "__name__", None),
-                    "status_code": 500,
-                    "duration_ms": duration_ms,
-                    "client_ip": request.client.host if request.client else None,
-                    "user_agent": request.headers.get("user-agent"),
-                },
+                extra=self._fields(scope, headers, request_id, trace, start, 500),
             )
             raise
-
+        else:
+            level = logging.DEBUG if scope["path"].endswith("/health") else logging.INFO
+            log.log(
+                level,
+                "request_complete",
+                extra=self._fields(
+                    scope, headers, request_id, trace, start, status_code
+                )
+                | {"bytes_out": bytes_out},
+            )
         finally:
+            self._record_trace(
+                scope, trace, remote_parent, start_ns, request_id, status_code, error
+            )
             # reset exactly once
             try:
                 request_id_ctx.reset(rid_token)
             finally:
                 server_timing_ctx.reset(st_token)
+                trace_ctx.reset(tr_token)
+
+    @staticmethod
+    def _record_trace(
+        scope: Scope,
+        trace: SpanContext,
+        remote_parent: Optional[str],
+        start_ns: int,
+        request_id: str,
+        status: Optional[int],
+        error: Optional[str],
+    ) -> None:
+        route = getattr(scope.get("route"), "path", None)
+        if error is None and status is not None and status >= 500:
+            error = f"HTTP {status}"
+        record_server_span(
+            f"{scope['method']} {route or scope['path']}",
+            trace,
+            remote_parent,
+            start_ns,
+            time.time_ns(),
+            {
+                "http.request.method": scope["method"],
+                "url.path": scope["path"],
+                "http.route": route,
+                "http.response.status_code": status,
+                "request_id": request_id,
+            },
+            error,
+        )
+
+    @staticmethod
+    def _fields(
+        scope: Scope,
+        headers: Headers,
+        request_id: str,
+        trace: SpanContext,
+        start: float,
+        status,
+    ) -> dict:
+        client = scope.get("client")
+        return {
+            "request_id": request_id,
+            "trace_id": trace.trace_id,
+            "method": scope["method"],
+            "path": scope["path"],
+            "route": getattr(scope.get("route"), "path", None),
+            "handler": getattr(scope.get("endpoint"), "__name__", None),
+            "status_code": status,
+            "duration_ms": int((time.perf_counter() - start) * 1000),
+            "client_ip": client[0] if client else None,
+            "user_agent": headers.get("user-agent"),
+        }
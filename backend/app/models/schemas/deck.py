@@ -0,0 +1,68 @@
+from typing import Annotated, Any, List, Literal, Optional, Union
+from pydantic import BaseModel, Field, field_validator
+from app.models.schemas.slide import Slide
+
+
+class InsertSlideOp(BaseModel):
+    op: Literal["insert"] = "insert"
+    index: Optional[int] = Field(
+        default=None, ge=0, description="Position to insert at (default: append)"
+    )
+    slide: Slide
+
+
+class UpdateSlideOp(BaseModel):
+    op: Literal["update"] = "update"
+    slide_id: str
+    set: dict[str, Any] = Field(
+        ..., description="Slide fields to replace, e.g. {'bullets': ['a', 'b']}"
+    )
+
+    @field_validator("set")
+    @classmethod
+    def _known_fields(cls, v: dict[str, Any]) -> dict[str, Any]:
+        unknown = sorted(k for k in v if k not in Slide.model_fields)
+        if unknown:
+            raise ValueError(f"unknown slide fields: {', '.join(unknown)}")
+        return v
+
+
+class DeleteSlideOp(BaseModel):
+    op: Literal["delete"] = "delete"
+    slide_id: str
+
+
+class MoveSlideOp(BaseModel):
+    op: Literal["move"] = "move"
+    slide_id: str
+    index: int = Field(..., ge=0)
+
+
+class SetTopicOp(BaseModel):
+    op: Literal["set_topic"] = "set_topic"
+    topic: Optional[str] = None
+
+
+SlideOp = Annotated[
+    Union[InsertSlideOp, UpdateSlideOp, DeleteSlideOp, MoveSlideOp, SetTopicOp],
+    Field(discriminator="op"),
+]
+
+
+class DeckPatchRequest(BaseModel):
+    base_revision: Optional[int] = Field(
+        default=None,
+        ge=1,
+        description="If set, reject with 409 unless this is the current revision",
+    )
+    ops: List[SlideOp] = Field(..., min_length=1, max_length=200)
+
+
+class DeckPatchResponse(BaseModel):
+    id: str
+    revision: int
+    slide_count: int
+    changed: List[str] = Field(
+        default_factory=list, description="Ids of inserted/updated slides"
+    )
+    removed: List[str] = Field(default_factory=list)
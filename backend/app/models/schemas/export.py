@@ -1,11 +1,23 @@
 from typing import Optional, Literal
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from app.models.schemas.slide import Slide
 
 
 class ExportRequest(BaseModel):
-    slides: list[Slide]
+    slides: Optional[list[Slide]] = None
     theme: Optional[str] = None
+    deck_id: Optional[str] = Field(
+        default=None, description="Export a stored deck instead of inline slides"
+    )
+    revision: Optional[int] = Field(
+        default=None, ge=1, description="Stored deck revision (default: latest)"
+    )
+
+    @model_validator(mode="after")
+    def _require_source(self):
+        if self.slides is None and not self.deck_id:
+            raise ValueError("Provide either 'slides' or 'deck_id'")
+        return self
 
 
 class ExportResponse(BaseModel):
@@ -13,3 +25,5 @@ class ExportResponse(BaseModel):
     format: Literal["txt"] = "txt"
     theme: Optional[str] = None
     bytes: int = Field(..., ge=0)
+    deck_id: Optional[str] = None
+    revision: Optional[int] = None
@@ -1,5 +1,9 @@
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import Annotated, List, Optional
+
+from app.models.schemas.upload import UPLOAD_ID_PATTERN
+
+FileId = Annotated[str, Field(pattern=UPLOAD_ID_PATTERN)]
 
 
 class OutlineRequest(BaseModel):
@@ -9,11 +13,36 @@ class OutlineRequest(BaseModel):
     text: Optional[str] = Field(
         default=None, description="Raw text extracted from document or user input"
     )
+    file_id: Optional[str] = Field(
+        default=None,
+        pattern=UPLOAD_ID_PATTERN,
+        description="Stored upload to outline from (uses its parse-time structure)",
+    )
     slide_count: int = Field(
         default=5, ge=1, le=15, description="How many slides to generate (1–15)"
     )
 
 
+class OutlineBatchRequest(BaseModel):
+    items: List[OutlineRequest] = Field(
+        default_factory=list, description="Outline requests, answered in any order"
+    )
+    file_ids: List[FileId] = Field(
+        default_factory=list,
+        description="Shorthand: one item per stored upload, using `slide_count`",
+    )
+    slide_count: int = Field(
+        default=5, ge=1, le=15, description="Slide count for `file_ids` items"
+    )
+
+    def expanded(self) -> List[OutlineRequest]:
+        """`items` followed by one request per `file_ids` entry."""
+        return self.items + [
+            OutlineRequest(file_id=f, slide_count=self.slide_count)
+            for f in self.file_ids
+        ]
+
+
 # We return a Deck from the endpoint; keeping this here for reference if needed later:
 # from app.models.schemas.slide import Deck
 # class OutlineResponse(Deck): ...
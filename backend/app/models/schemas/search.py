@@ -0,0 +1,17 @@
+from typing import List, Optional
+from pydantic import BaseModel, Field
+
+
+class SearchHit(BaseModel):
+    doc_id: str = Field(..., description="Upload file_id")
+    filename: Optional[str] = None
+    page: int = Field(0, description="1-based page, 0 if unknown")
+    start: int = Field(..., description="Char offset into the parsed text")
+    end: int
+    score: float
+    text: str
+
+
+class SearchResponse(BaseModel):
+    query: str
+    hits: List[SearchHit] = Field(default_factory=list)
@@ -28,6 +28,12 @@ class Slide(BaseModel):
 
 class Deck(BaseModel):
     version: str = SCHEMA_VERSION
+    id: Optional[str] = Field(
+        default=None, description="Server-side deck store id (set by /outline)"
+    )
+    revision: Optional[int] = Field(
+        default=None, ge=1, description="Deck store revision; bumps on every PATCH"
+    )
     topic: Optional[str] = None
     source: Optional[dict] = Field(
         default=None, description="e.g. {'file_id':'abc','filename':'doc.pdf'}"
@@ -0,0 +1,69 @@
+from bisect import bisect_right
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field
+
+
+class Heading(BaseModel):
+    text: str
+    level: int = Field(..., ge=1, le=6)
+    page: int = Field(0, ge=0, description="1-based page, 0 if unknown")
+    offset: int = Field(..., ge=0, description="Char offset into parsed text")
+    source: Literal["font", "style", "pattern"] = "pattern"
+
+
+class Section(BaseModel):
+    heading: int = Field(..., description="Index into headings, -1 for preamble")
+    start: int = Field(..., ge=0)
+    end: int = Field(..., ge=0)
+
+
+class StructureIndex(BaseModel):
+    """Compact per-document layout summary built once at parse time."""
+
+    version: int = 1
+    text_length: int = 0
+    page_offsets: List[int] = Field(
+        default_factory=list, description="Char offset where each page starts"
+    )
+    text_bytes: Optional[int] = Field(
+        None, description="UTF-8 size of the stored text; None on older indexes"
+    )
+    page_byte_offsets: List[int] = Field(
+        default_factory=list, description="Byte offset where each page starts"
+    )
+    headings: List[Heading] = Field(default_factory=list)
+    sections: List[Section] = Field(default_factory=list)
+    seeds: List[str] = Field(
+        default_factory=list, description="Cleaned outline seed lines"
+    )
+
+    def page_span(self, start: int, end: Optional[int] = None) -> tuple[int, int]:
+        """Char span for 1-based inclusive page range; whole text if pages unknown."""
+        if not self.page_offsets:
+            return 0, self.text_length
+        n = len(self.page_offsets)
+        start = min(max(1, start), n)
+        end = min(max(start, end or start), n)
+        lo = self.page_offsets[start - 1]
+        hi = self.page_offsets[end] if end < n else self.text_length
+        return lo, hi
+
+    def page_byte_span(
+        self, start: int, end: Optional[int] = None
+    ) -> Optional[tuple[int, int]]:
+        """Byte span into the stored text for page_span(), if the index has one."""
+        if self.text_bytes is None:
+            return None
+        if not self.page_offsets:
+            return 0, self.text_bytes
+        n = len(self.page_byte_offsets)
+        start = min(max(1, start), n)
+        end = min(max(start, end or start), n)
+        lo = self.page_byte_offsets[start - 1]
+        hi = self.page_byte_offsets[end] if end < n else self.text_bytes
+        return lo, hi
+
+    def page_of(self, offset: int) -> int:
+        if not self.page_offsets:
+            return 0
+        return max(1, bisect_right(self.page_offsets, offset))
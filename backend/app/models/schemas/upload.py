@@ -1,5 +1,10 @@
+from datetime import datetime
 from typing import Literal, Optional
 from pydantic import BaseModel, Field, model_validator
+from app.models.schemas.structure import StructureIndex
+
+# Upload ids name files in STORAGE_DIR, so they never carry path separators
+UPLOAD_ID_PATTERN = r"^[A-Za-z0-9_-]{8,64}$"
 
 
 class ParsedPreview(BaseModel):
@@ -8,16 +13,23 @@ class ParsedPreview(BaseModel):
     text: str = Field(default="", exclude=True)
     text_length: int = 0
     text_preview: str = Field(default="", description="First ~1000 chars")
+    structure: Optional[StructureIndex] = Field(default=None, exclude=True)
+    sections: int = Field(default=0, description="Sections found by the parser")
 
     @model_validator(mode="after")
     def _derive_preview_and_length(self):
         if not self.text_preview and self.text:
             self.text_preview = self.text[:1000]
         self.text_length = len(self.text or "")
+        if self.structure is not None:
+            self.sections = len(self.structure.sections)
         return self
 
 
 class UploadMeta(BaseModel):
+    file_id: Optional[str] = Field(
+        None, description="Upload id (also keys GET /upload/{file_id}/events)"
+    )
     filename: str
     size: int = Field(..., ge=0, description="bytes")
     content_type: str = "application/octet-stream"
@@ -27,3 +39,30 @@ class UploadMeta(BaseModel):
 
 class UploadResponse(UploadMeta):
     pass
+
+
+class UploadSessionCreate(BaseModel):
+    filename: str = Field(..., min_length=1, max_length=255)
+    size: int = Field(..., gt=0, description="Total bytes that will be sent")
+    content_type: str = "application/octet-stream"
+    upload_id: Optional[str] = Field(
+        None,
+        pattern=UPLOAD_ID_PATTERN,
+        description="Client-chosen id (also keys /upload/{id}/events)",
+    )
+    sha256: Optional[str] = Field(
+        None,
+        pattern=r"^[0-9a-f]{64}$",
+        description="Whole-file digest, checked on finalize",
+    )
+
+
+class UploadSession(BaseModel):
+    upload_id: str
+    filename: str
+    size: int = Field(..., description="bytes")
+    offset: int = Field(0, description="Bytes committed so far")
+    content_type: str = "application/octet-stream"
+    sha256: Optional[str] = None
+    created_at: datetime
+    expires_at: datetime
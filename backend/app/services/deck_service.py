@@ -0,0 +1,264 @@
+import hashlib
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+
+from app.core.config import settings
+from app.core.coordination import SharedCache, shared_cache
+from app.core.telemetry import span
+from app.models.schemas.deck import (
+    DeleteSlideOp,
+    InsertSlideOp,
+    MoveSlideOp,
+    SetTopicOp,
+    UpdateSlideOp,
+)
+from app.models.schemas.slide import Deck, Slide
+
+MAX_SLIDES = 50
+
+
+class DeckNotFound(KeyError):
+    pass
+
+
+class RevisionConflict(Exception):
+    def __init__(self, current: int):
+        super().__init__(f"deck is at revision {current}")
+        self.current = current
+
+
+class PatchError(ValueError):
+    pass
+
+
+def slide_etag(slide: Slide) -> str:
+    """Content hash of a slide; stable across revisions that don't touch it."""
+    raw = slide.model_dump_json().encode("utf-8")
+    return hashlib.blake2b(raw, digest_size=12).hexdigest()
+
+
+@dataclass(frozen=True)
+class DeckRevision:
+    deck: Deck
+    # slide id -> etag; unchanged slides keep the previous revision's entry
+    etags: dict[str, str]
+
+    @property
+    def revision(self) -> int:
+        return self.deck.revision or 1
+
+
+def _derive(
+    prev: Deck, slides: list[Slide], revision: int, topic: Optional[str]
+) -> Deck:
+    # Slides are already validated individually; skip re-validating the deck.
+    return Deck.model_construct(
+        version=prev.version,
+        id=prev.id,
+        revision=revision,
+        topic=topic,
+        source=prev.source,
+        slide_count=len(slides),
+        created_at=prev.created_at,
+        slides=slides,
+    )
+
+
+def apply_ops(
+    slides: list[Slide], topic: Optional[str], ops: list
+) -> tuple[list[Slide], Optional[str], list[str], list[str]]:
+    """Apply slide ops to a copy of `slides`; only touched slides are re-validated."""
+    out = list(slides)
+    changed: dict[str, None] = {}
+    removed: dict[str, None] = {}
+
+    def _index(slide_id: str) -> int:
+        for i, s in enumerate(out):
+            if s.id == slide_id:
+                return i
+        raise PatchError(f"unknown slide id: {slide_id}")
+
+    for n, op in enumerate(ops):
+        if isinstance(op, InsertSlideOp):
+            if any(s.id == op.slide.id for s in out):
+                raise PatchError(f"ops[{n}]: duplicate slide id {op.slide.id}")
+            idx = len(out) if op.index is None else min(op.index, len(out))
+            out.insert(idx, op.slide)
+            changed[op.slide.id] = None
+            removed.pop(op.slide.id, None)
+        elif isinstance(op, UpdateSlideOp):
+            if "id" in op.set:
+                raise PatchError(f"ops[{n}]: slide id cannot be changed")
+            i = _index(op.slide_id)
+            try:
+                out[i] = Slide.model_validate(out[i].model_dump() | op.set)
+            except ValueError as e:
+                raise PatchError(f"ops[{n}]: {e}") from e
+            changed[op.slide_id] = None
+        elif isinstance(op, DeleteSlideOp):
+            out.pop(_index(op.slide_id))
+            changed.pop(op.slide_id, None)
+            removed[op.slide_id] = None
+        elif isinstance(op, MoveSlideOp):
+            s = out.pop(_index(op.slide_id))
+            out.insert(min(op.index, len(out)), s)
+        elif isinstance(op, SetTopicOp):
+            topic = op.topic
+
+    if not out:
+        raise PatchError("deck must keep at least one slide")
+    if len(out) > MAX_SLIDES:
+        raise PatchError(f"deck cannot exceed {MAX_SLIDES} slides")
+    return out, topic, list(changed), list(removed)
+
+
+class DeckStore:
+    """In-memory deck store with cheap, structurally shared revisions.
+
+    With a shared cache, every revision is also written through to its deck
+    tables, which are never trimmed. The shared head is authoritative: it is
+    advanced by compare-and-swap, so two workers can't both commit on top of
+    the same revision, and workers that are behind hydrate from there.
+    """
+
+    def __init__(
+        self,
+        max_decks: int,
+        max_revisions: int,
+        shared: Optional[SharedCache] = None,
+    ):
+        self.max_decks = max(1, max_decks)
+        self.max_revisions = max(1, max_revisions)
+        self.shared = shared
+        self._decks: OrderedDict[str, list[DeckRevision]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hydrated = 0
+
+    def _shared_head(self, deck_id: str) -> Optional[int]:
+        if self.shared is None:
+            return None
+        return self.shared.deck_head(deck_id)
+
+    def _hydrate(self, deck_id: str, revision: int) -> Optional[DeckRevision]:
+        """Load one revision written by another worker into local history."""
+        if self.shared is None:
+            return None
+        raw = self.shared.deck_revision(deck_id, revision)
+        if raw is None:
+            return None
+        deck = Deck.model_validate_json(raw)
+        rev = DeckRevision(deck, {s.id: slide_etag(s) for s in deck.slides})
+        history = self._decks.setdefault(deck_id, [])
+        history.append(rev)
+        history.sort(key=lambda r: r.revision)
+        del history[: -self.max_revisions]
+        self._touch(deck_id)
+        self.hydrated += 1
+        return rev
+
+    def _touch(self, deck_id: str) -> None:
+        self._decks.move_to_end(deck_id)
+        while len(self._decks) > self.max_decks:
+            self._decks.popitem(last=False)
+
+    def _find(self, deck_id: str, revision: Optional[int]) -> Optional[DeckRevision]:
+        # Caller holds self._lock
+        history = self._decks.get(deck_id)
+        if revision is None:
+            if self.shared is not None:
+                # Local history may be stale; no shared head means no such deck
+                head = self._shared_head(deck_id)
+                if head is None:
+                    return None
+                for rev in reversed(history or ()):
+                    if rev.revision == head:
+                        self._decks.move_to_end(deck_id)
+                        return rev
+                return self._hydrate(deck_id, head)
+            if history:
+                self._decks.move_to_end(deck_id)
+                return history[-1]
+            return None
+        for rev in history or ():
+            if rev.revision == revision:
+                self._decks.move_to_end(deck_id)
+                return rev
+        return self._hydrate(deck_id, revision)
+
+    def create(self, deck: Deck) -> Deck:
+        deck_id = deck.id or uuid.uuid4().hex
+        stored = deck.model_copy(update={"id": deck_id, "revision": 1})
+        rev = DeckRevision(stored, {s.id: slide_etag(s) for s in stored.slides})
+        with self._lock:
+            if self.shared is not None and not self.shared.deck_create(
+                deck_id, stored.model_dump_json().encode()
+            ):
+                # Client-chosen id that another worker already holds
+                raise RevisionConflict(self._shared_head(deck_id) or 1)
+            self._decks[deck_id] = [rev]
+            self._touch(deck_id)
+        return stored
+
+    def get(self, deck_id: str, revision: Optional[int] = None) -> DeckRevision:
+        with self._lock:
+            rev = self._find(deck_id, revision)
+        if rev is None:
+            raise DeckNotFound(deck_id if revision is None else f"{deck_id}@{revision}")
+        return rev
+
+    def patch(
+        self, deck_id: str, ops: list, base_revision: Optional[int] = None
+    ) -> tuple[DeckRevision, list[str], list[str]]:
+        with self._lock:
+            head = self._find(deck_id, None)
+            if head is None:
+                raise DeckNotFound(deck_id)
+            if base_revision is not None and base_revision != head.revision:
+                raise RevisionConflict(head.revision)
+
+            with span("deck_patch", deck_id=deck_id, ops=len(ops)):
+                slides, topic, changed, removed = apply_ops(
+                    head.deck.slides, head.deck.topic, ops
+                )
+                etags = dict(head.etags)
+                for sid in removed:
+                    etags.pop(sid, None)
+                by_id = {s.id: s for s in slides}
+                for sid in changed:
+                    etags[sid] = slide_etag(by_id[sid])
+                rev = DeckRevision(
+                    _derive(head.deck, slides, head.revision + 1, topic), etags
+                )
+
+            if self.shared is not None and not self.shared.deck_advance(
+                deck_id,
+                head.revision,
+                rev.revision,
+                rev.deck.model_dump_json().encode(),
+                self.max_revisions,
+            ):
+                # Another worker moved the head since we read it
+                raise RevisionConflict(self._shared_head(deck_id) or head.revision)
+            history = self._decks.setdefault(deck_id, [])
+            history.append(rev)
+            del history[: -self.max_revisions]
+            self._touch(deck_id)
+        return rev, changed, removed
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "decks": len(self._decks),
+                "revisions": sum(len(h) for h in self._decks.values()),
+                "hydrated": self.hydrated,
+            }
+
+
+deck_store = DeckStore(
+    max_decks=settings.DECK_STORE_MAX_DECKS,
+    max_revisions=settings.DECK_STORE_MAX_REVISIONS,
+    shared=shared_cache if settings.SHARED_CACHE_ENABLED else None,
+)
@@ -1,33 +1,137 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
 from pathlib import Path
 from datetime import datetime
+from typing import Optional
 
-from app.core.telemetry import aspan
+from fastapi.concurrency import run_in_threadpool
+
+from app.core import compression
+from app.core.config import settings
+from app.core.coordination import shared_cache
+from app.core.fileserve import content_etag
+from app.core.telemetry import aspan, span
 from app.models.schemas.slide import Slide
 from app.models.schemas.export import ExportResponse
+from app.services.deck_service import slide_etag
+from app.services.media_service import MediaAsset, media_fetcher
+
+# Rendered slide bodies keyed by slide etag; unchanged slides skip re-rendering.
+_render_cache: OrderedDict[str, str] = OrderedDict()
+_render_lock = threading.Lock()
+
+
+def _render_slide(s: Slide, assets: Optional[dict] = None) -> str:
+    """Everything after the positional 'Slide N: ' prefix."""
+    parts = [f"{s.title}\n"]
+    for b in s.bullets or []:
+        parts.append(f"  - {b}\n")
+    if getattr(s, "notes", None):
+        parts.append(f"  [notes] {s.notes}\n")
+    if getattr(s, "media", None):
+        for m in s.media:
+            # media is [{type:"image", url, alt?}]
+            parts.append(f"  [media] {m.type} {m.url}")
+            if getattr(m, "alt", None):
+                parts.append(f"  — {m.alt}")
+            asset = (assets or {}).get(str(m.url))
+            if isinstance(asset, MediaAsset):
+                dims = f" {asset.width}x{asset.height}" if asset.width else ""
+                parts.append(f"  [cached {asset.digest[:12]}{dims}]")
+            parts.append("\n")
+    parts.append("\n")
+    return "".join(parts)
+
+
+def _render_cached(
+    s: Slide, etag: Optional[str], assets: Optional[dict] = None
+) -> tuple[str, bool]:
+    key = etag or slide_etag(s)
+    if assets and s.media:
+        # Same slide can render differently once its images are (re)fetched
+        key += ":" + ",".join(
+            getattr(assets.get(str(m.url)), "digest", "-") for m in s.media
+        )
+    with _render_lock:
+        body = _render_cache.get(key)
+        if body is not None:
+            _render_cache.move_to_end(key)
+            return body, True
+    hit = False
+    if settings.SHARED_CACHE_ENABLED:
+        # Another worker may already have rendered this exact slide
+        blob = shared_cache.get("render", key)
+        if blob is not None:
+            body, hit = blob.decode("utf-8"), True
+    if not hit:
+        body = _render_slide(s, assets)
+        if settings.SHARED_CACHE_ENABLED:
+            shared_cache.set("render", key, body.encode("utf-8"))
+    with _render_lock:
+        _render_cache[key] = body
+        while len(_render_cache) > settings.EXPORT_RENDER_CACHE_SIZE:
+            _render_cache.popitem(last=False)
+    return body, hit
+
+
+def render_cache_size() -> int:
+    return len(_render_cache)
 
 
-async def export_to_pptx(slides: list[Slide], theme: str = "default") -> ExportResponse:
+def _write_export(
+    out_path: Path,
+    slides: list[Slide],
+    etags: Optional[list[str]],
+    assets: Optional[dict],
+) -> int:
+    """Render every slide into `out_path`; returns how many missed both caches.
+
+    Blocking (shared-cache lookups hit SQLite), so callers run it in one
+    threadpool hop for the whole deck.
+    """
+    rendered = 0
+    with out_path.open("w", encoding="utf-8") as f:
+        for idx, s in enumerate(slides, start=1):
+            etag = etags[idx - 1] if etags else None
+            body, hit = _render_cached(s, etag, assets)
+            rendered += 0 if hit else 1
+            f.write(f"Slide {idx}: {body}")
+    return rendered
+
+
+async def export_to_pptx(
+    slides: list[Slide],
+    theme: str = "default",
+    etags: Optional[list[str]] = None,
+) -> ExportResponse:
     out_dir = Path("data/exports")
     out_dir.mkdir(parents=True, exist_ok=True)
     stamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-    out_path = out_dir / f"deck_{stamp}_{theme}.txt"
-
-    async with aspan("export_txt", theme=theme, slides=len(slides), out=str(out_path)):
-        with out_path.open("w", encoding="utf-8") as f:
-            for idx, s in enumerate(slides, start=1):
-                f.write(f"Slide {idx}: {s.title}\n")
-                for b in s.bullets or []:
-                    f.write(f"  - {b}\n")
-                if getattr(s, "notes", None):
-                    f.write(f"  [notes] {s.notes}\n")
-                if getattr(s, "media", None):
-                    for m in s.media:
-                        # media is [{type:"image", url, alt?}]
-                        f.write(f"  [media] {m.type} {m.url}")
-                        if getattr(m, "alt", None):
-                            f.write(f"  — {m.alt}")
-                        f.write("\n")
-                f.write("\n")
+    # Unique per export so the file never changes once written (immutable caching)
+    out_path = out_dir / f"deck_{stamp}_{theme}_{uuid.uuid4().hex[:8]}.txt"
+
+    async with aspan(
+        "export_txt", theme=theme, slides=len(slides), out=str(out_path)
+    ) as fields:
+        assets = None
+        if settings.EXPORT_FETCH_MEDIA:
+            # Deduped, concurrent, cache-backed; failures just skip annotation
+            assets = await media_fetcher.fetch_many(
+                str(m.url) for s in slides for m in s.media
+            )
+            fields["media"] = len(assets)
+        fields["rendered"] = await run_in_threadpool(
+            _write_export, out_path, slides, etags, assets
+        )
+
+    variants = [out_path]
+    if settings.EXPORT_PRECOMPRESS:
+        variants += (await run_in_threadpool(precompress, out_path)).values()
+    # Hash once at write time; downloads then answer conditionals from cache
+    for p in variants:
+        await run_in_threadpool(content_etag, p)
 
     return ExportResponse(
         path=str(out_path.resolve()),
@@ -35,3 +139,28 @@ async def export_to_pptx(slides: list[Slide], theme: str = "default") -> ExportR
         theme=theme,
         bytes=out_path.stat().st_size,
     )
+
+
+def precompress(path: Path) -> dict[str, Path]:
+    """Write max-level encoded siblings (deck.txt.gz, .br, .zst) next to `path`.
+
+    Downloads serve these bytes directly, so the one-off cost of the slow
+    levels is paid at export time rather than on every request.
+    """
+    data = path.read_bytes()
+    out: dict[str, Path] = {}
+    for enc in compression.available():
+        with span("precompress", encoding=enc, bytes_in=len(data)) as fields:
+            c0 = time.thread_time()
+            blob = compression.compress(data, enc)
+            fields["cpu_ms"] = round((time.thread_time() - c0) * 1000, 2)
+            fields["bytes_out"] = len(blob)
+            fields["ratio"] = round(len(data) / len(blob), 2) if blob else 0
+            if len(blob) >= len(data):
+                continue  # not worth serving
+            dest = path.with_name(path.name + compression.SUFFIXES[enc])
+            tmp = dest.with_name(dest.name + ".tmp")
+            tmp.write_bytes(blob)
+            tmp.replace(dest)
+            out[enc] = dest
+    return out
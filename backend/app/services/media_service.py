@@ -0,0 +1,395 @@
+import asyncio
+import fnmatch
+import hashlib
+import io
+import ipaddress
+import json
+import logging
+import os
+import socket
+import threading
+import time
+from dataclasses import asdict, dataclass
+from email.utils import formatdate
+from pathlib import Path
+from typing import Awaitable, Callable, Iterable, Optional
+
+import httpx
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.config import settings
+from app.core.telemetry import aspan, span
+
+log = logging.getLogger("media")
+
+
+class MediaFetchError(Exception):
+    pass
+
+
+MAX_REDIRECTS = 5
+
+Resolver = Callable[[str, int], Awaitable[list[str]]]
+
+
+async def resolve_host(host: str, port: int) -> list[str]:
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(
+            host, port, type=socket.SOCK_STREAM
+        )
+    except OSError as e:
+        raise MediaFetchError(f"{host}: {e}") from e
+    return [info[4][0] for info in infos]
+
+
+def _public(addr: str) -> bool:
+    ip = ipaddress.ip_address(addr.split("%", 1)[0])
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    # is_global excludes loopback, private, link-local (169.254/16), CGNAT...
+    return ip.is_global and not ip.is_multicast
+
+
+@dataclass
+class MediaAsset:
+    url: str
+    digest: str  # sha256 of the stored (possibly resized) bytes
+    path: str
+    content_type: str
+    size: int
+    width: Optional[int] = None
+    height: Optional[int] = None
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    fetched_at: float = 0.0
+
+
+def _resize(
+    data: bytes, max_w: int, max_h: int
+) -> tuple[bytes, Optional[int], Optional[int]]:
+    """Shrink to fit the slide box; returns original bytes if already small enough."""
+    from PIL import Image
+
+    with span("media_resize", bytes_in=len(data)) as fields:
+        try:
+            img = Image.open(io.BytesIO(data))
+            w, h = img.size
+        except Exception:
+            return data, None, None
+        if w <= max_w and h <= max_h:
+            return data, w, h
+        fmt = img.format or "PNG"
+        img.thumbnail((max_w, max_h))
+        if fmt == "JPEG" and img.mode not in ("RGB", "L"):
+            img = img.convert("RGB")
+        buf = io.BytesIO()
+        img.save(buf, format=fmt, **({"quality": 85} if fmt == "JPEG" else {}))
+        fields["bytes_out"] = buf.tell()
+        return buf.getvalue(), img.size[0], img.size[1]
+
+
+class MediaCache:
+    """Content-addressed object store + per-URL validators, LRU-evicted by size."""
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total: Optional[int] = None
+
+    def _object(self, digest: str) -> Path:
+        return self.root / "objects" / digest[:2] / digest
+
+    def _entry(self, url: str) -> Path:
+        key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        return self.root / "urls" / f"{key}.json"
+
+    def lookup(self, url: str) -> Optional[MediaAsset]:
+        p = self._entry(url)
+        try:
+            asset = MediaAsset(**json.loads(p.read_text(encoding="utf-8")))
+        except (OSError, ValueError, TypeError):
+            return None
+        obj = Path(asset.path)
+        if not obj.is_file():
+            p.unlink(missing_ok=True)  # its object was evicted
+            return None
+        # mtime doubles as the LRU clock (atime is often disabled)
+        os.utime(obj, None)
+        return asset
+
+    def store(self, asset: MediaAsset, data: Optional[bytes]) -> MediaAsset:
+        obj = self._object(asset.digest)
+        asset.path = str(obj)
+        if data is not None and not obj.is_file():
+            obj.parent.mkdir(parents=True, exist_ok=True)
+            tmp = obj.with_suffix(".tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, obj)
+            with self._lock:
+                self._total = (
+                    self._scan_total()
+                    if self._total is None
+                    else self._total + len(data)
+                )
+        entry = self._entry(asset.url)
+        entry.parent.mkdir(parents=True, exist_ok=True)
+        entry.write_text(json.dumps(asdict(asset)), encoding="utf-8")
+        self.evict()
+        return asset
+
+    def _scan_total(self) -> int:
+        base = self.root / "objects"
+        if not base.exists():
+            return 0
+        return sum(p.stat().st_size for p in base.glob("*/*") if p.is_file())
+
+    def evict(self) -> int:
+        with self._lock:
+            if self._total is None:
+                self._total = self._scan_total()
+            if self._total <= self.max_bytes:
+                return 0
+            objs = []
+            for p in (self.root / "objects").glob("*/*"):
+                try:
+                    st = p.stat()
+                except OSError:
+                    continue
+                objs.append((st.st_mtime, st.st_size, p))
+            objs.sort()
+            removed = 0
+            # Evict down to 90% so we don't rescan on every store
+            target = int(self.max_bytes * 0.9)
+            for _, size, p in objs:
+                if self._total <= target:
+                    break
+                p.unlink(missing_ok=True)
+                self._total -= size
+                removed += 1
+            if removed:
+                self._drop_dangling_entries()
+            return removed
+
+    def _drop_dangling_entries(self) -> None:
+        # URL entries are tiny but unbounded; drop those whose object is gone
+        for entry in (self.root / "urls").glob("*.json"):
+            try:
+                path = json.loads(entry.read_text(encoding="utf-8"))["path"]
+            except (OSError, ValueError, KeyError, TypeError):
+                path = None
+            if not path or not Path(path).is_file():
+                entry.unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        with self._lock:
+            if self._total is None:
+                self._total = self._scan_total()
+            return {"bytes": self._total, "max_bytes": self.max_bytes}
+
+
+class MediaFetcher:
+    """Shared pooled HTTP client with bounded concurrency and single-flight per URL."""
+
+    def __init__(
+        self,
+        cache: MediaCache,
+        max_concurrency: int,
+        timeout_s: float,
+        max_image_bytes: int,
+        fresh_s: float,
+        box: tuple[int, int],
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+        allowed_hosts: Iterable[str] = (),
+        resolver: Resolver = resolve_host,
+    ):
+        self.cache = cache
+        self.max_concurrency = max(1, max_concurrency)
+        self.timeout_s = timeout_s
+        self.max_image_bytes = max_image_bytes
+        self.fresh_s = fresh_s
+        self.box = box
+        self.transport = transport
+        self.allowed_hosts = list(allowed_hosts)
+        self.resolver = resolver
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._inflight: dict[str, asyncio.Future] = {}
+        self.hits = self.revalidated = self.downloads = self.errors = 0
+
+    def _ensure(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            # One client (connection pool) per event loop, reused by every export
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout_s,
+                # Redirects are followed by hand so every hop is vetted
+                follow_redirects=False,
+                limits=httpx.Limits(
+                    max_connections=self.max_concurrency,
+                    max_keepalive_connections=self.max_concurrency,
+                ),
+                transport=self.transport,
+                headers={"user-agent": "PresenTuneAI-media/1.0"},
+            )
+            self._loop = loop
+            self._sem = asyncio.Semaphore(self.max_concurrency)
+            self._inflight = {}
+        return self._client
+
+    async def aclose(self) -> None:
+        client, self._client = self._client, None
+        # A client bound to another (already closed) loop can only be dropped
+        if client is not None and self._loop is asyncio.get_running_loop():
+            await client.aclose()
+
+    async def _vet(self, url: httpx.URL) -> None:
+        """Refuse URLs that could reach this host or its private network.
+
+        Slide URLs come from clients, so fetching them blindly is SSRF (and
+        the digest/size written to the export would leak what was found).
+        """
+        if url.scheme not in ("http", "https") or not url.host:
+            raise MediaFetchError(f"{url}: only http(s) URLs are fetched")
+        host = url.host
+        if self.allowed_hosts and not any(
+            fnmatch.fnmatchcase(host, pat) for pat in self.allowed_hosts
+        ):
+            raise MediaFetchError(f"{url}: host not in MEDIA_ALLOWED_HOSTS")
+        try:
+            addrs = [str(ipaddress.ip_address(host))]
+        except ValueError:
+            port = url.port or (443 if url.scheme == "https" else 80)
+            addrs = await self.resolver(host, port)
+        if not addrs or not all(_public(a) for a in addrs):
+            raise MediaFetchError(f"{url}: resolves to a non-public address")
+
+    async def fetch(self, url: str) -> MediaAsset:
+        self._ensure()
+        fut = self._inflight.get(url)
+        if fut is not None:
+            return await asyncio.shield(fut)
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[url] = fut
+        try:
+            asset = await self._fetch(url)
+            fut.set_result(asset)
+            return asset
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()  # mark retrieved when nobody else is waiting
+            raise
+        finally:
+            self._inflight.pop(url, None)
+
+    async def fetch_many(
+        self, urls: Iterable[str]
+    ) -> dict[str, MediaAsset | Exception]:
+        unique = list(dict.fromkeys(urls))
+        results = await asyncio.gather(
+            *(self.fetch(u) for u in unique), return_exceptions=True
+        )
+        return dict(zip(unique, results))
+
+    async def _fetch(self, url: str) -> MediaAsset:
+        cached = await run_in_threadpool(self.cache.lookup, url)
+        if cached and time.time() - cached.fetched_at < self.fresh_s:
+            self.hits += 1
+            return cached
+
+        headers = {}
+        if cached:
+            if cached.etag:
+                headers["if-none-match"] = cached.etag
+            if cached.last_modified:
+                headers["if-modified-since"] = cached.last_modified
+            elif not cached.etag:
+                headers["if-modified-since"] = formatdate(
+                    cached.fetched_at, usegmt=True
+                )
+
+        client = self._ensure()
+        async with self._sem, aspan("media_fetch", url=url) as fields:
+            try:
+                target = httpx.URL(url)
+                for _ in range(MAX_REDIRECTS + 1):
+                    await self._vet(target)
+                    async with client.stream("GET", target, headers=headers) as resp:
+                        fields["status"] = resp.status_code
+                        if resp.has_redirect_location:
+                            target = target.join(resp.headers["location"])
+                            continue
+                        if resp.status_code == 304 and cached:
+                            self.revalidated += 1
+                            cached.fetched_at = time.time()
+                            cached.etag = resp.headers.get("etag", cached.etag)
+                            cached.last_modified = resp.headers.get(
+                                "last-modified", cached.last_modified
+                            )
+                            return await run_in_threadpool(
+                                self.cache.store, cached, None
+                            )
+                        if resp.status_code != 200:
+                            raise MediaFetchError(f"{url}: HTTP {resp.status_code}")
+                        ctype = resp.headers.get("content-type", "")
+                        ctype = ctype.split(";")[0].strip()
+                        if not ctype.startswith("image/"):
+                            raise MediaFetchError(
+                                f"{url}: not an image ({ctype or '?'})"
+                            )
+                        buf = bytearray()
+                        async for chunk in resp.aiter_bytes():
+                            buf += chunk
+                            if len(buf) > self.max_image_bytes:
+                                raise MediaFetchError(f"{url}: image too large")
+                        etag = resp.headers.get("etag")
+                        last_modified = resp.headers.get("last-modified")
+                        break
+                else:
+                    raise MediaFetchError(f"{url}: too many redirects")
+            except (httpx.HTTPError, httpx.InvalidURL) as e:
+                self.errors += 1
+                raise MediaFetchError(f"{url}: {e}") from e
+            except MediaFetchError:
+                self.errors += 1
+                raise
+            fields["bytes"] = len(buf)
+        data, w, h = await run_in_threadpool(_resize, bytes(buf), *self.box)
+        self.downloads += 1
+        asset = MediaAsset(
+            url=url,
+            digest=hashlib.sha256(data).hexdigest(),
+            path="",
+            content_type=ctype,
+            size=len(data),
+            width=w,
+            height=h,
+            etag=etag,
+            last_modified=last_modified,
+            fetched_at=time.time(),
+        )
+        return await run_in_threadpool(self.cache.store, asset, data)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "downloads": self.downloads,
+            "errors": self.errors,
+            "cache": self.cache.stats(),
+        }
+
+
+media_fetcher = MediaFetcher(
+    MediaCache(settings.MEDIA_CACHE_DIR, settings.MEDIA_CACHE_MAX_MB * 1024 * 1024),
+    max_concurrency=settings.MEDIA_MAX_CONCURRENCY,
+    timeout_s=settings.MEDIA_TIMEOUT_S,
+    max_image_bytes=settings.MEDIA_MAX_IMAGE_MB * 1024 * 1024,
+    fresh_s=settings.MEDIA_FRESH_S,
+    box=(settings.MEDIA_SLIDE_WIDTH, settings.MEDIA_SLIDE_HEIGHT),
+    allowed_hosts=settings.MEDIA_ALLOWED_HOSTS,
+)
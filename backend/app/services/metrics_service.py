@@ -0,0 +1,36 @@
+from fastapi import FastAPI
+
+from app.core.config import settings
+from app.core.coordination import aggregate, retention_leader, shared_cache
+from app.core.tracing import span_exporter
+from app.services.deck_service import deck_store
+from app.services.export_service import render_cache_size
+from app.services.media_service import media_fetcher
+
+
+def worker_snapshot(app: FastAPI) -> dict:
+    """This process's in-memory counters (disk-backed caches are reported once)."""
+    media = media_fetcher.stats()
+    media.pop("cache", None)  # same directory for every worker
+    return {
+        "retention_leader": retention_leader.is_leader,
+        "admission": app.state.admission.snapshot(),
+        "media": media,
+        "decks": deck_store.stats(),
+        "render_cache": {"entries": render_cache_size()},
+        "shared_cache": {"hits": shared_cache.hits, "misses": shared_cache.misses},
+        "traces": span_exporter.stats(),
+    }
+
+
+def cluster_snapshot(app: FastAPI) -> dict:
+    # Publish first so the answering worker is never stale in its own report
+    shared_cache.publish_metrics(worker_snapshot(app))
+    workers = shared_cache.collect_metrics(settings.WORKER_METRICS_STALE_S)
+    return {
+        "retention_leader": retention_leader.holder(),
+        "workers": workers,
+        "total": aggregate([w["metrics"] for w in workers.values()]),
+        "shared_cache": shared_cache.stats(),
+        "media_cache": media_fetcher.cache.stats(),
+    }
@@ -1,5 +1,130 @@
-from app.core.telemetry import aspan
-from app.models.schemas.slide import Slide
+import asyncio
+import logging
+import uuid
+from datetime import datetime
+from typing import AsyncIterator, Union
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.core.telemetry import aspan, span
+from app.core.version import SCHEMA_VERSION
+from app.models.schemas.outline import OutlineRequest
+from app.models.schemas.slide import Deck, Slide
+from app.services.deck_service import deck_store
+from app.services.storage_service import load_structure
+from app.services.structure_service import seed_lines
+
+log = logging.getLogger("app")
+
+
+class OutlineInputError(ValueError):
+    """Nothing to outline from."""
+
+
+class UploadNotFound(KeyError):
+    pass
+
+
+def _clip(s: str, n: int = 80) -> str:
+    s = s.strip()
+    return s if len(s) <= n else (s[: n - 1].rstrip() + "…")
+
+
+def _check(req: OutlineRequest) -> None:
+    if not (req.text or "").strip() and not req.topic and not req.file_id:
+        raise OutlineInputError("Provide either 'text', 'topic' or 'file_id'")
+
+
+def resolve_seeds(req: OutlineRequest) -> list[str]:
+    """Title seeds for a request (blocking: may read the stored structure)."""
+    _check(req)
+    if req.file_id:
+        # Seeds were extracted once at parse time; no need to rescan the text
+        index = load_structure(req.file_id)
+        if index is None:
+            raise UploadNotFound(req.file_id)
+        return index.seeds
+    return seed_lines((req.text or "").strip())
+
+
+def build_deck(req: OutlineRequest, seeds: list[str]) -> Deck:
+    """Placeholder deck from seeds, stored server-side."""
+    n = max(1, min(req.slide_count, 15))
+    topic = (req.topic or (seeds[0] if seeds else "Untitled")).strip()
+
+    with span("outline_stub_build", topic=topic, slide_count=n):
+        slides: list[Slide] = []
+        for i in range(n):
+            seed = seeds[i % len(seeds)] if seeds else topic
+            title = f"Slide {i + 1}: {_clip(seed)}"
+            slides.append(
+                Slide(id=uuid.uuid4().hex, title=title, bullets=["placeholder bullet"])
+            )
+
+        deck = Deck(
+            version=SCHEMA_VERSION,
+            topic=topic,
+            source={"file_id": req.file_id} if req.file_id else None,
+            slide_count=len(slides),
+            created_at=datetime.utcnow(),
+            slides=slides,
+        )
+        deck = deck_store.create(deck)
+
+    log.info(
+        "outline_stub_complete", extra={"slide_count": len(slides), "deck_id": deck.id}
+    )
+    return deck
+
+
+def _seed_key(req: OutlineRequest) -> tuple:
+    if req.file_id:
+        return ("file", req.file_id)
+    return ("text", (req.text or "").strip())
+
+
+async def outline_many(
+    items: list[OutlineRequest], concurrency: int
+) -> AsyncIterator[tuple[int, Union[Deck, Exception]]]:
+    """Yield (index, deck or error) for each item, in completion order.
+
+    Items naming the same upload (or carrying the same text) share one seed
+    extraction. At most `concurrency` items are in flight; a failing item
+    yields its exception and the rest carry on.
+    """
+    seeds: dict[tuple, asyncio.Future] = {}
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    def _seeds_for(req: OutlineRequest) -> asyncio.Future:
+        key = _seed_key(req)
+        fut = seeds.get(key)
+        if fut is None:
+            fut = seeds[key] = asyncio.ensure_future(
+                run_in_threadpool(resolve_seeds, req)
+            )
+        return fut
+
+    async def _one(i: int, req: OutlineRequest):
+        async with sem, aspan("outline_batch_item", index=i) as fields:
+            try:
+                _check(req)
+                # shield: a shared extraction must survive one waiter's cancel
+                item_seeds = await asyncio.shield(_seeds_for(req))
+                deck = await run_in_threadpool(build_deck, req, item_seeds)
+            except Exception as e:
+                fields["error"] = type(e).__name__
+                return i, e
+            fields["deck_id"] = deck.id
+            return i, deck
+
+    tasks = [asyncio.create_task(_one(i, req)) for i, req in enumerate(items)]
+    try:
+        for done in asyncio.as_completed(tasks):
+            yield await done
+    finally:
+        for t in [*tasks, *seeds.values()]:
+            t.cancel()
+        await asyncio.gather(*tasks, *seeds.values(), return_exceptions=True)
 
 
 async def build_outline_placeholder(text: str, slide_count: int = 8) -> list[Slide]:
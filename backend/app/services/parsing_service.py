@@ -1,53 +1,76 @@
+import re
 from pathlib import Path
-from typing import Tuple
+from typing import List, Tuple
 from docx import Document
 
-from app.core.telemetry import span
+from app.core.telemetry import progress, span
 from app.models.schemas.upload import ParsedPreview
+from app.services.structure_service import LineInfo, build_index
 
+_DOCX_HEADING = re.compile(r"^Heading (\d)$")
 
-def _read_pdf(path: Path) -> Tuple[str, int]:
+
+def _read_pdf(path: Path) -> Tuple[List[List[LineInfo]], int]:
     import pdfplumber
 
     with span("read_pdf", file=str(path)):
-        text_parts = []
+        page_lines: List[List[LineInfo]] = []
         pages = 0
         with pdfplumber.open(path) as pdf:
             pages = len(pdf.pages)
-            for p in pdf.pages:
-                text_parts.append(p.extract_text() or "")
-        return "\n".join(text_parts), pages
+            for i, p in enumerate(pdf.pages, start=1):
+                # Same text as extract_text(), but keeps per-line glyph metrics
+                lines = []
+                for ln in p.extract_text_lines(return_chars=True):
+                    chars = ln.get("chars") or []
+                    size = sum(c["size"] for c in chars) / len(chars) if chars else None
+                    font = chars[len(chars) // 2]["fontname"] if chars else ""
+                    lines.append(
+                        LineInfo(ln["text"], size=size, bold="bold" in font.lower())
+                    )
+                page_lines.append(lines)
+                progress("pages", done=i, total=pages)
+        return page_lines, pages
 
 
-def _read_docx(path: Path) -> Tuple[str, int]:
+def _read_docx(path: Path) -> Tuple[List[List[LineInfo]], int]:
     with span("read_docx", file=str(path)):
         doc = Document(str(path))
-        text = "\n".join(p.text for p in doc.paragraphs if p.text)
-        return text, 0  # pages unknown from docx
+        lines = []
+        for p in doc.paragraphs:
+            if not p.text:
+                continue
+            style = p.style.name if p.style is not None else ""
+            m = _DOCX_HEADING.match(style)
+            level = int(m.group(1)) if m else (1 if style == "Title" else None)
+            lines.append(LineInfo(p.text, style_level=level))
+        return [lines], 0  # pages unknown from docx
 
 
 def parse_file(path: Path, content_type: str | None) -> ParsedPreview:
     with span("parse_file", file=str(path), content_type=content_type or "unknown"):
         path = Path(path)
         ext = path.suffix.lower()
-        text, pages = "", 0
+        page_lines, pages = [], 0
 
         if (content_type and "pdf" in content_type) or ext == ".pdf":
-            text, pages = _read_pdf(path)
+            page_lines, pages = _read_pdf(path)
             kind = "pdf"
         elif (content_type and "word" in content_type) or ext in {".docx"}:
-            text, pages = _read_docx(path)
+            page_lines, pages = _read_docx(path)
             kind = "docx"
         else:
             with span("read_text", file=str(path)):
-                text = path.read_text(errors="ignore")
+                raw = path.read_text(errors="ignore")
+            page_lines = [[LineInfo(ln) for ln in raw.split("\n")]]
             kind = "text"
 
-        text = (text or "").strip()
+        text, structure = build_index(page_lines, paged=kind == "pdf")
         return ParsedPreview(
             kind=kind,
             pages=pages,
             text=text,
             text_length=len(text),
             text_preview=text[:1000],
+            structure=structure,
         )
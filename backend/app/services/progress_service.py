@@ -0,0 +1,201 @@
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import AsyncIterator, Optional
+
+from app.core.config import settings
+
+TERMINAL_EVENTS = {"parsed", "error"}
+
+
+class ProgressChannel:
+    """Append-only event log for one upload; subscribers are just awaiting futures."""
+
+    def __init__(
+        self, loop: asyncio.AbstractEventLoop, max_events: int, pending: bool = False
+    ):
+        self.loop = loop
+        self.max_events = max_events
+        self.events: list[dict] = []
+        self.first_id = 0  # id of events[0] once old entries are trimmed
+        self.closed = False
+        # Created by a subscriber ahead of its upload: short-lived, evicted first
+        self.pending = pending
+        self.touched = time.monotonic()
+        self._waiters: list[asyncio.Future] = []
+
+    @property
+    def next_id(self) -> int:
+        return self.first_id + len(self.events)
+
+    def append(self, event: str, data: dict) -> None:
+        # Loop thread only; ProgressHub.publish hops threads for us.
+        if self.closed:
+            return
+        self.events.append({"id": self.next_id, "event": event, "data": data})
+        if len(self.events) > self.max_events:
+            # Slow readers skip ahead rather than holding per-page history.
+            drop = len(self.events) - self.max_events
+            del self.events[:drop]
+            self.first_id += drop
+        if event in TERMINAL_EVENTS:
+            self.closed = True
+        self.touched = time.monotonic()
+        waiters, self._waiters = self._waiters, []
+        for fut in waiters:
+            if not fut.done():
+                fut.set_result(None)
+
+    async def wait(self, timeout: float) -> None:
+        fut = self.loop.create_future()
+        self._waiters.append(fut)
+        try:
+            await asyncio.wait_for(fut, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            if fut in self._waiters:
+                self._waiters.remove(fut)
+
+
+class ProgressHub:
+    def __init__(
+        self, max_channels: int, max_events: int, ttl_s: float, pending_ttl_s: float
+    ):
+        self.max_channels = max_channels
+        self.max_events = max_events
+        self.ttl_s = ttl_s
+        self.pending_ttl_s = pending_ttl_s
+        self._channels: OrderedDict[str, ProgressChannel] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def channel(self, upload_id: str, fresh: bool = False) -> ProgressChannel:
+        """Get or create a live channel; must be called from the event loop.
+
+        `fresh` is for an upload or finalize that is starting: a channel left
+        closed by an earlier run of the same id is replaced, so new events are
+        not dropped and new subscribers don't replay the stale outcome.
+        """
+        with self._lock:
+            ch = self._channels.get(upload_id)
+            if ch is not None and not (fresh and ch.closed):
+                ch.pending = False
+                ch.touched = time.monotonic()
+                self._channels.move_to_end(upload_id)
+                return ch
+            self._expire()
+            ch = ProgressChannel(asyncio.get_running_loop(), self.max_events)
+            self._channels[upload_id] = ch
+            self._trim()
+            return ch
+
+    def _attach(self, upload_id: str) -> ProgressChannel:
+        # Subscribers may arrive before their upload, but an id nobody uploads
+        # must not push live channels out: it gets a pending channel that
+        # expires after pending_ttl_s and is never kept at a live one's expense.
+        with self._lock:
+            ch = self._channels.get(upload_id)
+            if ch is not None:
+                return ch
+            self._expire()
+            ch = ProgressChannel(
+                asyncio.get_running_loop(), self.max_events, pending=True
+            )
+            self._channels[upload_id] = ch
+            self._trim()
+            return ch
+
+    def _trim(self) -> None:
+        excess = len(self._channels) - self.max_channels
+        if excess <= 0:
+            return
+        pending = [k for k, ch in self._channels.items() if ch.pending]
+        for k in pending[:excess]:
+            del self._channels[k]
+        while len(self._channels) > self.max_channels:
+            self._channels.popitem(last=False)
+
+    def _expire(self) -> None:
+        now = time.monotonic()
+        stale = [
+            k
+            for k, ch in self._channels.items()
+            if ch.touched < now - (self.pending_ttl_s if ch.pending else self.ttl_s)
+        ]
+        for k in stale:
+            del self._channels[k]
+
+    def _detached(self, upload_id: str, ch: ProgressChannel) -> bool:
+        with self._lock:
+            if self._channels.get(upload_id) is ch:
+                if not ch.pending:
+                    return False
+                if ch.touched >= time.monotonic() - self.pending_ttl_s:
+                    return False
+                del self._channels[upload_id]
+            return True
+
+    def publish(self, upload_id: str, event: str, data: dict) -> None:
+        """Thread-safe: parse workers call this from the threadpool."""
+        with self._lock:
+            ch = self._channels.get(upload_id)
+        if ch is None:
+            return
+        try:
+            on_loop = asyncio.get_running_loop() is ch.loop
+        except RuntimeError:
+            on_loop = False
+        if on_loop:
+            ch.append(event, data)
+        else:
+            ch.loop.call_soon_threadsafe(ch.append, event, data)
+
+    async def subscribe(
+        self, upload_id: str, last_event_id: Optional[int] = None
+    ) -> AsyncIterator[Optional[dict]]:
+        """Yield events after `last_event_id`; yields None as a heartbeat tick.
+
+        Ends once the upload reaches a terminal event, or when a channel opened
+        ahead of its upload is evicted or expires without the upload starting.
+        """
+        ch = self._attach(upload_id)
+        cursor = 0 if last_event_id is None else last_event_id + 1
+        while True:
+            # Re-clamp per event: the channel may trim while we sit at `yield`
+            while max(cursor, ch.first_id) < ch.next_id:
+                cursor = max(cursor, ch.first_id)
+                ev = ch.events[cursor - ch.first_id]
+                cursor += 1
+                yield ev
+            if ch.closed:
+                return
+            await ch.wait(settings.PROGRESS_HEARTBEAT_S)
+            if cursor >= ch.next_id and not ch.closed:
+                if self._detached(upload_id, ch):
+                    return
+                yield None
+
+
+def format_sse(ev: Optional[dict]) -> str:
+    if ev is None:
+        return ": keep-alive\n\n"
+    return (
+        f"id: {ev['id']}\nevent: {ev['event']}\n"
+        f"data: {json.dumps(ev['data'], separators=(',', ':'))}\n\n"
+    )
+
+
+def format_ndjson(ev: Optional[dict]) -> str:
+    if ev is None:
+        return "\n"
+    return json.dumps(ev, separators=(",", ":")) + "\n"
+
+
+progress_hub = ProgressHub(
+    max_channels=settings.PROGRESS_MAX_CHANNELS,
+    max_events=settings.PROGRESS_MAX_EVENTS,
+    ttl_s=settings.PROGRESS_TTL_S,
+    pending_ttl_s=settings.PROGRESS_PENDING_TTL_S,
+)
@@ -0,0 +1,486 @@
+import heapq
+import json
+import logging
+import math
+import mmap
+import os
+import re
+import struct
+import threading
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import Iterable, Optional
+
+from app.core.config import settings
+from app.core.coordination import file_lock
+from app.core.telemetry import span
+from app.models.schemas.structure import StructureIndex
+
+log = logging.getLogger("search")
+
+# Segment file layout (absolute offsets; uint32 arrays in native byte order,
+# since segments never leave the node that wrote them):
+#   magic | texts (utf-8) | pad to 4 | postings (uint32 pid,tf pairs per term)
+#   | doc lengths (uint32 per passage) | passage records | meta json
+#   | meta_off:u64le | meta_len:u64le | magic
+_MAGIC = b"PTSEG001"
+_FOOTER = 24
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+_STOP = frozenset(
+    "a an and are as at be by for from has in is it its of on or that the this "
+    "to was were will with".split()
+)
+# doc_ord, page, start, end, text_off, text_len
+_PASSAGE = struct.Struct("<IIIIQI")
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def tokenize(text: str) -> list[str]:
+    return [t for t in _TOKEN.findall(text.lower()) if len(t) > 1 and t not in _STOP]
+
+
+def split_passages(
+    text: str, structure: Optional[StructureIndex], max_chars: int
+) -> list[tuple[int, int, int]]:
+    """Cut text into (page, start, end) passages on line breaks, never across pages."""
+    paged = bool(structure and structure.page_offsets)
+    bounds = list(structure.page_offsets[1:]) if paged else []
+    bounds.append(len(text))
+    out: list[tuple[int, int, int]] = []
+    start = 0
+    for page_no, page_end in enumerate(bounds, start=1):
+        while start < page_end:
+            end = min(page_end, start + max_chars)
+            if end < page_end:
+                cut = text.rfind("\n", start + max_chars // 2, end)
+                if cut > start:
+                    end = cut
+            lo = start
+            while lo < end and text[lo].isspace():
+                lo += 1
+            if lo < end:
+                out.append((page_no if paged else 0, lo, end))
+            start = end
+    return out
+
+
+class _SegmentWriter:
+    def __init__(self):
+        self.docs: list[dict] = []
+        self.records: list[tuple] = []
+        self.dls = array("I")
+        self.texts = bytearray()
+        self.postings: dict[str, array] = {}
+
+    def add_doc(self, doc_id: str, filename: Optional[str]) -> int:
+        self.docs.append({"id": doc_id, "filename": filename})
+        return len(self.docs) - 1
+
+    def add_passage(
+        self, doc_ord: int, page: int, start: int, end: int, text: bytes, dl: int
+    ) -> int:
+        pid = len(self.records)
+        self.records.append((doc_ord, page, start, end, len(self.texts), len(text)))
+        self.dls.append(dl)
+        self.texts += text
+        return pid
+
+    def add_postings(self, pid: int, tf: Counter) -> None:
+        for term, n in tf.items():
+            plist = self.postings.get(term)
+            if plist is None:
+                plist = self.postings[term] = array("I")
+            plist.append(pid)
+            plist.append(n)
+
+    def write(self, path: Path) -> None:
+        tmp = path.with_suffix(".tmp")
+        terms: dict[str, list[int]] = {}
+        with tmp.open("wb") as f:
+            f.write(_MAGIC)
+            f.write(self.texts)
+            pos = len(_MAGIC) + len(self.texts)
+            pad = (-pos) % 4
+            f.write(b"\0" * pad)
+            pos += pad
+            for term in sorted(self.postings):
+                plist = self.postings[term]
+                f.write(plist.tobytes())
+                terms[term] = [pos, len(plist) // 2]
+                pos += len(plist) * 4
+            dls_off = pos
+            f.write(self.dls.tobytes())
+            pos += len(self.dls) * 4
+            records_off = pos
+            for rec in self.records:
+                f.write(_PASSAGE.pack(*rec))
+            pos += len(self.records) * _PASSAGE.size
+            meta = json.dumps(
+                {
+                    "docs": self.docs,
+                    "passages": len(self.records),
+                    "total_dl": sum(self.dls),
+                    "dls_off": dls_off,
+                    "records_off": records_off,
+                    "terms": terms,
+                },
+                separators=(",", ":"),
+            ).encode("utf-8")
+            f.write(meta)
+            f.write(pos.to_bytes(8, "little"))
+            f.write(len(meta).to_bytes(8, "little"))
+            f.write(_MAGIC)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+
+
+class Segment:
+    """Immutable on-disk segment; postings, lengths and texts are read via mmap.
+
+    Only the term dictionary and doc list live on the Python heap.
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.name = path.name
+        with path.open("rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        mm = self._mm
+        if mm[:8] != _MAGIC or mm[-8:] != _MAGIC:
+            raise ValueError(f"corrupt segment {path}")
+        meta_off = int.from_bytes(mm[-_FOOTER : -_FOOTER + 8], "little")
+        meta_len = int.from_bytes(mm[-_FOOTER + 8 : -8], "little")
+        meta = json.loads(mm[meta_off : meta_off + meta_len])
+        self.docs: list[dict] = meta["docs"]
+        self.passages: int = meta["passages"]
+        self.total_dl: int = meta["total_dl"]
+        self._dls_off: int = meta["dls_off"]
+        self._records_off: int = meta["records_off"]
+        self._terms: dict[str, list[int]] = meta["terms"]
+
+    def terms(self) -> Iterable[str]:
+        return self._terms.keys()
+
+    def df(self, term: str) -> int:
+        entry = self._terms.get(term)
+        return entry[1] if entry else 0
+
+    def postings(self, term: str) -> Optional[memoryview]:
+        """Flat [pid, tf, pid, tf, ...] uint32 view straight off the mapping."""
+        entry = self._terms.get(term)
+        if not entry:
+            return None
+        off, df = entry
+        return memoryview(self._mm)[off : off + df * 8].cast("I")
+
+    def dls(self) -> memoryview:
+        off = self._dls_off
+        return memoryview(self._mm)[off : off + self.passages * 4].cast("I")
+
+    def record(self, pid: int) -> tuple:
+        return _PASSAGE.unpack_from(self._mm, self._records_off + pid * _PASSAGE.size)
+
+    def text_bytes(self, rec: tuple) -> bytes:
+        off = len(_MAGIC) + rec[4]  # text offsets are relative to the texts blob
+        return self._mm[off : off + rec[5]]
+
+
+class SearchIndex:
+    """Incremental BM25 passage index over parsed uploads.
+
+    Each added document becomes a small immutable segment; once there are
+    more than `max_segments`, the smaller half is merged into one. Deletes are
+    tombstones in the manifest until a merge (or a fully-deleted segment)
+    drops them for good.
+    """
+
+    def __init__(self, root: Path, max_segments: int, passage_chars: int):
+        self.root = Path(root)
+        self.max_segments = max(2, max_segments)
+        self.passage_chars = max(100, passage_chars)
+        self._lock = threading.Lock()
+        self._segments: Optional[list[Segment]] = None
+        self._deleted: set[str] = set()
+        self._next = 0
+        self._stamp: Optional[tuple] = None  # manifest identity last loaded
+
+    def _manifest_path(self) -> Path:
+        return self.root / "manifest.json"
+
+    def _manifest_stamp(self) -> Optional[tuple]:
+        try:
+            st = self._manifest_path().stat()
+        except FileNotFoundError:
+            return None
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+    def _writing(self):
+        # Other workers write to the same directory; writers take this lock
+        # and _load() picks up whatever manifest they left behind.
+        return file_lock(self.root / "index.lock")
+
+    def _load(self) -> list[Segment]:
+        stamp = self._manifest_stamp()
+        if self._segments is None or stamp != self._stamp:
+            self.root.mkdir(parents=True, exist_ok=True)
+            opened = {s.name: s for s in self._segments or ()}
+            segs: list[Segment] = []
+            mp = self._manifest_path()
+            if stamp is not None:
+                m = json.loads(mp.read_text(encoding="utf-8"))
+                self._deleted = set(m.get("deleted", []))
+                self._next = m.get("next", 0)
+                for name in m.get("segments", []):
+                    if name in opened:
+                        segs.append(opened[name])
+                        continue
+                    try:
+                        segs.append(Segment(self.root / name))
+                    except (OSError, ValueError) as e:
+                        log.error("skip segment %s: %s", name, e)
+            self._segments = segs
+            self._stamp = stamp
+        return self._segments
+
+    def _commit(self, segs: list[Segment]) -> None:
+        live = {d["id"] for s in segs for d in s.docs}
+        self._deleted &= live
+        tmp = self._manifest_path().with_suffix(".tmp")
+        tmp.write_text(
+            json.dumps(
+                {
+                    "segments": [s.name for s in segs],
+                    "deleted": sorted(self._deleted),
+                    "next": self._next,
+                }
+            ),
+            encoding="utf-8",
+        )
+        os.replace(tmp, self._manifest_path())
+        self._stamp = self._manifest_stamp()
+        # Readers work on their own snapshot list, so swapping is safe;
+        # unlinked segment files stay readable while still mapped.
+        self._segments = segs
+
+    def _new_segment_path(self) -> Path:
+        name = f"seg_{self._next:08d}.seg"
+        self._next += 1
+        return self.root / name
+
+    def add_document(
+        self,
+        doc_id: str,
+        text: str,
+        structure: Optional[StructureIndex] = None,
+        filename: Optional[str] = None,
+    ) -> int:
+        with span("search_index_add", doc_id=doc_id) as fields:
+            w = _SegmentWriter()
+            ord_ = w.add_doc(doc_id, filename)
+            for page, start, end in split_passages(text, structure, self.passage_chars):
+                chunk = text[start:end]
+                tf = Counter(tokenize(chunk))
+                if tf:
+                    pid = w.add_passage(
+                        ord_, page, start, end, chunk.encode("utf-8"), sum(tf.values())
+                    )
+                    w.add_postings(pid, tf)
+            fields["passages"] = len(w.records)
+            if not w.records:
+                return 0
+            with self._lock, self._writing():
+                segs = self._load()
+                # Tombstones are per id, so an id added again can't just clear
+                # one: its earlier passages are expunged from their segments.
+                stale = [s for s in segs if any(d["id"] == doc_id for d in s.docs)]
+                if stale:
+                    self._deleted.add(doc_id)
+                    merged = self._merge(stale)
+                    segs = [s for s in segs if s not in stale]
+                    segs += [merged] if merged else []
+                    self._deleted.discard(doc_id)
+                path = self._new_segment_path()
+                w.write(path)
+                segs = segs + [Segment(path)]
+                self._commit(segs)
+                for s in stale:
+                    s.path.unlink(missing_ok=True)
+                if len(segs) > self.max_segments:
+                    self._merge_smallest(segs)
+            return len(w.records)
+
+    def delete_documents(self, doc_ids: Iterable[str]) -> int:
+        ids = set(doc_ids)
+        if not ids:
+            return 0
+        with self._lock, self._writing():
+            segs = self._load()
+            hit = ids & {d["id"] for s in segs for d in s.docs}
+            if not hit:
+                return 0
+            self._deleted |= hit
+            # Segments with nothing live left are dropped without rewriting
+            keep = [
+                s for s in segs if any(d["id"] not in self._deleted for d in s.docs)
+            ]
+            self._commit(keep)
+            for s in segs:
+                if s not in keep:
+                    s.path.unlink(missing_ok=True)
+        return len(hit)
+
+    def merge(self) -> None:
+        """Force-merge every segment into one (also expunges deletes)."""
+        with self._lock, self._writing():
+            segs = self._load()
+            if len(segs) > 1 or self._deleted:
+                self._replace(segs, segs)
+
+    def _merge_smallest(self, segs: list[Segment]) -> None:
+        victims = sorted(segs, key=lambda s: s.passages)[: max(2, len(segs) // 2)]
+        self._replace(segs, victims)
+
+    def _replace(self, segs: list[Segment], victims: list[Segment]) -> None:
+        merged = self._merge(victims)
+        new = [s for s in segs if s not in victims] + ([merged] if merged else [])
+        self._commit(new)
+        for s in victims:
+            s.path.unlink(missing_ok=True)
+
+    def _merge(self, victims: list[Segment]) -> Optional[Segment]:
+        with span("search_segment_merge", segments=len(victims)) as fields:
+            w = _SegmentWriter()
+            remaps: list[dict[int, int]] = []
+            for seg in victims:
+                ords = {
+                    i: w.add_doc(d["id"], d.get("filename"))
+                    for i, d in enumerate(seg.docs)
+                    if d["id"] not in self._deleted
+                }
+                dls = seg.dls()
+                pid_map: dict[int, int] = {}
+                for pid in range(seg.passages):
+                    rec = seg.record(pid)
+                    if rec[0] in ords:
+                        pid_map[pid] = w.add_passage(
+                            ords[rec[0]], *rec[1:4], seg.text_bytes(rec), dls[pid]
+                        )
+                dls.release()
+                remaps.append(pid_map)
+
+            # Victims are concatenated in order, so remapped pids stay sorted
+            for term in sorted({t for s in victims for t in s.terms()}):
+                out = array("I")
+                for seg, pid_map in zip(victims, remaps):
+                    mv = seg.postings(term)
+                    if mv is None:
+                        continue
+                    for i in range(0, len(mv), 2):
+                        new_pid = pid_map.get(mv[i])
+                        if new_pid is not None:
+                            out.append(new_pid)
+                            out.append(mv[i + 1])
+                    mv.release()
+                if out:
+                    w.postings[term] = out
+            fields["passages"] = len(w.records)
+            if not w.records:
+                return None
+            path = self._new_segment_path()
+            w.write(path)
+            return Segment(path)
+
+    def search(
+        self, query: str, k: int = 10, doc_id: Optional[str] = None
+    ) -> list[dict]:
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        with self._lock:
+            segs = list(self._load())
+            deleted = set(self._deleted)
+        with span("search_query", terms=len(terms), segments=len(segs)) as fields:
+            n = sum(s.passages for s in segs)
+            if not n:
+                return []
+            avgdl = max(1.0, sum(s.total_dl for s in segs) / n)
+            idf = {}
+            for t in terms:
+                df = sum(s.df(t) for s in segs)
+                if df:
+                    idf[t] = math.log(1 + (n - df + 0.5) / (df + 0.5))
+
+            heap: list[tuple[float, int, int]] = []
+            for si, seg in enumerate(segs):
+                skip = {
+                    i
+                    for i, d in enumerate(seg.docs)
+                    if d["id"] in deleted or (doc_id and d["id"] != doc_id)
+                }
+                if len(skip) == len(seg.docs):
+                    continue
+                dls = seg.dls()
+                scores: dict[int, float] = {}
+                for t, w in idf.items():
+                    mv = seg.postings(t)
+                    if mv is None:
+                        continue
+                    for i in range(0, len(mv), 2):
+                        pid, tf = mv[i], mv[i + 1]
+                        norm = BM25_K1 * (1 - BM25_B + BM25_B * dls[pid] / avgdl)
+                        scores[pid] = scores.get(pid, 0.0) + w * tf * (BM25_K1 + 1) / (
+                            tf + norm
+                        )
+                    mv.release()
+                dls.release()
+                for pid, score in scores.items():
+                    item = (score, si, pid)
+                    if len(heap) >= k and item <= heap[0]:
+                        continue
+                    if skip and seg.record(pid)[0] in skip:
+                        continue
+                    if len(heap) < k:
+                        heapq.heappush(heap, item)
+                    else:
+                        heapq.heapreplace(heap, item)
+
+            hits = []
+            for score, si, pid in sorted(heap, reverse=True):
+                seg = segs[si]
+                rec = seg.record(pid)
+                doc = seg.docs[rec[0]]
+                hits.append(
+                    {
+                        "doc_id": doc["id"],
+                        "filename": doc.get("filename"),
+                        "page": rec[1],
+                        "start": rec[2],
+                        "end": rec[3],
+                        "score": round(score, 4),
+                        "text": seg.text_bytes(rec).decode("utf-8", "replace"),
+                    }
+                )
+            fields["hits"] = len(hits)
+        return hits
+
+    def stats(self) -> dict:
+        with self._lock:
+            segs = list(self._load())
+            return {
+                "segments": [
+                    {"name": s.name, "docs": len(s.docs), "passages": s.passages}
+                    for s in segs
+                ],
+                "deleted_docs": len(self._deleted),
+            }
+
+
+search_index = SearchIndex(
+    settings.SEARCH_INDEX_DIR,
+    max_segments=settings.SEARCH_MAX_SEGMENTS,
+    passage_chars=settings.SEARCH_PASSAGE_CHARS,
+)
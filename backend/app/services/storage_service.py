@@ -1,17 +1,243 @@
 import os
+import re
 import time
 import logging
 from pathlib import Path
 from datetime import timedelta
+from typing import AsyncIterator, BinaryIO, Callable, Optional
 from fastapi import UploadFile
 
 from app.core.config import settings
+from app.core.coordination import file_lock
 from app.core.telemetry import span, aspan
 from app.services.parsing_service import parse_file
-from app.models.schemas.upload import UploadMeta, ParsedPreview
+from app.services.search_service import search_index
+from app.models.schemas.upload import UPLOAD_ID_PATTERN, UploadMeta, ParsedPreview
+from app.models.schemas.structure import StructureIndex
 
 log = logging.getLogger("retention")
 
+# Parse artifacts written next to each upload as "<file_id>.<suffix>"
+STRUCTURE_SUFFIX = ".structure.json"
+TEXT_SUFFIX = ".text.txt"
+_UPLOAD_ID = re.compile(UPLOAD_ID_PATTERN)
+
+
+def _artifact(file_id: str, suffix: str) -> Path:
+    return Path(settings.STORAGE_DIR) / f"{file_id}{suffix}"
+
+
+class SizeLimitExceeded(ValueError):
+    def __init__(self, limit: int):
+        super().__init__(f"more than {limit} bytes")
+        self.limit = limit
+
+
+async def write_chunks(
+    chunks: AsyncIterator[bytes],
+    f: BinaryIO,
+    limit: int,
+    on_chunk: Optional[Callable[[bytes, int], None]] = None,
+) -> int:
+    """Copy a byte stream into `f`, refusing to go past `limit` bytes.
+
+    `on_chunk(chunk, total)` runs after each write; the count it sees is
+    what actually reached the file if the stream later fails.
+    """
+    size = 0
+    async for chunk in chunks:
+        if not chunk:
+            continue
+        if size + len(chunk) > limit:
+            raise SizeLimitExceeded(limit)
+        f.write(chunk)
+        size += len(chunk)
+        if on_chunk is not None:
+            on_chunk(chunk, size)
+    return size
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    # Readers see the old file or the new one, never a torn write
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+
+def _byte_offsets(text: str, offsets: list[int]) -> list[int]:
+    out, pos, nbytes = [], 0, 0
+    for off in offsets:
+        nbytes += len(text[pos:off].encode("utf-8"))
+        pos = off
+        out.append(nbytes)
+    return out
+
+
+def save_parsed(file_id: str, parsed: ParsedPreview) -> None:
+    """Persist parsed text + structure index so later lookups skip re-parsing.
+
+    The index records page starts as byte offsets too, so a page range is
+    read straight out of the text file. It is written last: once it exists,
+    the text it describes is in place.
+    """
+    with span("save_parsed", file_id=file_id):
+        data = parsed.text.encode("utf-8")
+        _write_atomic(_artifact(file_id, TEXT_SUFFIX), data)
+        if parsed.structure is not None:
+            index = parsed.structure.model_copy(
+                update={
+                    "text_bytes": len(data),
+                    "page_byte_offsets": _byte_offsets(
+                        parsed.text, parsed.structure.page_offsets
+                    ),
+                }
+            )
+            _write_atomic(
+                _artifact(file_id, STRUCTURE_SUFFIX), index.model_dump_json().encode()
+            )
+
+
+def has_artifacts(file_id: str) -> bool:
+    """Whether an upload under this id has already been parsed and stored."""
+    return any(
+        _artifact(file_id, suffix).exists()
+        for suffix in (TEXT_SUFFIX, STRUCTURE_SUFFIX)
+    )
+
+
+class UploadIdTaken(Exception):
+    """A client-chosen upload id that is already stored or being uploaded."""
+
+
+def upload_ids_lock():
+    """Serializes "is this id free?" checks with the write that claims the id."""
+    return file_lock(settings.COORD_DIR / "upload-ids.lock")
+
+
+def upload_id_in_use(file_id: str) -> bool:
+    """Parsed, stored (even if never parsed) or open as a resumable session."""
+    base = Path(settings.STORAGE_DIR)
+    return (
+        has_artifacts(file_id)
+        or any(base.glob(f"{file_id}_*"))
+        or (base / "partial" / f"{file_id}.json").exists()
+    )
+
+
+def reserve_upload(file_id: str, filename: str) -> Path:
+    """Create the empty `<file_id>_<filename>` an upload streams into.
+
+    Re-using an id would overwrite its parse artifacts and leave the old
+    passages searchable under the new document, so a taken id raises
+    UploadIdTaken. The check and the create happen under one lock.
+    """
+    dest = Path(settings.STORAGE_DIR) / f"{file_id}_{filename}"
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    with upload_ids_lock():
+        if upload_id_in_use(file_id):
+            raise UploadIdTaken(file_id)
+        try:
+            os.close(os.open(dest, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644))
+        except FileExistsError:
+            raise UploadIdTaken(file_id)
+    return dest
+
+
+def load_structure(file_id: str) -> Optional[StructureIndex]:
+    """Stored structure index, or None if missing or unreadable."""
+    if not _UPLOAD_ID.match(file_id):
+        return None
+    p = _artifact(file_id, STRUCTURE_SUFFIX)
+    if not p.is_file():
+        return None
+    try:
+        return StructureIndex.model_validate_json(p.read_bytes())
+    except (OSError, ValueError) as e:  # pydantic's ValidationError is a ValueError
+        log.warning("unreadable structure index for %s: %s", file_id, e)
+        return None
+
+
+def read_text_span(file_id: str, start: int, end: int) -> Optional[str]:
+    """Slice [start, end) chars out of the stored parsed text."""
+    p = _artifact(file_id, TEXT_SUFFIX)
+    if not p.is_file():
+        return None
+    return p.read_text(encoding="utf-8")[start:end]
+
+
+def read_text_bytes(file_id: str, start: int, end: int) -> Optional[str]:
+    """Decode bytes [start, end) of the stored text, reading only that range."""
+    try:
+        with _artifact(file_id, TEXT_SUFFIX).open("rb") as f:
+            f.seek(start)
+            return f.read(max(0, end - start)).decode("utf-8")
+    except FileNotFoundError:
+        return None
+
+
+def _artifact_id(name: str) -> Optional[str]:
+    for suffix in (STRUCTURE_SUFFIX, TEXT_SUFFIX):
+        if name.endswith(suffix):
+            return name[: -len(suffix)]
+    return None
+
+
+def file_ids_of(paths: list[Path]) -> set[str]:
+    """Upload ids behind a set of upload files and parse artifacts.
+
+    Ids may contain "_", so "<id>_<name>" alone is ambiguous: an upload
+    resolves to the longest "_"-prefix whose parse artifacts exist or are in
+    `paths`. Uploads that were never parsed have no id to report.
+    """
+    ids = {i for p in paths if (i := _artifact_id(Path(p).name)) is not None}
+    for p in paths:
+        name = Path(p).name
+        if _artifact_id(name) is not None:
+            continue
+        cuts = [i for i, ch in enumerate(name) if ch == "_"]
+        for cut in reversed(cuts):
+            cand = name[:cut]
+            if cand in ids or Path(p).with_name(cand + TEXT_SUFFIX).exists():
+                ids.add(cand)
+                break
+    return ids
+
+
+def run_retention(base_dir: Path, older_than: timedelta) -> list[Path]:
+    """Purge expired files and drop their documents from the search index.
+
+    Serialized across workers so a manual sweep never races the leader's.
+    """
+    # Imported here: the session service builds on write_chunks below
+    from app.services.upload_session_service import purge_stale_sessions
+
+    with file_lock(settings.COORD_DIR / "retention.lock"):
+        deleted = purge_old_files(base_dir, older_than)
+        expired = file_ids_of(deleted)
+        # An expired upload takes its parse artifacts with it, even if they
+        # were written a little later and are not due yet
+        for file_id in expired:
+            for suffix in (TEXT_SUFFIX, STRUCTURE_SUFFIX):
+                p = Path(base_dir) / f"{file_id}{suffix}"
+                if p.exists():
+                    p.unlink(missing_ok=True)
+                    deleted.append(p)
+        partial = purge_stale_sessions(
+            timedelta(hours=max(1, settings.UPLOAD_SESSION_TTL_HOURS))
+        )
+    if partial:
+        log.info("retention: dropped %d abandoned partial upload file(s)", len(partial))
+    if deleted and settings.SEARCH_ENABLED:
+        try:
+            search_index.delete_documents(expired)
+        except Exception as e:
+            log.error("search index cleanup failed: %s", e)
+    return deleted
+
 
 def purge_old_files(base_dir: Path, older_than: timedelta) -> list[Path]:
     deleted: list[Path] = []
@@ -0,0 +1,185 @@
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import List, Optional
+
+from app.core.telemetry import span
+from app.models.schemas.structure import Heading, Section, StructureIndex
+
+MAX_SEEDS = 50
+
+_BAD_LINES = {"n", "contents", "table of contents", "toc", "index"}
+_BULLET_PREFIX = re.compile(r"^(\s*[-*•·●]\s*)+")
+_WS = re.compile(r"\s+")
+_ARTIFACT = re.compile(r"\(cid:\d+\)")
+_LEAD_NUM = re.compile(r"^[\s]*(?:\d+[\.\)]|[IVXLCM]+\.)\s+", re.IGNORECASE)
+
+_MD_HEADING = re.compile(r"^(#{1,6})\s+\S")
+_NUM_HEADING = re.compile(r"^(\d+(?:\.\d+)*)[\.\)]?\s+[^\W\d_]")
+_ROMAN_HEADING = re.compile(r"^[IVXLC]+\.\s+[^\W\d_]")
+_HEADING_MARK = re.compile(r"^(?:#{1,6}|\d+(?:\.\d+)+\.?)\s+")
+
+
+@dataclass
+class LineInfo:
+    text: str
+    size: Optional[float] = None  # mean glyph size (PDF only)
+    bold: bool = False
+    style_level: Optional[int] = None  # heading level from docx styles
+
+
+def clean_line(ln: str) -> str:
+    """Strip bullets, numbering and PDF artifacts; '' if not a usable seed."""
+    s = ln.strip()
+    if not s:
+        return ""
+    s = _ARTIFACT.sub("", s)
+    s = _BULLET_PREFIX.sub("", s)
+    s = _LEAD_NUM.sub("", s)
+    s = _WS.sub(" ", s).strip(" -—•·")
+    if len(s) < 4 or s.lower() in _BAD_LINES:
+        return ""
+    return s
+
+
+def seed_lines(txt: str) -> List[str]:
+    return [s for s in (clean_line(ln) for ln in txt.splitlines()) if s]
+
+
+def _pattern_level(s: str) -> Optional[int]:
+    m = _MD_HEADING.match(s)
+    if m:
+        return len(m.group(1))
+    if len(s) > 80 or s.endswith((".", ",", ";", ":")):
+        return None
+    m = _NUM_HEADING.match(s)
+    if m:
+        return min(6, m.group(1).count(".") + 1)
+    if _ROMAN_HEADING.match(s):
+        return 1
+    letters = [c for c in s if c.isalpha()]
+    if len(letters) >= 4 and all(c.isupper() for c in letters):
+        return 1
+    return None
+
+
+def _font_levels(lines: List[tuple[int, int, LineInfo]]) -> dict[int, int]:
+    """Map line position -> heading level using glyph size relative to body text."""
+    weights: Counter = Counter()
+    for _, _, li in lines:
+        if li.size:
+            weights[round(li.size * 2) / 2] += len(li.text)
+    if not weights:
+        return {}
+    body = weights.most_common(1)[0][0]
+    big = sorted(
+        {
+            round(li.size * 2) / 2
+            for _, _, li in lines
+            if li.size and li.size >= body * 1.15
+        },
+        reverse=True,
+    )[:3]
+    rank = {sz: i + 1 for i, sz in enumerate(big)}
+    out: dict[int, int] = {}
+    for pos, (_, _, li) in enumerate(lines):
+        s = li.text.strip()
+        if not s or len(s) > 120 or not li.size:
+            continue
+        sz = round(li.size * 2) / 2
+        if sz in rank:
+            out[pos] = rank[sz]
+        elif li.bold and sz == body and len(s) <= 80 and not _BULLET_PREFIX.match(s):
+            out[pos] = len(rank) + 1
+    return out
+
+
+def build_index(pages: List[List[LineInfo]], paged: bool) -> tuple[str, StructureIndex]:
+    """Join page lines into the parsed text and index its structure in one pass.
+
+    Lines are joined with "\\n" within and between pages, which is exactly how
+    the readers have always assembled text; the result is then stripped and
+    all offsets are relative to the stripped text.
+    """
+    with span("build_structure_index", pages=len(pages)) as fields:
+        flat: List[tuple[int, int, LineInfo]] = []  # (page, offset, line)
+        page_offsets: List[int] = []
+        parts: List[str] = []
+        pos = 0
+        for pno, lines in enumerate(pages, start=1):
+            if pno > 1:
+                parts.append("\n")
+                pos += 1
+            page_offsets.append(pos)
+            for i, li in enumerate(lines):
+                if i:
+                    parts.append("\n")
+                    pos += 1
+                flat.append((pno if paged else 0, pos, li))
+                parts.append(li.text)
+                pos += len(li.text)
+        raw = "".join(parts)
+        text = raw.strip()
+        lead = len(raw) - len(raw.lstrip())
+
+        levels = {
+            p: li.style_level for p, (_, _, li) in enumerate(flat) if li.style_level
+        }
+        source = "style"
+        if not levels:
+            levels, source = _font_levels(flat), "font"
+        if not levels:
+            levels, source = {}, "pattern"
+            for p, (_, _, li) in enumerate(flat):
+                lvl = _pattern_level(li.text.strip())
+                if lvl:
+                    levels[p] = lvl
+
+        headings: List[Heading] = []
+        prev = -2
+        for p in sorted(levels):
+            page, off, li = flat[p]
+            s = li.text.strip()
+            if not s:
+                continue
+            off = max(0, off - lead + (len(li.text) - len(li.text.lstrip())))
+            # Titles wrapped across lines show up as consecutive same-level lines
+            if (
+                prev == p - 1
+                and headings[-1].level == levels[p]
+                and headings[-1].page == page
+                and source == "font"
+            ):
+                headings[-1].text = f"{headings[-1].text} {s}"
+            else:
+                headings.append(
+                    Heading(
+                        text=s, level=levels[p], page=page, offset=off, source=source
+                    )
+                )
+            prev = p
+
+        sections: List[Section] = []
+        if headings and headings[0].offset > 0:
+            sections.append(Section(heading=-1, start=0, end=headings[0].offset))
+        for i, h in enumerate(headings):
+            end = headings[i + 1].offset if i + 1 < len(headings) else len(text)
+            sections.append(Section(heading=i, start=h.offset, end=end))
+
+        seeds = [
+            s
+            for s in (clean_line(_HEADING_MARK.sub("", h.text)) for h in headings)
+            if s
+        ]
+        if len(seeds) < 2:
+            seeds = seed_lines(text)
+        fields.update(headings=len(headings), source=source)
+
+        index = StructureIndex(
+            text_length=len(text),
+            page_offsets=[max(0, o - lead) for o in page_offsets] if paged else [],
+            headings=headings,
+            sections=sections,
+            seeds=seeds[:MAX_SEEDS],
+        )
+    return text, index
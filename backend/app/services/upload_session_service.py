@@ -0,0 +1,273 @@
+import base64
+import hashlib
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import AsyncIterator, Callable, Optional
+from uuid import uuid4
+
+from app.core.config import settings
+from app.core.coordination import file_lock
+from app.core.telemetry import aspan, span
+from app.models.schemas.upload import UploadSession, UploadSessionCreate
+from app.services.storage_service import (
+    SizeLimitExceeded,
+    upload_id_in_use,
+    upload_ids_lock,
+    write_chunks,
+)
+
+log = logging.getLogger("retention")
+
+# tus "Upload-Checksum" algorithms we accept
+CHECKSUM_ALGOS = {"sha256", "sha1", "md5"}
+
+
+class SessionNotFound(KeyError):
+    pass
+
+
+class SessionBusy(Exception):
+    """Another request is appending to (or finalizing) the same session."""
+
+
+class OffsetMismatch(Exception):
+    def __init__(self, current: int):
+        super().__init__(f"session is at offset {current}")
+        self.current = current
+
+
+class ChecksumMismatch(ValueError):
+    pass
+
+
+class ChunkTooLarge(ValueError):
+    pass
+
+
+class SessionIncomplete(Exception):
+    def __init__(self, offset: int, size: int):
+        super().__init__(f"received {offset} of {size} bytes")
+        self.offset = offset
+
+
+def parse_checksum(header: Optional[str]) -> Optional[tuple[str, bytes]]:
+    """`Upload-Checksum: <algo> <base64 digest>` -> (algo, digest)."""
+    if not header:
+        return None
+    algo, _, b64 = header.strip().partition(" ")
+    algo = algo.lower()
+    if algo not in CHECKSUM_ALGOS:
+        raise ValueError(f"unsupported checksum algorithm: {algo}")
+    try:
+        return algo, base64.b64decode(b64.strip(), validate=True)
+    except ValueError:
+        raise ValueError("checksum is not valid base64")
+
+
+def _dir() -> Path:
+    return Path(settings.STORAGE_DIR) / "partial"
+
+
+def _paths(upload_id: str) -> tuple[Path, Path, Path]:
+    d = _dir()
+    return d / f"{upload_id}.json", d / f"{upload_id}.part", d / f"{upload_id}.lock"
+
+
+def _ttl() -> timedelta:
+    return timedelta(hours=max(1, settings.UPLOAD_SESSION_TTL_HOURS))
+
+
+def _save(session: UploadSession) -> None:
+    meta, _, _ = _paths(session.upload_id)
+    session.expires_at = datetime.utcnow() + _ttl()
+    tmp = meta.with_suffix(".tmp")
+    tmp.write_text(session.model_dump_json(), encoding="utf-8")
+    os.replace(tmp, meta)
+
+
+def load_session(upload_id: str) -> UploadSession:
+    meta, _, _ = _paths(upload_id)
+    try:
+        return UploadSession.model_validate_json(meta.read_bytes())
+    except FileNotFoundError:
+        raise SessionNotFound(upload_id)
+
+
+def create_session(req: UploadSessionCreate) -> UploadSession:
+    """Start a session; SessionBusy if the id is in use or already stored.
+
+    Finalizing would overwrite the id's parse artifacts and index it twice,
+    so ids that POST /upload or an earlier session already used are refused.
+    """
+    upload_id = req.upload_id or uuid4().hex
+    meta, part, _ = _paths(upload_id)
+    _dir().mkdir(parents=True, exist_ok=True)
+    now = datetime.utcnow()
+    session = UploadSession(
+        upload_id=upload_id,
+        # Only the basename ever reaches the filesystem
+        filename=Path(req.filename).name or "upload",
+        size=req.size,
+        content_type=req.content_type,
+        sha256=req.sha256,
+        created_at=now,
+        expires_at=now + _ttl(),
+    )
+    with upload_ids_lock():
+        if upload_id_in_use(upload_id):
+            raise SessionBusy(upload_id)
+        # O_EXCL as well: the meta file is the session's claim on the id
+        try:
+            fd = os.open(meta, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+        except FileExistsError:
+            raise SessionBusy(upload_id)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(session.model_dump_json())
+    part.touch()
+    return session
+
+
+async def append_chunk(
+    upload_id: str,
+    offset: int,
+    chunks: AsyncIterator[bytes],
+    checksum: Optional[tuple[str, bytes]] = None,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> UploadSession:
+    """Write one PATCH body at `offset` and commit the new offset.
+
+    The committed offset lives in the session file, so bytes past it (a
+    crash mid-write) are simply overwritten by the retry. Without a
+    checksum, whatever arrived before a dropped connection is kept; with
+    one, the chunk is all-or-nothing.
+    """
+    meta, part, lock = _paths(upload_id)
+    try:
+        with file_lock(lock, blocking=False):
+            session = load_session(upload_id)
+            if offset != session.offset:
+                raise OffsetMismatch(session.offset)
+            hasher = hashlib.new(checksum[0]) if checksum else None
+            max_chunk = settings.UPLOAD_CHUNK_MAX_MB * 1024 * 1024
+            async with aspan(
+                "upload_chunk", upload_id=upload_id, offset=offset
+            ) as fields:
+                with part.open("r+b") as f:
+                    f.seek(offset)
+                    f.truncate()
+                    state = {"n": 0}
+
+                    def _on_chunk(chunk: bytes, n: int) -> None:
+                        state["n"] = n
+                        if hasher:
+                            hasher.update(chunk)
+                        if on_progress:
+                            on_progress(offset + n, session.size)
+
+                    try:
+                        written = await write_chunks(
+                            chunks,
+                            f,
+                            min(max_chunk, session.size - offset),
+                            _on_chunk,
+                        )
+                    except SizeLimitExceeded:
+                        raise ChunkTooLarge(
+                            "chunk runs past the declared size"
+                            if session.size - offset < max_chunk
+                            else f"chunk exceeds {settings.UPLOAD_CHUNK_MAX_MB} MB"
+                        )
+                    except BaseException:
+                        if hasher is None and state["n"]:
+                            # Keep what arrived so the client can resume from it
+                            f.flush()
+                            session.offset = offset + state["n"]
+                            _save(session)
+                        raise
+                    if hasher and hasher.digest() != checksum[1]:
+                        f.truncate(offset)
+                        raise ChecksumMismatch(f"{checksum[0]} mismatch")
+                    f.flush()
+                fields["bytes"] = written
+            session.offset = offset + written
+            _save(session)
+            return session
+    except BlockingIOError:
+        raise SessionBusy(upload_id)
+
+
+def finalize_session(upload_id: str, dest_dir: Path) -> tuple[UploadSession, Path]:
+    """Verify the assembled file and move it where regular uploads live."""
+    meta, part, lock = _paths(upload_id)
+    try:
+        with file_lock(lock, blocking=False):
+            session = load_session(upload_id)
+            if session.offset != session.size:
+                raise SessionIncomplete(session.offset, session.size)
+            if session.sha256:
+                with span("upload_verify", upload_id=upload_id, bytes=session.size):
+                    h = hashlib.sha256()
+                    with part.open("rb") as f:
+                        while block := f.read(1024 * 1024):
+                            h.update(block)
+                if h.hexdigest() != session.sha256:
+                    raise ChecksumMismatch("sha256 of assembled file does not match")
+            dest_dir.mkdir(parents=True, exist_ok=True)
+            dest = dest_dir / f"{upload_id}_{session.filename}"
+            os.replace(part, dest)
+            meta.unlink(missing_ok=True)
+    except BlockingIOError:
+        raise SessionBusy(upload_id)
+    lock.unlink(missing_ok=True)
+    return session, dest
+
+
+def abort_session(upload_id: str) -> None:
+    meta, part, lock = _paths(upload_id)
+    if not meta.exists():
+        raise SessionNotFound(upload_id)
+    try:
+        with file_lock(lock, blocking=False):
+            part.unlink(missing_ok=True)
+            meta.unlink(missing_ok=True)
+    except BlockingIOError:
+        raise SessionBusy(upload_id)
+    lock.unlink(missing_ok=True)
+
+
+def purge_stale_sessions(older_than: timedelta) -> list[Path]:
+    """Drop partial uploads with no activity for `older_than` (retention sweep)."""
+    deleted: list[Path] = []
+    d = _dir()
+    if not d.exists():
+        return deleted
+    cutoff = time.time() - older_than.total_seconds()
+    for meta in d.glob("*.json"):
+        upload_id = meta.stem
+        _, part, lock = _paths(upload_id)
+        try:
+            last = max(p.stat().st_mtime for p in (meta, part) if p.exists())
+            if last >= cutoff:
+                continue
+            with file_lock(lock, blocking=False):
+                for p in (part, meta):
+                    if p.exists():
+                        p.unlink()
+                        deleted.append(p)
+            lock.unlink(missing_ok=True)
+        except BlockingIOError:
+            continue  # being written right now, so not abandoned
+        except Exception as e:
+            log.warning("skip partial upload %s: %s", upload_id, e)
+    # Parts whose session file vanished (crash between writes)
+    for p in d.glob("*.part"):
+        try:
+            if not p.with_suffix(".json").exists() and p.stat().st_mtime < cutoff:
+                p.unlink(missing_ok=True)
+                deleted.append(p)
+        except OSError:
+            pass
+    return deleted
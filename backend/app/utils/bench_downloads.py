@@ -0,0 +1,133 @@
+"""Large-file download throughput for one worker.
+
+Starts a single uvicorn worker in a scratch directory, drops a synthetic
+export of --size-mb into its data/exports and pulls it over loopback:
+
+    cd backend && python -m app.utils.bench_downloads --size-mb 256 --rounds 5
+
+Reports MB/s for a full GET, a single 64 MiB range, a 4-part multi-range
+and the request rate for conditional (304) revalidation. The file is
+random bytes, so the compression middleware has nothing to gain either way.
+"""
+
+import argparse
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND = Path(__file__).resolve().parents[2]
+NAME = "deck_bench_default_00000000.txt"
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _make_file(path: Path, size: int) -> None:
+    block = os.urandom(1024 * 1024)
+    with path.open("wb") as f:
+        for _ in range(size // len(block)):
+            f.write(block)
+        f.write(block[: size % len(block)])
+
+
+def start_server(workdir: Path, port: int) -> subprocess.Popen:
+    """One uvicorn worker with its own scratch storage; returns once it answers."""
+    env = os.environ | {
+        "PYTHONPATH": str(BACKEND),
+        "STORAGE_DIR": str(workdir / "uploads"),
+        "SEARCH_INDEX_DIR": str(workdir / "index"),
+        "COORD_DIR": str(workdir / "coord"),
+        "ENABLE_RETENTION": "false",
+        "RATE_LIMIT_ENABLED": "false",
+        "TRACE_EXPORTER": "none",
+    }
+    proc = subprocess.Popen(
+        [
+            sys.executable, "-m", "uvicorn", "app.main:app",
+            "--host", "127.0.0.1", "--port", str(port),
+            "--workers", "1", "--no-access-log", "--log-level", "warning",
+        ],
+        cwd=workdir,
+        env=env,
+        # per-request JSON logs would dominate the measurement
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )  # fmt: skip
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/v1/health", timeout=1)
+            return proc
+        except httpx.TransportError:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("uvicorn did not come up")
+
+
+def _pull(client: httpx.Client, url: str, headers: dict) -> tuple[int, int, float]:
+    t0 = time.perf_counter()
+    n = 0
+    with client.stream("GET", url, headers=headers) as r:
+        for chunk in r.iter_raw(1024 * 1024):
+            n += len(chunk)
+    return r.status_code, n, time.perf_counter() - t0
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--size-mb", type=int, default=256)
+    ap.add_argument("--rounds", type=int, default=5)
+    args = ap.parse_args()
+
+    size = args.size_mb * 1024 * 1024
+    workdir = Path(tempfile.mkdtemp(prefix="bench-downloads-"))
+    exports = workdir / "data" / "exports"
+    exports.mkdir(parents=True)
+    _make_file(exports / NAME, size)
+
+    port = free_port()
+    proc = start_server(workdir, port)
+    url = f"http://127.0.0.1:{port}/v1/export/{NAME}"
+    quarter = size // 4
+    cases = {
+        "full": {},
+        "range 64MiB": {"Range": f"bytes={size // 2}-{size // 2 + 64 * 2**20 - 1}"},
+        "multi-range x4": {
+            "Range": "bytes="
+            + ",".join(f"{i * quarter}-{i * quarter + quarter // 2}" for i in range(4))
+        },
+    }
+    try:
+        with httpx.Client(timeout=120, headers={"Accept-Encoding": "identity"}) as c:
+            etag = c.head(url).headers["etag"]  # first hit hashes the file
+            print(f"{args.size_mb} MiB file, {args.rounds} rounds, 1 worker")
+            for label, headers in cases.items():
+                best = 0.0
+                for _ in range(args.rounds):
+                    status, n, dt = _pull(c, url, headers)
+                    best = max(best, n / dt / 2**20)
+                print(f"  {label:<16} {status}  {n / 2**20:8.1f} MiB  {best:8.1f} MB/s")
+            t0 = time.perf_counter()
+            count = 200
+            for _ in range(count):
+                r = c.get(url, headers={"If-None-Match": etag})
+            rate = count / (time.perf_counter() - t0)
+            print(f"  {'revalidate':<16} {r.status_code}  {rate:8.0f} req/s")
+    finally:
+        proc.terminate()
+        proc.wait(10)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""POST /outline/batch against the one-request-per-document loop.
+
+Starts a single uvicorn worker (see bench_downloads), uploads --docs
+synthetic documents once, then times:
+
+- loop/text:    one POST /outline per document, full text in the body
+- loop/file_id: one POST /outline per document, referencing the upload
+- batch:        one streamed POST /outline/batch with all file_ids
+
+    cd backend && python -m app.utils.bench_outline_batch --docs 50 --rounds 5
+"""
+
+import argparse
+import json
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from app.utils.bench_downloads import free_port, start_server
+
+
+def _document(i: int, sections: int) -> str:
+    parts = [f"# Report {i}: quarterly review"]
+    for s in range(1, sections + 1):
+        parts.append(f"## {s}. Section {s} of report {i}")
+        parts += [f"Paragraph {p} of section {s}. " * 12 for p in range(6)]
+    return "\n".join(parts)
+
+
+def _loop(c: httpx.Client, bodies: list[dict]) -> float:
+    t0 = time.perf_counter()
+    for body in bodies:
+        c.post("/v1/outline", json=body).raise_for_status()
+    return time.perf_counter() - t0
+
+
+def _batch(c: httpx.Client, file_ids: list[str]) -> tuple[float, float, int]:
+    t0 = time.perf_counter()
+    first = None
+    decks = 0
+    body = {"file_ids": file_ids, "slide_count": 8}
+    with c.stream("POST", "/v1/outline/batch", json=body) as r:
+        r.raise_for_status()
+        for line in r.iter_lines():
+            ev = json.loads(line)
+            if ev["event"] == "deck":
+                decks += 1
+                first = first or time.perf_counter() - t0
+    return time.perf_counter() - t0, first or 0.0, decks
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--docs", type=int, default=50)
+    ap.add_argument("--sections", type=int, default=20)
+    ap.add_argument("--rounds", type=int, default=5)
+    args = ap.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix="bench-outline-"))
+    port = free_port()
+    proc = start_server(workdir, port)
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=120) as c:
+            texts = [_document(i, args.sections) for i in range(args.docs)]
+            file_ids = []
+            for i, text in enumerate(texts):
+                r = c.post(
+                    "/v1/upload",
+                    files={"file": (f"doc{i}.md", text.encode(), "text/markdown")},
+                )
+                r.raise_for_status()
+                file_ids.append(r.json()["file_id"])
+
+            by_text = [{"text": t, "slide_count": 8} for t in texts]
+            by_id = [{"file_id": f, "slide_count": 8} for f in file_ids]
+            runs = {"loop/text": [], "loop/file_id": [], "batch": []}
+            first = []
+            for _ in range(args.rounds):
+                runs["loop/text"].append(_loop(c, by_text))
+                runs["loop/file_id"].append(_loop(c, by_id))
+                total, ttfb, decks = _batch(c, file_ids)
+                assert decks == args.docs, f"batch returned {decks} decks"
+                runs["batch"].append(total)
+                first.append(ttfb)
+
+        kb = sum(len(t) for t in texts) / args.docs / 1024
+        print(f"{args.docs} documents (~{kb:.0f} KiB each), best of {args.rounds}")
+        base = min(runs["loop/text"])
+        for label, times in runs.items():
+            best = min(times)
+            print(
+                f"  {label:<13} {best * 1000:8.1f} ms  "
+                f"{args.docs / best:7.0f} docs/s  x{base / best:.1f}"
+            )
+        print(f"  batch first deck after {min(first) * 1000:.1f} ms")
+    finally:
+        proc.terminate()
+        proc.wait(10)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Stand-in OTLP/HTTP collector and trace viewer for local work.
+
+    # receive spans (TRACE_EXPORTER=otlp) and append them to a file
+    python -m app.utils.trace_collector serve --port 4318 --out traces.jsonl
+
+    # print span trees from that file or from TRACE_EXPORTER=file output
+    python -m app.utils.trace_collector show data/traces/spans.jsonl [--trace ID]
+
+Only the JSON encoding of OTLP is accepted; anything else gets 415.
+"""
+
+import argparse
+import json
+import sys
+import threading
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+
+def _spans(payload: dict):
+    for rs in payload.get("resourceSpans", []):
+        attrs = {
+            a["key"]: next(iter(a["value"].values()))
+            for a in rs.get("resource", {}).get("attributes", [])
+        }
+        for ss in rs.get("scopeSpans", []):
+            for s in ss.get("spans", []):
+                yield attrs.get("service.instance.id", "?"), s
+
+
+def serve(port: int, out: Path) -> None:
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path != "/v1/traces":
+                self.send_error(404)
+                return
+            if "json" not in (self.headers.get("content-type") or ""):
+                self.send_error(415, "only OTLP/JSON is supported")
+                return
+            body = self.rfile.read(int(self.headers.get("content-length") or 0))
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                self.send_error(400, "invalid JSON")
+                return
+            n = sum(1 for _ in _spans(payload))
+            with lock, out.open("a", encoding="utf-8") as f:
+                f.write(json.dumps(payload, separators=(",", ":")) + "\n")
+            print(f"received {n} span(s)", file=sys.stderr)
+            self.send_response(200)
+            self.send_header("content-type", "application/json")
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, *args):
+            pass
+
+    out.parent.mkdir(parents=True, exist_ok=True)
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    print(f"listening on http://127.0.0.1:{port}/v1/traces -> {out}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+def show(path: Path, trace: str | None) -> None:
+    traces: dict[str, dict[str, dict]] = defaultdict(dict)
+    for line in path.read_text(encoding="utf-8").splitlines():
+        if not line.strip():
+            continue
+        for worker, s in _spans(json.loads(line)):
+            if trace and not s["traceId"].startswith(trace):
+                continue
+            traces[s["traceId"]][s["spanId"]] = s | {"worker": worker}
+
+    for trace_id, spans in traces.items():
+        children = defaultdict(list)
+        for s in spans.values():
+            parent = s.get("parentSpanId")
+            children[parent if parent in spans else None].append(s)
+        roots = sorted(children[None], key=lambda s: int(s["startTimeUnixNano"]))
+        t0 = int(roots[0]["startTimeUnixNano"])
+        print(f"trace {trace_id} ({len(spans)} spans)")
+
+        def walk(s, depth):
+            start = (int(s["startTimeUnixNano"]) - t0) / 1e6
+            dur = (int(s["endTimeUnixNano"]) - int(s["startTimeUnixNano"])) / 1e6
+            err = " ERROR" if s.get("status", {}).get("code") == 2 else ""
+            print(f"  {'  ' * depth}{s['name']}  +{start:.1f}ms {dur:.1f}ms{err}")
+            for c in sorted(
+                children[s["spanId"]], key=lambda c: int(c["startTimeUnixNano"])
+            ):
+                walk(c, depth + 1)
+
+        for r in roots:
+            walk(r, 0)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("serve")
+    p.add_argument("--port", type=int, default=4318)
+    p.add_argument("--out", type=Path, default=Path("data/traces/collected.jsonl"))
+    p = sub.add_parser("show")
+    p.add_argument("file", type=Path)
+    p.add_argument("--trace")
+    args = ap.parse_args()
+    if args.cmd == "serve":
+        serve(args.port, args.out)
+    else:
+        show(args.file, args.trace)
+
+
+if __name__ == "__main__":
+    main()
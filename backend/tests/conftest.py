@@ -0,0 +1,26 @@
+"""Point every on-disk path at a scratch directory before `app` is imported.
+
+Settings are read once at import time, so this has to run first; tests that
+need their own directories use pytest's `tmp_path` on top of it.
+"""
+
+import atexit
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+_scratch = Path(tempfile.mkdtemp(prefix="presentune-tests-"))
+atexit.register(shutil.rmtree, _scratch, ignore_errors=True)
+
+os.environ.update(
+    {
+        "STORAGE_DIR": str(_scratch / "uploads"),
+        "SEARCH_INDEX_DIR": str(_scratch / "index"),
+        "MEDIA_CACHE_DIR": str(_scratch / "media"),
+        "COORD_DIR": str(_scratch / "coord"),
+        "TRACE_EXPORTER": "none",
+        "ENABLE_RETENTION": "false",
+        "RATE_LIMIT_ENABLED": "false",
+    }
+)
@@ -0,0 +1,53 @@
+import uuid
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.models.schemas.slide import Deck, Slide
+from app.services.deck_service import deck_store
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def deck_id() -> str:
+    deck = Deck(
+        id=uuid.uuid4().hex,
+        slide_count=2,
+        slides=[Slide(id="s1", title="One"), Slide(id="s2", title="Two")],
+    )
+    return deck_store.create(deck).id
+
+
+def _patch(deck_id: str, *ops: dict, **body):
+    return client.patch(f"/v1/decks/{deck_id}", json={"ops": list(ops), **body})
+
+
+def test_update_replaces_fields(deck_id):
+    resp = _patch(deck_id, {"op": "update", "slide_id": "s1", "set": {"title": "New"}})
+    assert resp.status_code == 200
+    assert resp.json()["revision"] == 2
+    assert resp.json()["changed"] == ["s1"]
+    assert client.get(f"/v1/decks/{deck_id}").json()["slides"][0]["title"] == "New"
+
+
+@pytest.mark.parametrize(
+    "fields", [{"bogus": 1}, {"title": "ok", "bogus": 1}, {"id": "s9"}]
+)
+def test_update_rejects_unknown_or_id_fields(deck_id, fields):
+    resp = _patch(deck_id, {"op": "update", "slide_id": "s1", "set": fields})
+    assert resp.status_code == 422
+    assert client.get(f"/v1/decks/{deck_id}").json()["revision"] == 1
+
+
+def test_stale_base_revision_conflicts(deck_id):
+    op = {"op": "update", "slide_id": "s2", "set": {"notes": "n"}}
+    assert _patch(deck_id, op, base_revision=1).status_code == 200
+    assert _patch(deck_id, op, base_revision=1).status_code == 409
+    assert _patch(deck_id, op).json()["revision"] == 3
+
+
+def test_unknown_deck_is_404():
+    op = {"op": "delete", "slide_id": "s1"}
+    assert _patch(uuid.uuid4().hex, op).status_code == 404
@@ -0,0 +1,172 @@
+from email.utils import formatdate
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.datastructures import Headers
+
+from app.core.fileserve import (
+    MAX_RANGES,
+    RangeNotSatisfiable,
+    content_etag,
+    parse_range,
+    serve_file,
+)
+
+SIZE = 100
+
+
+@pytest.mark.parametrize(
+    "header, expected",
+    [
+        ("bytes=0-9", [(0, 9)]),
+        ("bytes=90-", [(90, 99)]),
+        ("bytes=90-500", [(90, 99)]),
+        ("bytes=-10", [(90, 99)]),
+        ("bytes=-500", [(0, 99)]),  # suffix longer than the file
+        ("bytes=0-10,5-20", [(0, 20)]),  # overlapping
+        ("bytes=0-9,10-19", [(0, 19)]),  # adjacent
+        ("bytes=50-59,0-9", [(0, 9), (50, 59)]),  # sorted
+        ("bytes=0-9, 20-29 ,-5", [(0, 9), (20, 29), (95, 99)]),
+        ("bytes=0-9,200-300", [(0, 9)]),  # unsatisfiable parts are dropped
+        ("bytes=-0,5-6", [(5, 6)]),
+    ],
+)
+def test_parse_range(header, expected):
+    assert parse_range(header, SIZE) == expected
+
+
+@pytest.mark.parametrize(
+    "header",
+    [
+        None,
+        "",
+        "items=0-9",
+        "bytes=abc",
+        "bytes=5",
+        "bytes=9-0",
+        "bytes=--5",
+        "bytes=+5-9",
+        "bytes=0-\u00b2",
+        "bytes=" + ",".join(f"{i * 4}-{i * 4 + 1}" for i in range(MAX_RANGES + 1)),
+    ],
+)
+def test_parse_range_ignored(header):
+    assert parse_range(header, SIZE) is None
+
+
+@pytest.mark.parametrize("header", ["bytes=100-", "bytes=200-300", "bytes=-0"])
+def test_parse_range_unsatisfiable(header):
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range(header, SIZE)
+
+
+@pytest.fixture
+def served(tmp_path):
+    path = tmp_path / "deck.txt"
+    data = bytes(range(SIZE))
+    path.write_bytes(data)
+
+    async def app(scope, receive, send):
+        response = serve_file(
+            scope["method"], Headers(scope=scope), path, "text/plain", "deck.txt"
+        )
+        await response(scope, receive, send)
+
+    return TestClient(app), data, content_etag(path), path
+
+
+def test_full_get_and_head(served):
+    c, data, etag, _ = served
+    r = c.get("/")
+    assert r.status_code == 200
+    assert r.content == data
+    assert r.headers["etag"] == etag
+    assert r.headers["accept-ranges"] == "bytes"
+    h = c.head("/")
+    assert h.status_code == 200
+    assert h.content == b""
+    assert h.headers["content-length"] == str(SIZE)
+
+
+def test_single_range(served):
+    c, data, _, _ = served
+    r = c.get("/", headers={"Range": "bytes=-10"})
+    assert r.status_code == 206
+    assert r.content == data[90:]
+    assert r.headers["content-range"] == f"bytes 90-99/{SIZE}"
+    assert r.headers["content-length"] == "10"
+
+
+def test_overlapping_ranges_merge_into_one_part(served):
+    c, data, _, _ = served
+    r = c.get("/", headers={"Range": "bytes=10-20,15-30"})
+    assert r.status_code == 206
+    assert r.content == data[10:31]
+    assert r.headers["content-range"] == f"bytes 10-30/{SIZE}"
+
+
+def test_multipart_byteranges(served):
+    c, data, _, _ = served
+    r = c.get("/", headers={"Range": "bytes=50-59,0-4"})
+    assert r.status_code == 206
+    ctype = r.headers["content-type"]
+    assert ctype.startswith("multipart/byteranges; boundary=")
+    boundary = ctype.split("boundary=")[1].encode()
+    assert int(r.headers["content-length"]) == len(r.content)
+    parts = [p for p in r.content.split(b"--" + boundary) if p not in (b"", b"--\r\n")]
+    assert len(parts) == 2
+    bodies = []
+    for part, (lo, hi) in zip(parts, [(0, 4), (50, 59)]):
+        head, _, body = part.strip(b"\r\n").partition(b"\r\n\r\n")
+        assert f"Content-Range: bytes {lo}-{hi}/{SIZE}".encode() in head
+        bodies.append(body)
+    assert bodies == [data[0:5], data[50:60]]
+
+
+def test_unsatisfiable_range_is_416(served):
+    c, _, _, _ = served
+    r = c.get("/", headers={"Range": f"bytes={SIZE}-"})
+    assert r.status_code == 416
+    assert r.headers["content-range"] == f"bytes */{SIZE}"
+
+
+def test_if_range(served):
+    c, data, etag, path = served
+    rng = {"Range": "bytes=0-9"}
+    assert c.get("/", headers=rng | {"If-Range": etag}).status_code == 206
+    # A changed representation (or a weak tag) means "send it all"
+    for stale in ('"0000"', f"W/{etag}"):
+        r = c.get("/", headers=rng | {"If-Range": stale})
+        assert r.status_code == 200
+        assert r.content == data
+    lm = formatdate(path.stat().st_mtime, usegmt=True)
+    assert c.get("/", headers=rng | {"If-Range": lm}).status_code == 206
+    old = formatdate(path.stat().st_mtime - 3600, usegmt=True)
+    assert c.get("/", headers=rng | {"If-Range": old}).status_code == 200
+
+
+@pytest.mark.parametrize(
+    "inm, status",
+    [
+        ("{etag}", 304),
+        ("W/{etag}", 304),  # If-None-Match uses the weak comparison
+        ('"other", {etag}', 304),
+        ("*", 304),
+        ('"other"', 200),
+    ],
+)
+def test_if_none_match(served, inm, status):
+    c, _, etag, _ = served
+    r = c.get("/", headers={"If-None-Match": inm.format(etag=etag)})
+    assert r.status_code == status
+    if status == 304:
+        assert r.content == b""
+        assert r.headers["etag"] == etag
+
+
+def test_if_none_match_wins_over_if_modified_since(served):
+    c, _, _, path = served
+    future = formatdate(path.stat().st_mtime + 3600, usegmt=True)
+    assert c.get("/", headers={"If-Modified-Since": future}).status_code == 304
+    r = c.get("/", headers={"If-Modified-Since": future, "If-None-Match": '"x"'})
+    assert r.status_code == 200
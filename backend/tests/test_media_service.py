@@ -0,0 +1,244 @@
+import asyncio
+import hashlib
+import io
+import json
+from email.utils import formatdate
+from pathlib import Path
+
+import httpx
+import pytest
+
+from app.services.media_service import (
+    MediaCache,
+    MediaFetchError,
+    MediaFetcher,
+)
+
+PUBLIC = "93.184.215.14"
+
+
+def _png(seed: int, side: int = 64) -> bytes:
+    from PIL import Image
+
+    # Noise, so each image is a distinct object of about side*side*3 bytes
+    noise = hashlib.shake_256(seed.to_bytes(4, "big")).digest(side * side * 3)
+    buf = io.BytesIO()
+    Image.frombytes("RGB", (side, side), noise).save(buf, format="PNG")
+    return buf.getvalue()
+
+
+def _fetcher(tmp_path, handler, addrs=None, max_bytes=64 * 1024 * 1024, **kw):
+    addrs = addrs or {}
+
+    async def resolve(host: str, port: int) -> list[str]:
+        return addrs.get(host, [PUBLIC])
+
+    return MediaFetcher(
+        MediaCache(tmp_path / "media", max_bytes),
+        max_concurrency=4,
+        timeout_s=5,
+        max_image_bytes=10 * 1024 * 1024,
+        fresh_s=kw.pop("fresh_s", 3600),
+        box=(1920, 1080),
+        transport=httpx.MockTransport(handler),
+        resolver=resolve,
+        **kw,
+    )
+
+
+def _fetch(fetcher: MediaFetcher, *urls: str):
+    async def run():
+        try:
+            return [await fetcher.fetch(u) for u in urls]
+        finally:
+            await fetcher.aclose()
+
+    return asyncio.run(run())
+
+
+def _image_handler(seen: list):
+    def handle(request: httpx.Request) -> httpx.Response:
+        seen.append(str(request.url))
+        return httpx.Response(
+            200, headers={"content-type": "image/png"}, content=_png(1)
+        )
+
+    return handle
+
+
+@pytest.mark.parametrize(
+    "url, addrs",
+    [
+        ("http://127.0.0.1/a.png", {}),
+        ("http://169.254.169.254/latest/meta-data", {}),
+        ("http://[::1]/a.png", {}),
+        ("http://[::ffff:10.0.0.1]/a.png", {}),
+        ("http://internal.test/a.png", {"internal.test": ["10.1.2.3"]}),
+        ("http://mixed.test/a.png", {"mixed.test": [PUBLIC, "192.168.0.9"]}),
+        ("http://cgnat.test/a.png", {"cgnat.test": ["100.64.0.1"]}),
+        ("file:///etc/passwd", {}),
+    ],
+)
+def test_refuses_non_public_targets(tmp_path, url, addrs):
+    seen: list = []
+    fetcher = _fetcher(tmp_path, _image_handler(seen), addrs)
+    with pytest.raises(MediaFetchError):
+        _fetch(fetcher, url)
+    assert seen == []
+    assert fetcher.errors == 1
+
+
+def test_every_redirect_hop_is_vetted(tmp_path):
+    seen: list = []
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        seen.append(request.url.host)
+        if request.url.host == "cdn.test":
+            return httpx.Response(302, headers={"location": "http://metadata.test/"})
+        return httpx.Response(200, headers={"content-type": "image/png"}, content=b"")
+
+    fetcher = _fetcher(tmp_path, handle, {"metadata.test": ["169.254.169.254"]})
+    with pytest.raises(MediaFetchError, match="non-public"):
+        _fetch(fetcher, "http://cdn.test/a.png")
+    assert seen == ["cdn.test"]
+
+
+def test_follows_public_redirects(tmp_path):
+    seen: list = []
+    image = _image_handler(seen)
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/old.png":
+            return httpx.Response(301, headers={"location": "/new.png"})
+        return image(request)
+
+    (asset,) = _fetch(_fetcher(tmp_path, handle), "http://cdn.test/old.png")
+    assert seen == ["http://cdn.test/new.png"]
+    assert asset.content_type == "image/png"
+
+
+def test_redirect_loops_give_up(tmp_path):
+    def handle(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(302, headers={"location": "/again"})
+
+    with pytest.raises(MediaFetchError, match="too many redirects"):
+        _fetch(_fetcher(tmp_path, handle), "http://cdn.test/a.png")
+
+
+def test_allowed_hosts(tmp_path):
+    seen: list = []
+    fetcher = _fetcher(tmp_path, _image_handler(seen), allowed_hosts=["*.cdn.test"])
+    _fetch(fetcher, "http://img.cdn.test/a.png")
+    fetcher = _fetcher(tmp_path, _image_handler(seen), allowed_hosts=["*.cdn.test"])
+    with pytest.raises(MediaFetchError, match="MEDIA_ALLOWED_HOSTS"):
+        _fetch(fetcher, "http://elsewhere.test/a.png")
+    assert seen == ["http://img.cdn.test/a.png"]
+
+
+def test_url_entries_of_evicted_objects_are_dropped(tmp_path):
+    images = {f"/{i}.png": _png(i) for i in range(4)}
+
+    def handle(request: httpx.Request) -> httpx.Response:
+        body = images[request.url.path]
+        return httpx.Response(200, headers={"content-type": "image/png"}, content=body)
+
+    size = len(images["/0.png"])
+    fetcher = _fetcher(tmp_path, handle, max_bytes=int(size * 2.5))
+    _fetch(fetcher, *(f"http://cdn.test/{i}.png" for i in range(4)))
+    entries = list((tmp_path / "media" / "urls").glob("*.json"))
+    paths = [json.loads(e.read_text())["path"] for e in entries]
+    assert 0 < len(entries) < 4
+    assert all(Path(p).is_file() for p in paths)
+
+
+class Origin:
+    """Image server: /etag/<n>.png sends an ETag, /lm/<n>.png a Last-Modified."""
+
+    def __init__(self, delay_s: float = 0.0):
+        self.delay_s = delay_s
+        self.requests: list[tuple[str, int]] = []  # (path, status)
+        self._images: dict[str, bytes] = {}
+        self._modified = formatdate(1_700_000_000, usegmt=True)
+
+    def image(self, path: str) -> bytes:
+        if path not in self._images:
+            self._images[path] = _png(len(self._images) + 1)
+        return self._images[path]
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        if self.delay_s:
+            await asyncio.sleep(self.delay_s)
+        path = request.url.path
+        body = self.image(path)
+        if path.startswith("/etag/"):
+            validator = {"etag": f'"{hashlib.sha256(body).hexdigest()[:16]}"'}
+            fresh = request.headers.get("if-none-match") == validator["etag"]
+        else:
+            validator = {"last-modified": self._modified}
+            fresh = request.headers.get("if-modified-since") == self._modified
+        self.requests.append((path, 304 if fresh else 200))
+        if fresh:
+            return httpx.Response(304, headers=validator)
+        return httpx.Response(
+            200, headers={"content-type": "image/png", **validator}, content=body
+        )
+
+
+@pytest.mark.parametrize("kind", ["etag", "lm"])
+def test_stale_entries_revalidate_with_304(tmp_path, kind):
+    origin = Origin()
+    url = f"http://origin.test/{kind}/1.png"
+    # fresh_s=0: every fetch after the first is a conditional request
+    fetcher = _fetcher(tmp_path, origin.handle, fresh_s=0)
+    first, second = _fetch(fetcher, url, url)
+    assert [s for _, s in origin.requests] == [200, 304]
+    assert second.digest == first.digest
+    assert Path(second.path).is_file()
+    assert (fetcher.downloads, fetcher.revalidated, fetcher.hits) == (1, 1, 0)
+
+
+def test_fresh_entries_skip_the_origin(tmp_path):
+    origin = Origin()
+    url = "http://origin.test/etag/1.png"
+    fetcher = _fetcher(tmp_path, origin.handle)
+    _fetch(fetcher, url, url)
+    assert len(origin.requests) == 1
+    assert (fetcher.downloads, fetcher.hits) == (1, 1)
+
+
+def test_concurrent_fetches_are_single_flight(tmp_path):
+    origin = Origin(delay_s=0.05)
+    url = "http://origin.test/etag/shared.png"
+    fetcher = _fetcher(tmp_path, origin.handle)
+
+    async def run():
+        try:
+            return await asyncio.gather(*(fetcher.fetch(url) for _ in range(20)))
+        finally:
+            await fetcher.aclose()
+
+    assets = asyncio.run(run())
+    assert len(origin.requests) == 1
+    assert len({a.digest for a in assets}) == 1
+
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    origin = Origin()
+    urls = [f"http://origin.test/etag/{i}.png" for i in range(4)]
+    size = len(origin.image("/etag/0.png"))
+    # Room for three objects; the fourth pushes it over and one has to go
+    fetcher = _fetcher(tmp_path, origin.handle, max_bytes=int(size * 3.5))
+
+    async def run():
+        try:
+            assets = [await fetcher.fetch(u) for u in urls[:3]]
+            await asyncio.sleep(0.01)  # mtime is the LRU clock
+            await fetcher.fetch(urls[0])  # fresh hit: 0 becomes most recently used
+            await asyncio.sleep(0.01)
+            return assets + [await fetcher.fetch(urls[3])]
+        finally:
+            await fetcher.aclose()
+
+    assets = asyncio.run(run())
+    assert [i for i, a in enumerate(assets) if Path(a.path).is_file()] == [0, 2, 3]
+    assert fetcher.cache.stats()["bytes"] <= fetcher.cache.max_bytes
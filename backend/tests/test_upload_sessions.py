@@ -0,0 +1,220 @@
+import asyncio
+import base64
+import hashlib
+import os
+import time
+import uuid
+from datetime import timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.config import settings
+from app.main import app
+from app.models.schemas.upload import UploadSessionCreate
+from app.services import upload_session_service as sessions
+
+client = TestClient(app)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def _portal():
+    # One event loop for the module: progress channels are bound to the loop
+    # that created the session and PATCH publishes to them
+    with client:
+        yield
+
+
+BODY = b"resumable upload body\n" * 64
+
+
+def _url(upload_id: str, suffix: str = "") -> str:
+    return f"{settings.API_BASE}/upload/sessions/{upload_id}{suffix}"
+
+
+def _create(body: bytes = BODY, **extra) -> str:
+    upload_id = uuid.uuid4().hex
+    resp = client.post(
+        f"{settings.API_BASE}/upload/sessions",
+        json={
+            "filename": "notes.txt",
+            "size": len(body),
+            "content_type": "text/plain",
+            "upload_id": upload_id,
+            **extra,
+        },
+    )
+    assert resp.status_code == 201
+    assert resp.headers["Upload-Offset"] == "0"
+    return upload_id
+
+
+def _patch(upload_id: str, offset: int, data: bytes, **headers):
+    return client.patch(
+        _url(upload_id),
+        content=data,
+        headers={"Upload-Offset": str(offset), **headers},
+    )
+
+
+def _offset(upload_id: str) -> int:
+    resp = client.head(_url(upload_id))
+    assert resp.status_code == 200
+    return int(resp.headers["Upload-Offset"])
+
+
+def _checksum(data: bytes, algo: str = "sha256") -> str:
+    return f"{algo} {base64.b64encode(hashlib.new(algo, data).digest()).decode()}"
+
+
+def test_chunks_assemble_and_finalize():
+    upload_id = _create(sha256=hashlib.sha256(BODY).hexdigest())
+    half = len(BODY) // 2
+    assert _patch(upload_id, 0, BODY[:half]).status_code == 204
+    resp = _patch(
+        upload_id, half, BODY[half:], **{"Upload-Checksum": _checksum(BODY[half:])}
+    )
+    assert resp.status_code == 204
+    assert resp.headers["Upload-Offset"] == str(len(BODY))
+
+    resp = client.post(_url(upload_id, "/finalize"))
+    assert resp.status_code == 200
+    assert resp.json()["size"] == len(BODY)
+    stored = settings.STORAGE_DIR / f"{upload_id}_notes.txt"
+    assert stored.read_bytes() == BODY
+    assert not list((settings.STORAGE_DIR / "partial").glob(f"{upload_id}.*"))
+
+
+def test_reused_id_conflicts():
+    upload_id = _create()
+    resp = client.post(
+        f"{settings.API_BASE}/upload/sessions",
+        json={"filename": "other.txt", "size": 10, "upload_id": upload_id},
+    )
+    assert resp.status_code == 409
+
+
+def test_offset_mismatch_reports_committed_offset():
+    upload_id = _create()
+    assert _patch(upload_id, 0, BODY[:100]).status_code == 204
+    for stale in (0, 50, 200):
+        resp = _patch(upload_id, stale, BODY[stale : stale + 10])
+        assert resp.status_code == 409
+        assert resp.headers["Upload-Offset"] == "100"
+    assert _offset(upload_id) == 100
+
+
+def test_checksum_mismatch_discards_chunk():
+    upload_id = _create()
+    assert _patch(upload_id, 0, BODY[:100]).status_code == 204
+    chunk = BODY[100:200]
+    resp = _patch(upload_id, 100, chunk, **{"Upload-Checksum": _checksum(b"other")})
+    assert resp.status_code == 460
+    assert _offset(upload_id) == 100
+    # The retry with the right digest lands at the same offset
+    resp = _patch(upload_id, 100, chunk, **{"Upload-Checksum": _checksum(chunk, "md5")})
+    assert resp.status_code == 204
+    assert _offset(upload_id) == 200
+
+
+def test_whole_file_digest_mismatch_on_finalize():
+    upload_id = _create(sha256="0" * 64)
+    assert _patch(upload_id, 0, BODY).status_code == 204
+    assert client.post(_url(upload_id, "/finalize")).status_code == 460
+
+
+def test_overrun_past_declared_size():
+    upload_id = _create()
+    assert _patch(upload_id, 0, BODY[:-5]).status_code == 204
+    resp = _patch(upload_id, len(BODY) - 5, b"x" * 6)
+    assert resp.status_code == 413
+    assert "declared size" in resp.json()["detail"]
+    assert _offset(upload_id) == len(BODY) - 5
+
+
+def test_chunk_over_max(monkeypatch):
+    monkeypatch.setattr(settings, "UPLOAD_CHUNK_MAX_MB", 1)
+    body = b"\0" * (3 * 1024 * 1024)
+    upload_id = _create(body)
+    resp = _patch(upload_id, 0, body[: 1024 * 1024 + 1])
+    assert resp.status_code == 413
+    assert "exceeds 1 MB" in resp.json()["detail"]
+    assert _patch(upload_id, 0, body[: 1024 * 1024]).status_code == 204
+
+
+def test_finalize_before_complete_conflicts():
+    upload_id = _create()
+    assert _patch(upload_id, 0, BODY[:10]).status_code == 204
+    resp = client.post(_url(upload_id, "/finalize"))
+    assert resp.status_code == 409
+    assert resp.headers["Upload-Offset"] == "10"
+
+
+def test_resume_after_dropped_connection():
+    upload_id = _create()
+
+    async def dropped():
+        yield BODY[:300]
+        raise ConnectionResetError("client went away")
+
+    with pytest.raises(ConnectionResetError):
+        asyncio.run(sessions.append_chunk(upload_id, 0, dropped()))
+
+    # Bytes that arrived before the drop are committed; carry on from there
+    offset = _offset(upload_id)
+    assert offset == 300
+    assert _patch(upload_id, offset, BODY[offset:]).status_code == 204
+    assert client.post(_url(upload_id, "/finalize")).status_code == 200
+    assert (settings.STORAGE_DIR / f"{upload_id}_notes.txt").read_bytes() == BODY
+
+
+def test_dropped_connection_with_checksum_keeps_nothing():
+    upload_id = _create()
+
+    async def dropped():
+        yield BODY[:300]
+        raise ConnectionResetError("client went away")
+
+    with pytest.raises(ConnectionResetError):
+        asyncio.run(
+            sessions.append_chunk(
+                upload_id, 0, dropped(), checksum=("sha256", b"\0" * 32)
+            )
+        )
+    assert _offset(upload_id) == 0
+
+
+def _session(size: int = 10) -> str:
+    upload_id = uuid.uuid4().hex
+    sessions.create_session(
+        UploadSessionCreate(filename="f.txt", size=size, upload_id=upload_id)
+    )
+    return upload_id
+
+
+def _age(path, hours: float) -> None:
+    t = time.time() - hours * 3600
+    os.utime(path, (t, t))
+
+
+def test_purge_drops_only_stale_sessions():
+    stale, fresh = _session(), _session()
+    meta, part, _ = sessions._paths(stale)
+    _age(meta, 5)
+    _age(part, 5)
+    # Recent writes to the part keep a session alive even if its meta is old
+    busy = _session()
+    busy_meta, busy_part, _ = sessions._paths(busy)
+    _age(busy_meta, 5)
+    # A part whose session file vanished (crash between writes)
+    orphan = sessions._dir() / f"{uuid.uuid4().hex}.part"
+    orphan.write_bytes(b"x")
+    _age(orphan, 5)
+
+    deleted = sessions.purge_stale_sessions(timedelta(hours=1))
+
+    assert set(deleted) == {meta, part, orphan}
+    assert not meta.exists() and not part.exists() and not orphan.exists()
+    assert _offset(fresh) == 0
+    assert busy_meta.exists() and busy_part.exists()
+    assert client.head(_url(stale)).status_code == 404
@@ -11,6 +11,8 @@ export type Slide = {
 
 export type Deck = {
   version: string;
+  id?: string | null; // server deck store id
+  revision?: number | null;
   topic?: string | null;
   source?: Record<string, unknown> | null;
   slide_count: number;